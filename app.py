@@ -42,10 +42,15 @@ def create_app(config_name=None):
     # Initialize Babel
     babel.init_app(app)
 
-    # Jinja helper to check for static file existence (used to fallback posters)
-    app.jinja_env.globals["static_file_exists"] = lambda path: os.path.exists(
-        os.path.join(app.static_folder, path)
-    )
+    # Poster manifest: templates resolve posters with poster_for() lookups
+    from utils.posters import init_poster_manifest
+
+    init_poster_manifest(app)
+
+    # Fingerprinted CSS/JS (scripts/build_assets.py) with immutable caching
+    from utils.assets import init_assets
+
+    init_assets(app)
 
     # Locale selector: support different Flask-Babel versions
     def _get_locale():
@@ -80,17 +85,20 @@ def create_app(config_name=None):
     # Configure logging system
     setup_logging(app, config_obj)
 
-    # Configure user loader function
+    # Configure user loader function (short-TTL snapshot cache)
     @login_manager.user_loader
     def load_user(user_id):
-        from models.user import User
+        from models.user_cache import load_user_snapshot
 
-        return User.query.get(int(user_id))
+        return load_user_snapshot(int(user_id))
 
-    # Request hooks for logging
+    from utils.metrics import init_metrics, record_request
+    from utils.query_stats import init_query_stats
+
+    # Request hooks for logging and metrics
     @app.before_request
     def before_request():
-        g.start_time = __import__("time").time()
+        g.start_time = __import__("time").perf_counter()
         # Configure session security settings
         session.permanent = True
 
@@ -125,15 +133,21 @@ def create_app(config_name=None):
     @app.after_request
     def after_request(response):
         if hasattr(g, "start_time"):
-            duration = __import__("time").time() - g.start_time
+            duration = __import__("time").perf_counter() - g.start_time
+            record_request(response, duration)
             # record low requst
             if duration > 1.0:  # request that is over 1 second
                 try:
                     ua = request.headers.get("User-Agent", "Unknown")[:100]
                 except Exception:
                     ua = "Unknown"
+                stats = g.get("query_stats")
                 app.logger.warning(
-                    "slow_request duration=%.3fs user_agent=%s", duration, ua
+                    "slow_request duration=%.3fs user_agent=%s metrics=%s sql=%s",
+                    duration,
+                    ua,
+                    g.get("metrics", {}),
+                    stats.summary() if stats is not None else "-",
                 )
 
         # Add security headers
@@ -178,6 +192,15 @@ def create_app(config_name=None):
     app.register_blueprint(film_bp)
     app.register_blueprint(interaction_bp)
 
+    # Prometheus /metrics, per-request SQL stats
+    init_metrics(app)
+    init_query_stats(app)
+
+    # Anonymous full-page cache (registered last: its before_request may answer)
+    from utils.page_cache import init_page_cache
+
+    init_page_cache(app)
+
     with app.app_context():
         db.create_all()
 
@@ -247,6 +270,7 @@ def setup_logging(app, config_obj=None):
         "film": logging.getLogger("film"),
         "interaction": logging.getLogger("interaction"),
         "recommendation": logging.getLogger("recommendation"),
+        "sql": logging.getLogger("sql"),
     }
 
     for name, logger in loggers.items():
@@ -7,6 +7,70 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "dev-secret-key"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = True
+    # seconds to cache trending/daily chart data (0 disables the cache)
+    TRENDING_CACHE_TTL = 60
+    # in-process decayed trending tracker (see models/trending_tracker.py)
+    TRENDING_TRACKER_ENABLED = True
+    TRENDING_TRACKER_CAPACITY = 100
+    TRENDING_HALF_LIFE_HOURS = 48
+    TRENDING_CHECKPOINT_SECONDS = 300
+    # write-behind film counters (see models/counter_buffer.py); off by default
+    COUNTER_BUFFER_ENABLED = os.environ.get("COUNTER_BUFFER_ENABLED") == "1"
+    COUNTER_BUFFER_FLUSH_MS = 500
+    COUNTER_BUFFER_MAX_EVENTS = 200
+    # single-writer queue with group commits (see models/write_queue.py)
+    WRITE_QUEUE_ENABLED = False
+    WRITE_QUEUE_TIMEOUT = 5  # seconds a write may wait in the queue before 503
+    WRITE_QUEUE_MAX_BATCH = 50
+    WRITE_QUEUE_MAXSIZE = 1000
+    # AppLog entries are batched by a background writer (models/log_writer.py)
+    APPLOG_ASYNC = True
+    APPLOG_QUEUE_SIZE = 10000
+    APPLOG_BATCH_SIZE = 200
+    APPLOG_FLUSH_SECONDS = 1.0
+    # scripts/archive_app_logs.py moves older AppLog rows to compressed files
+    APPLOG_RETENTION_DAYS = 90
+    APPLOG_ARCHIVE_DIR = os.path.join(BASE_DIR, "instance", "log_archive")
+    # seconds the user loader reuses a user snapshot (0 disables the cache)
+    USER_CACHE_TTL = 30
+    USER_CACHE_MAX_SIZE = 10000
+    # seconds between checks of static/posters for changed files
+    POSTER_MANIFEST_CHECK_SECONDS = 2
+    POSTER_MANIFEST_CACHE = os.path.join(BASE_DIR, "instance", "poster_manifest.json")
+    # widths rendered by scripts/build_poster_derivatives.py (card grid,
+    # detail page, high-DPI screens); each also gets a WebP variant
+    POSTER_DERIVATIVE_WIDTHS = {"card": 400, "detail": 600, "retina": 900}
+    POSTER_JPEG_QUALITY = 82
+    POSTER_WEBP_QUALITY = 80
+    # output of scripts/build_assets.py; static URLs use it when it exists
+    ASSET_DIST_DIR = os.path.join(BASE_DIR, "static", "dist")
+    # full-page cache (see utils/page_cache.py); logged-in users are cached
+    # per user, and only on pages that do not embed their likes
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_ENDPOINTS = ("film.index", "film.list_films", "film.film_detail")
+    PAGE_CACHE_USER_ENDPOINTS = ("film.index", "film.list_films")
+    PAGE_CACHE_TTL = 60
+    PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    # SQLite file shared by all workers (None keeps the cache per process)
+    PAGE_CACHE_SHARED_PATH = os.environ.get("PAGE_CACHE_SHARED_PATH")
+    PAGE_CACHE_SHARED_MAX_BYTES = 64 * 1024 * 1024
+    # Prometheus /metrics (see utils/metrics.py); without a token only
+    # loopback clients may scrape it
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # refuse every scrape while METRICS_TOKEN is unset (behind a reverse
+    # proxy every client looks like loopback)
+    METRICS_REQUIRE_TOKEN = False
+    # directory where workers publish their totals (None: per process)
+    METRICS_SHARED_DIR = os.environ.get("METRICS_SHARED_DIR")
+    METRICS_SHARED_INTERVAL = 5
+    # SQL instrumentation (see utils/query_stats.py): statements slower than
+    # this are logged with their query plan; None disables the log
+    SLOW_QUERY_SECONDS = 0.2
+    SLOW_QUERY_EXPLAIN = True
+    # flag a SELECT shape repeated this often in one request (None: off)
+    N_PLUS_ONE_THRESHOLD = None
+    N_PLUS_ONE_RAISE = False
 
 
 class DevelopmentConfig(Config):
@@ -14,6 +78,11 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
         BASE_DIR, "instance", "dev.db"
     )
+    # serve static/ and templates as edited, without a rebuild
+    ASSET_DIST_DIR = None
+    PAGE_CACHE_ENABLED = False
+    SLOW_QUERY_SECONDS = 0.05
+    N_PLUS_ONE_THRESHOLD = 5
 
 
 class ProductionConfig(Config):
@@ -23,6 +92,8 @@ class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         "DATABASE_URL"
     ) or "sqlite:///" + os.path.join(BASE_DIR, "instance", "app.db")
+    # SQLite has a single writer: serialize writes through the queue
+    WRITE_QUEUE_ENABLED = SQLALCHEMY_DATABASE_URI.startswith("sqlite")
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = "Strict"  # More secure than Lax
@@ -31,12 +102,30 @@ class ProductionConfig(Config):
     REMEMBER_COOKIE_SAMESITE = "Strict"  # More secure than Lax
     PERMANENT_SESSION_LIFETIME = 30 * 24 * 60 * 60  # 30 days in seconds
     LOG_LEVEL = "WARNING"
+    # web workers share cached pages and invalidations through this file
+    PAGE_CACHE_SHARED_PATH = Config.PAGE_CACHE_SHARED_PATH or os.path.join(
+        BASE_DIR, "instance", "page_cache.db"
+    )
+    METRICS_REQUIRE_TOKEN = True
+    METRICS_SHARED_DIR = Config.METRICS_SHARED_DIR or os.path.join(
+        BASE_DIR, "instance", "metrics"
+    )
 
 
 class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    TRENDING_CACHE_TTL = 0
+    TRENDING_TRACKER_ENABLED = False
+    COUNTER_BUFFER_ENABLED = False
+    APPLOG_ASYNC = False
+    POSTER_MANIFEST_CACHE = None
+    ASSET_DIST_DIR = None
+    PAGE_CACHE_ENABLED = False
+    RAISE_ON_LAZY_LOAD = True
+    N_PLUS_ONE_THRESHOLD = 5
+    N_PLUS_ONE_RAISE = True
 
 
 config = {
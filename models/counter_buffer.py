@@ -0,0 +1,229 @@
+"""
+Optional write-behind buffer for hot film counters.
+
+With ``COUNTER_BUFFER_ENABLED`` the film counter and ``interaction_daily``
+deltas of committed interaction writes are accumulated per process and
+written in one batched transaction by a flush thread every
+``COUNTER_BUFFER_FLUSH_MS`` milliseconds, or as soon as
+``COUNTER_BUFFER_MAX_EVENTS`` events are buffered, so a popular film's row
+is updated once per flush instead of once per like and requests never wait
+for the flush.
+
+Deltas are staged in the writing session and only reach the buffer after
+that session commits; a rollback drops them. Pages that show counters call
+:func:`overlay_pending` so readers see the unflushed deltas of this process.
+Other workers only see them once flushed, and the flush bypasses the
+Session commit hooks, so a flush that wrote anything empties the page cache
+(``utils/page_cache.py``) itself.
+Deltas still buffered when a worker crashes are lost; the counters are then
+recovered with ``scripts/backfill_stats.py`` and
+``scripts/backfill_interaction_daily.py``.
+"""
+
+import atexit
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+
+logger = logging.getLogger("interaction")
+
+_STAGED_KEY = "counter_buffer_staged"
+
+
+def _merge(target, deltas):
+    for name, delta in deltas.items():
+        target[name] = target.get(name, 0) + delta
+
+
+class CounterBuffer:
+    """Per-process accumulation of film and daily rollup counter deltas."""
+
+    def __init__(self, engine, flush_interval=0.5, max_events=200, on_flush=None):
+        self.engine = engine
+        # called after a flush that wrote deltas (e.g. PageCache.invalidate)
+        self.on_flush = on_flush
+        self.flush_interval = float(flush_interval)
+        self.max_events = int(max_events)
+        self._films = {}  # film_id -> {column: delta}
+        self._daily = {}  # (day, film_id) -> {column: delta}
+        self._events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # max_events reached: flush now
+
+    def __len__(self):
+        return self._events
+
+    def stage(self, session, film_id, day, film_deltas, daily_deltas):
+        """Stage deltas in ``session``; they are added when it commits."""
+        if film_deltas or daily_deltas:
+            session.info.setdefault(_STAGED_KEY, []).append(
+                (self, film_id, day, film_deltas, daily_deltas)
+            )
+
+    def add(self, film_id, day, film_deltas, daily_deltas):
+        """Accumulate committed deltas; ``max_events`` triggers a flush.
+
+        The flush thread is woken to do it. Without a thread (a flush
+        interval of 0) the caller flushes inline.
+        """
+        with self._lock:
+            if film_deltas:
+                _merge(self._films.setdefault(film_id, {}), film_deltas)
+            if daily_deltas:
+                _merge(self._daily.setdefault((day, film_id), {}), daily_deltas)
+            self._events += 1
+            due = self._events >= self.max_events
+        if due:
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self.flush()
+
+    def pending(self, film_id):
+        """Unflushed ``{column: delta}`` for a film (empty when none)."""
+        with self._lock:
+            return dict(self._films.get(film_id, {}))
+
+    def merge(self, counters, extra=None):
+        """Return FilmCounters with the unflushed (and ``extra``) deltas added."""
+        if counters is None:
+            return None
+        deltas = self.pending(counters.film_id)
+        _merge(deltas, extra or {})
+        if not deltas:
+            return counters
+        return counters._replace(
+            **{
+                name: max(0, getattr(counters, name) + delta)
+                for name, delta in deltas.items()
+            }
+        )
+
+    def flush(self):
+        """Write every buffered delta in one transaction.
+
+        Returns the number of events flushed. On failure the deltas are put
+        back so the next flush retries them.
+        """
+        from .counters import apply_film_deltas, upsert_increment
+        from .interaction_daily import InteractionDaily
+
+        with self._flush_lock:
+            with self._lock:
+                films, self._films = self._films, {}
+                daily, self._daily = self._daily, {}
+                events, self._events = self._events, 0
+            if not films and not daily:
+                return 0
+            try:
+                with self.engine.begin() as connection:
+                    for film_id in sorted(films):
+                        apply_film_deltas(film_id, films[film_id], connection)
+                    for (day, film_id), deltas in sorted(daily.items()):
+                        upsert_increment(
+                            InteractionDaily,
+                            {"day": day, "film_id": film_id},
+                            deltas,
+                            connection=connection,
+                        )
+            except Exception as e:
+                logger.error(f"Counter buffer flush failed: {e}")
+                with self._lock:
+                    for film_id, deltas in films.items():
+                        _merge(self._films.setdefault(film_id, {}), deltas)
+                    for key, deltas in daily.items():
+                        _merge(self._daily.setdefault(key, {}), deltas)
+                    self._events += events
+                return 0
+        if self.on_flush is not None:
+            try:
+                self.on_flush()
+            except Exception as e:
+                logger.error(f"Counter buffer flush callback failed: {e}")
+        return events
+
+    def start(self):
+        """Flush every ``flush_interval`` seconds from a daemon thread."""
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="counter-buffer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flush thread and write what is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break  # stop() writes the rest
+            self.flush()
+
+
+@event.listens_for(Session, "after_commit")
+def _hand_over_staged(session):
+    for buffer, film_id, day, film_deltas, daily_deltas in session.info.pop(
+        _STAGED_KEY, []
+    ):
+        buffer.add(film_id, day, film_deltas, daily_deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_staged(session):
+    session.info.pop(_STAGED_KEY, None)
+
+
+def get_buffer():
+    """Return the app's counter buffer, or ``None`` when write-behind is off."""
+    if not current_app.config.get("COUNTER_BUFFER_ENABLED", False):
+        return None
+    buffer = current_app.extensions.get("counter_buffer")
+    if buffer is None:
+        page_cache = current_app.extensions.get("page_cache")
+        buffer = CounterBuffer(
+            db.engine,
+            flush_interval=current_app.config.get("COUNTER_BUFFER_FLUSH_MS", 500)
+            / 1000.0,
+            max_events=current_app.config.get("COUNTER_BUFFER_MAX_EVENTS", 200),
+            on_flush=page_cache.invalidate if page_cache is not None else None,
+        )
+        current_app.extensions["counter_buffer"] = buffer
+        buffer.start()
+    return buffer
+
+
+def overlay_pending(films):
+    """Add this process's unflushed deltas to loaded Film objects.
+
+    Values are set as committed state, so the films are not marked dirty and
+    the overlay is never written back. Each loaded film is overlaid once.
+    """
+    buffer = get_buffer()
+    if buffer is None:
+        return
+    for film in films:
+        state = inspect(film)
+        if state.info.get("counter_overlay"):
+            continue
+        state.info["counter_overlay"] = True
+        for name, delta in buffer.pending(film.id).items():
+            set_committed_value(film, name, max(0, (getattr(film, name) or 0) + delta))
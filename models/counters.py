@@ -0,0 +1,208 @@
+"""
+Atomic counter maintenance for interaction writes.
+
+Every write path turns its before/after InteractionState snapshots into
+deltas with :func:`models.interaction.interaction_deltas` and applies them
+here as single ``UPDATE ... SET col = col + :d`` statements (``RETURNING``
+the film counters), so concurrent likes never overwrite each other and no
+extra refresh round trip is needed.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, func, update
+
+from app import db
+
+from .film import Film
+from .interaction import interaction_deltas
+from .interaction_daily import InteractionDaily
+from .user_stats import UserStats
+
+# delta key -> film column
+FILM_COLUMNS = {
+    "likes": "like_count",
+    "ratings": "rating_count",
+    "rating_sum": "rating_sum",
+    "reviews": "review_count",
+    "rating_1": "rating_1",
+    "rating_2": "rating_2",
+    "rating_3": "rating_3",
+    "rating_4": "rating_4",
+    "rating_5": "rating_5",
+}
+
+_COUNTER_FIELDS = [
+    "like_count",
+    "rating_count",
+    "rating_sum",
+    "review_count",
+    "rating_1",
+    "rating_2",
+    "rating_3",
+    "rating_4",
+    "rating_5",
+]
+
+
+class FilmCounters(namedtuple("FilmCounters", ["film_id"] + _COUNTER_FIELDS)):
+    """Persisted film counters as returned by the UPDATE."""
+
+    @property
+    def average_rating(self):
+        return Film.average_rating.fget(self)
+
+    @property
+    def rating_distribution(self):
+        return Film.rating_distribution.fget(self)
+
+    def to_json(self):
+        return {
+            "average_rating": self.average_rating,
+            "like_count": self.like_count,
+            "rating_count": self.rating_count,
+            "review_count": self.review_count,
+            "rating_distribution": [
+                {"stars": star, "count": count}
+                for star, count, _ in self.rating_distribution
+            ],
+        }
+
+
+def increment(column, delta):
+    """SQL expression ``max(0, coalesce(column, 0) + delta)``."""
+    value = func.coalesce(column, 0) + delta
+    return case((value < 0, 0), else_=value)
+
+
+def film_deltas(deltas):
+    """Map interaction deltas onto film column deltas."""
+    return {
+        FILM_COLUMNS[key]: value for key, value in deltas.items() if key in FILM_COLUMNS
+    }
+
+
+def apply_film_deltas(film_id, column_deltas, connection=None):
+    """Apply ``{column: delta}`` to a film in one statement.
+
+    Returns the film's FilmCounters after the update (or a plain read when
+    there is nothing to change), or ``None`` if the film does not exist.
+    Backends without ``UPDATE ... RETURNING`` (SQLite before 3.35) read the
+    counters back with a SELECT in the same transaction. Runs on
+    ``connection`` when given, otherwise in the session.
+    """
+    execute = (connection or db.session).execute
+    dialect = (connection or db.session.get_bind()).dialect
+    columns = [Film.id] + [getattr(Film, name) for name in _COUNTER_FIELDS]
+    select = db.select(*columns).where(Film.id == film_id)
+    if column_deltas:
+        stmt = (
+            update(Film)
+            .where(Film.id == film_id)
+            .values(
+                {
+                    name: increment(getattr(Film, name), delta)
+                    for name, delta in column_deltas.items()
+                }
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if dialect.update_returning:
+            row = execute(stmt.returning(*columns)).first()
+        else:
+            row = execute(select).first() if execute(stmt).rowcount else None
+    else:
+        row = execute(select).first()
+    if row is None:
+        return None
+    return FilmCounters(row[0], *[value or 0 for value in row[1:]])
+
+
+def upsert_increment(model, keys, column_deltas, connection=None):
+    """Add ``column_deltas`` to the ``model`` row identified by ``keys``.
+
+    Uses a single ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite and
+    PostgreSQL; other backends fall back to UPDATE, then INSERT when no
+    row matched. Runs on ``connection`` when given, otherwise in the session.
+    """
+    if not column_deltas:
+        return
+    table = model.__table__
+    execute = (connection or db.session).execute
+    dialect = (connection or db.session.get_bind()).dialect.name
+    values = dict(keys)
+    values.update({name: max(0, delta) for name, delta in column_deltas.items()})
+    increments = {
+        name: increment(table.c[name], delta) for name, delta in column_deltas.items()
+    }
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=increments)
+        execute(stmt)
+        return
+
+    where = [table.c[name] == value for name, value in keys.items()]
+    result = execute(update(table).where(*where).values(increments))
+    if result.rowcount == 0:
+        execute(table.insert().values(values))
+
+
+def apply_interaction_change(user_id, film_id, created_at, before, after):
+    """Apply one interaction change to every counter in the current transaction.
+
+    Updates the film counters, the ``interaction_daily`` rollup and the
+    user's ``user_stats`` row. The caller commits. Returns FilmCounters.
+
+    With the write-behind buffer enabled (see ``models/counter_buffer.py``)
+    the film and rollup deltas are staged and handed to the buffer on
+    commit instead; the returned counters include the unflushed deltas.
+    """
+    changes = [(film_id, created_at, before, after)]
+    return apply_interaction_changes(user_id, changes)[film_id]
+
+
+def apply_interaction_changes(user_id, changes):
+    """Apply several interaction changes of one user in the current transaction.
+
+    ``changes`` holds ``(film_id, created_at, before, after)`` tuples, at
+    most one per film. Each film gets one counter update and one rollup
+    upsert; the user's ``user_stats`` row gets the summed deltas in a single
+    UPDATE. Returns ``{film_id: FilmCounters}``.
+    """
+    from .counter_buffer import get_buffer
+
+    # make pending interaction/review rows visible to the statements below
+    db.session.flush()
+    buffer = get_buffer()
+    user_deltas = {}
+    counters = {}
+    for film_id, created_at, before, after in changes:
+        deltas = interaction_deltas(before, after)
+        for key, value in deltas.items():
+            user_deltas[key] = user_deltas.get(key, 0) + value
+        day = (created_at or datetime.utcnow()).date()
+        if buffer is not None:
+            column_deltas = film_deltas(deltas)
+            buffer.stage(
+                db.session,
+                film_id,
+                day,
+                column_deltas,
+                InteractionDaily.columns(deltas),
+            )
+            counters[film_id] = buffer.merge(
+                apply_film_deltas(film_id, {}), column_deltas
+            )
+        else:
+            counters[film_id] = apply_film_deltas(film_id, film_deltas(deltas))
+            InteractionDaily.apply_deltas(film_id, created_at or day, deltas)
+    UserStats.apply_deltas(
+        user_id, {key: value for key, value in user_deltas.items() if value}
+    )
+    return counters
@@ -15,7 +15,18 @@ class Film(db.Model):
     like_count = db.Column(db.Integer, default=0)
     rating_count = db.Column(db.Integer, default=0)
     rating_sum = db.Column(db.Integer, default=0)
+    # rating histogram (number of 1..5 star ratings) and written review count
+    rating_1 = db.Column(db.Integer, default=0)
+    rating_2 = db.Column(db.Integer, default=0)
+    rating_3 = db.Column(db.Integer, default=0)
+    rating_4 = db.Column(db.Integer, default=0)
+    rating_5 = db.Column(db.Integer, default=0)
+    review_count = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # bumped by every update, counter updates included (see models/versions.py)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     # Relationship definitions
     interactions = db.relationship("UserFilmInteraction", backref="film", lazy=True)
@@ -30,4 +41,16 @@ class Film(db.Model):
             return float(self.rating_sum) / float(self.rating_count)
         return 0.0
 
+    @property
+    def rating_distribution(self):
+        """Return [(stars, count, percent), ...] from 5 stars down to 1"""
+        counts = [
+            (star, getattr(self, f"rating_{star}") or 0) for star in range(5, 0, -1)
+        ]
+        total = sum(count for _, count in counts)
+        return [
+            (star, count, (100.0 * count / total) if total else 0.0)
+            for star, count in counts
+        ]
+
     # note: like_count is persisted as a column for performance
@@ -1,7 +1,63 @@
+from collections import namedtuple
 from datetime import datetime
 
+from flask import current_app
+from sqlalchemy.orm import raiseload
+
 from app import db
 
+from .review import FilmReview
+
+
+def lazy_guard():
+    """Query options that turn stray lazy relationship loads into errors.
+
+    Enabled with ``RAISE_ON_LAZY_LOAD`` (on under TestingConfig) so list
+    queries that forget to eager-load a relationship fail loudly in tests.
+    """
+    if current_app.config.get("RAISE_ON_LAZY_LOAD"):
+        return (raiseload("*"),)
+    return ()
+
+
+# Counter-relevant state of an interaction row (None when the row does not exist)
+InteractionState = namedtuple("InteractionState", ["liked", "rating", "has_review"])
+
+
+def state_counts(state):
+    """Counter contributions of one interaction state (all zero for None)."""
+    counts = {
+        "interactions": 0,
+        "likes": 0,
+        "ratings": 0,
+        "rating_sum": 0,
+        "reviews": 0,
+        "engaged": 0,
+    }
+    for star in range(1, 6):
+        counts[f"rating_{star}"] = 0
+    if state is None:
+        return counts
+    counts["interactions"] = 1
+    counts["likes"] = 1 if state.liked else 0
+    counts["reviews"] = 1 if state.has_review else 0
+    counts["engaged"] = 1 if (state.liked or state.has_review) else 0
+    if state.rating is not None:
+        counts["ratings"] = 1
+        counts["rating_sum"] = int(state.rating)
+        counts[f"rating_{int(state.rating)}"] = 1
+    return counts
+
+
+def interaction_deltas(before, after):
+    """Non-zero counter deltas between two InteractionState snapshots.
+
+    ``before`` is ``None`` for a new interaction and ``after`` is ``None``
+    for a deleted one. Shared by the film, rollup and user stats counters.
+    """
+    old, new = state_counts(before), state_counts(after)
+    return {key: new[key] - old[key] for key in new if new[key] != old[key]}
+
 
 class UserFilmInteraction(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
@@ -9,16 +65,66 @@ class UserFilmInteraction(db.Model):
 
     liked = db.Column(db.Boolean, default=False)
     rating = db.Column(db.Integer, nullable=True)  # 1-5分
-    review_text = db.Column(db.Text, nullable=True)
+    # review text lives in film_review; this flag keeps scans off that table
+    has_review = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    review = db.relationship(
+        "FilmReview",
+        uselist=False,
+        cascade="all, delete-orphan",
+        backref=db.backref("interaction", uselist=False),
+    )
+
     def __repr__(self):
         return f"<Interaction User:{self.user_id} Film:{self.film_id}>"
 
     @property
-    def has_review(self):
-        """检查是否有评论"""
-        return self.review_text is not None and self.review_text.strip() != ""
+    def review_text(self):
+        """评论内容（无评论时为 None；仅在有评论时加载 film_review）"""
+        if not self.has_review or self.review is None:
+            return None
+        return self.review.text
+
+    @review_text.setter
+    def review_text(self, text):
+        """写入或清除评论，同时维护 has_review 标记"""
+        if text is not None and text.strip() != "":
+            if self.has_review and self.review is not None:
+                self.review.text = text
+            else:
+                self.review = FilmReview(text=text)
+            self.has_review = True
+        else:
+            if self.has_review:
+                # delete-orphan removes the film_review row
+                self.review = None
+            self.has_review = False
+
+    def snapshot(self):
+        """返回用于计数器差量计算的状态快照"""
+        return InteractionState(bool(self.liked), self.rating, bool(self.has_review))
+
+    @classmethod
+    def liked_film_ids(cls, user_id, film_ids):
+        """Sorted ids of the given films that one user has liked.
+
+        One primary-key range read; films the user never touched are simply
+        absent.
+        """
+        if not film_ids:
+            return []
+        return list(
+            db.session.scalars(
+                db.select(cls.film_id)
+                .where(
+                    cls.user_id == user_id,
+                    cls.film_id.in_(film_ids),
+                    cls.liked.is_(True),
+                )
+                .order_by(cls.film_id)
+            )
+        )
@@ -0,0 +1,110 @@
+"""
+Daily interaction rollup keyed by (day, film_id).
+
+Each interaction is bucketed by the day it was created; the row counts
+reflect the current state of those interactions, so the rollup always
+matches a rebuild from ``user_film_interaction``.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func
+
+from app import db
+
+from .interaction import UserFilmInteraction
+
+# interaction delta key -> rollup column
+DAILY_COLUMNS = {
+    "likes": "likes",
+    "ratings": "ratings",
+    "reviews": "reviews",
+    "engaged": "engaged",
+    "interactions": "unique_users",
+}
+
+
+class InteractionDaily(db.Model):
+    __tablename__ = "interaction_daily"
+
+    day = db.Column(db.Date, primary_key=True)
+    film_id = db.Column(db.Integer, db.ForeignKey("film.id"), primary_key=True)
+
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    ratings = db.Column(db.Integer, default=0, nullable=False)
+    reviews = db.Column(db.Integer, default=0, nullable=False)
+    # interactions that are liked or reviewed (what trending counts)
+    engaged = db.Column(db.Integer, default=0, nullable=False)
+    unique_users = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<InteractionDaily {self.day} Film:{self.film_id}>"
+
+    @staticmethod
+    def columns(deltas):
+        """Map interaction deltas onto rollup column deltas."""
+        return {
+            DAILY_COLUMNS[key]: value
+            for key, value in deltas.items()
+            if key in DAILY_COLUMNS
+        }
+
+    @staticmethod
+    def apply_deltas(film_id, created_at, deltas):
+        """Apply interaction deltas (see ``interaction_deltas``) to the
+        rollup row of ``created_at``'s day with one atomic upsert."""
+        from .counters import upsert_increment
+
+        day = created_at or datetime.utcnow()
+        if isinstance(day, datetime):
+            day = day.date()
+        upsert_increment(
+            InteractionDaily,
+            {"day": day, "film_id": film_id},
+            InteractionDaily.columns(deltas),
+        )
+
+    @staticmethod
+    def rebuild():
+        """Rebuild the whole rollup from the interaction history.
+
+        Returns the number of rollup rows written. Does not commit.
+        """
+        has_review = UserFilmInteraction.has_review.is_(True)
+        day_col = func.date(UserFilmInteraction.created_at)
+        select = (
+            db.select(
+                day_col,
+                UserFilmInteraction.film_id,
+                func.sum(case((UserFilmInteraction.liked.is_(True), 1), else_=0)),
+                func.count(UserFilmInteraction.rating),
+                func.sum(case((has_review, 1), else_=0)),
+                func.sum(
+                    case(
+                        (db.or_(UserFilmInteraction.liked.is_(True), has_review), 1),
+                        else_=0,
+                    )
+                ),
+                func.count(func.distinct(UserFilmInteraction.user_id)),
+            )
+            .where(UserFilmInteraction.created_at.isnot(None))
+            .group_by(day_col, UserFilmInteraction.film_id)
+        )
+
+        table = InteractionDaily.__table__
+        db.session.execute(table.delete())
+        result = db.session.execute(
+            table.insert().from_select(
+                [
+                    "day",
+                    "film_id",
+                    "likes",
+                    "ratings",
+                    "reviews",
+                    "engaged",
+                    "unique_users",
+                ],
+                select,
+            )
+        )
+        return result.rowcount
@@ -1,11 +1,36 @@
+import base64
 from datetime import datetime
 
 from app import db
 
 
+def encode_log_cursor(timestamp, log_id):
+    """Opaque keyset cursor for log pages: position after (timestamp, id)."""
+    raw = f"{timestamp.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_log_cursor(cursor):
+    """Inverse of :func:`encode_log_cursor`; raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = (
+            base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise ValueError(f"invalid log cursor: {cursor!r}")
+
+
 class AppLog(db.Model):
     """应用层日志表，用于审计和记录关键操作"""
 
+    __table_args__ = (
+        # keyset paging of one user's / one action's logs (newest first)
+        db.Index("ix_app_log_user_timestamp", "user_id", "timestamp"),
+        db.Index("ix_app_log_action_timestamp", "action", "timestamp"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
@@ -43,63 +68,104 @@ class AppLog(db.Model):
         user_agent=None,
         extra_data=None,
     ):
-        """记录操作日志的静态方法"""
+        """记录操作日志的静态方法
+
+        日志先序列化为字典交给后台写线程批量插入（见 models/log_writer.py），
+        不会提交调用方的会话；APPLOG_ASYNC 关闭时用独立连接同步写入。
+        """
         import json
 
         from flask import request
 
+        from .log_writer import get_log_writer
+
         # 获取请求信息
         if ip_address is None and request:
             ip_address = request.remote_addr
         if user_agent is None and request:
             user_agent = request.headers.get("User-Agent")
 
-        # 创建日志记录
-        log_entry = AppLog(
-            action=action,
-            resource_type=resource_type,
-            description=description,
-            resource_id=resource_id,
-            ip_address=ip_address,
-            user_agent=user_agent,
-        )
-
-        if user:
-            log_entry.user_id = user.id
-            log_entry.username = user.username
-
-        if extra_data:
-            log_entry.extra_data = json.dumps(extra_data, ensure_ascii=False)
+        # 序列化日志记录（每条字段相同，便于批量插入）
+        values = {
+            "timestamp": datetime.utcnow(),
+            "user_id": user.id if user else None,
+            "username": user.username if user else None,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "description": description,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "extra_data": (
+                json.dumps(extra_data, ensure_ascii=False) if extra_data else None
+            ),
+        }
+
+        writer = get_log_writer()
+        if writer is not None:
+            # a full queue drops the entry; the writer counts and reports it
+            writer.put(values)
+            return
 
         try:
-            db.session.add(log_entry)
-            db.session.commit()
+            with db.engine.begin() as connection:
+                AppLog.insert_rows([values], connection)
         except Exception as e:
             # 日志记录失败不应该影响主业务流程
             print(f"Failed to log action: {e}")
-            db.session.rollback()
 
     @staticmethod
-    def get_recent_logs(limit=50):
-        """获取最近的日志记录"""
-        return AppLog.query.order_by(AppLog.timestamp.desc()).limit(limit).all()
+    def insert_rows(rows, connection=None):
+        """批量插入已序列化的日志（一条多行 INSERT）"""
+        if rows:
+            (connection or db.session).execute(AppLog.__table__.insert(), rows)
 
     @staticmethod
-    def get_user_logs(user_id, limit=20):
-        """获取特定用户的日志记录"""
-        return (
-            AppLog.query.filter_by(user_id=user_id)
-            .order_by(AppLog.timestamp.desc())
-            .limit(limit)
+    def log_page(user_id=None, action=None, limit=50, cursor=None):
+        """按时间倒序获取一页日志（keyset 分页）
+
+        Filtering by ``user_id`` or ``action`` walks the matching composite
+        index. Pass the previous page's ``next_cursor`` as ``cursor``.
+        Returns ``(logs, next_cursor)``; ``next_cursor`` is None on the last
+        page.
+        """
+        query = AppLog.query
+        if user_id is not None:
+            query = query.filter(AppLog.user_id == user_id)
+        if action is not None:
+            query = query.filter(AppLog.action == action)
+        if cursor:
+            timestamp, log_id = decode_log_cursor(cursor)
+            query = query.filter(
+                db.or_(
+                    AppLog.timestamp < timestamp,
+                    db.and_(AppLog.timestamp == timestamp, AppLog.id < log_id),
+                )
+            )
+
+        # one extra row tells whether another page exists
+        rows = (
+            query.order_by(AppLog.timestamp.desc(), AppLog.id.desc())
+            .limit(limit + 1)
             .all()
         )
+        logs = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit and logs[-1].timestamp is not None:
+            next_cursor = encode_log_cursor(logs[-1].timestamp, logs[-1].id)
+        return logs, next_cursor
+
+    @staticmethod
+    def get_recent_logs(limit=50):
+        """获取最近的日志记录（只取第一页；翻页请用 log_page）"""
+        return AppLog.log_page(limit=limit)[0]
+
+    @staticmethod
+    def get_user_logs(user_id, limit=20):
+        """获取特定用户的日志记录（只取第一页；翻页请用 log_page）"""
+        return AppLog.log_page(user_id=user_id, limit=limit)[0]
 
     @staticmethod
     def get_logs_by_action(action, limit=20):
-        """获取特定操作类型的日志记录"""
-        return (
-            AppLog.query.filter_by(action=action)
-            .order_by(AppLog.timestamp.desc())
-            .limit(limit)
-            .all()
-        )
+        """获取特定操作类型的日志记录（只取第一页；翻页请用 log_page）"""
+        return AppLog.log_page(action=action, limit=limit)[0]
@@ -0,0 +1,81 @@
+"""
+AppLog retention: move old rows to compressed, date-partitioned archives.
+
+Rows older than the cutoff are read in batches (oldest first), appended as
+JSON lines to ``<archive_dir>/YYYY/MM/app_log-YYYY-MM-DD.jsonl.gz`` and only
+then deleted, one chunk per transaction, so the table lock is held briefly
+and a crash can at worst leave a batch both archived and still in the table.
+Each archived line keeps the row ``id`` to tell such duplicates apart.
+"""
+
+import gzip
+import json
+import os
+
+from app import db
+
+from .log import AppLog
+
+
+def archive_path(archive_dir, day):
+    """Archive file holding the rows logged on ``day``."""
+    return os.path.join(
+        archive_dir,
+        f"{day:%Y}",
+        f"{day:%m}",
+        f"app_log-{day:%Y-%m-%d}.jsonl.gz",
+    )
+
+
+def _serialize(row):
+    entry = dict(row)
+    if entry.get("timestamp") is not None:
+        entry["timestamp"] = entry["timestamp"].isoformat()
+    return entry
+
+
+def archive_logs(before, archive_dir, batch_size=1000):
+    """Archive and delete AppLog rows with ``timestamp < before``.
+
+    Returns the number of rows moved. Each batch is committed on its own.
+    """
+    table = AppLog.__table__
+    moved = 0
+    while True:
+        rows = (
+            db.session.execute(
+                db.select(table)
+                .where(table.c.timestamp < before)
+                .order_by(table.c.timestamp, table.c.id)
+                .limit(batch_size)
+            )
+            .mappings()
+            .all()
+        )
+        if not rows:
+            break
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row["timestamp"].date(), []).append(_serialize(row))
+        for day, entries in by_day.items():
+            path = archive_path(archive_dir, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # appending adds a gzip member; readers see one continuous stream
+            with gzip.open(path, "at", encoding="utf-8") as fh:
+                for entry in entries:
+                    fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        ids = [row["id"] for row in rows]
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(rows)
+    return moved
+
+
+def read_archive(path):
+    """Yield the archived entries of one archive file."""
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
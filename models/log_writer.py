@@ -0,0 +1,158 @@
+"""
+Background writer for AppLog entries.
+
+``AppLog.log_action`` only serializes the entry into a plain dict and puts
+it on a bounded queue; a daemon thread collects up to ``APPLOG_BATCH_SIZE``
+entries (or whatever arrived within ``APPLOG_FLUSH_SECONDS``) and inserts
+them with one multi-row INSERT. Requests never wait for, or commit, the
+audit log. When the queue is full the entry is dropped, counted in
+``dropped`` and in the ``applog_dropped`` metric, and a warning with the
+running total is logged at most every ``DROP_LOG_INTERVAL`` seconds.
+Remaining entries are written when the process exits.
+
+With the single-writer queue enabled (see ``models/write_queue.py``) each
+batch is handed to it as one job, so SQLite still sees a single writer.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from app import db
+
+logger = logging.getLogger("app")
+
+# seconds between "entries dropped" warnings while the queue stays full
+DROP_LOG_INTERVAL = 10.0
+
+_STOP = object()
+_create_lock = threading.Lock()
+
+
+class LogWriter:
+    """Bounded queue of AppLog rows drained by a batching thread."""
+
+    def __init__(self, app, maxsize=10000, batch_size=200, flush_interval=1.0):
+        self.app = app
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=int(maxsize))
+        self._thread = None
+        self._drop_lock = threading.Lock()
+        self._drop_logged = float("-inf")  # time of the last drop warning
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def put(self, values):
+        """Queue one serialized entry; returns False (and counts it) if full."""
+        try:
+            self._queue.put_nowait(values)
+        except queue.Full:
+            self._count_drop()
+            return False
+        return True
+
+    def _count_drop(self):
+        from utils.metrics import count
+
+        now = time.monotonic()
+        with self._drop_lock:
+            self.dropped += 1
+            dropped = self.dropped
+            warn = now - self._drop_logged >= DROP_LOG_INTERVAL
+            if warn:
+                self._drop_logged = now
+        if has_app_context():
+            count("applog_dropped")
+        if warn:
+            logger.warning(
+                f"App log queue is full; dropping entries ({dropped} dropped so far)"
+            )
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="applog-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write everything still queued and stop the thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self):
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                try:
+                    first = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                if first is _STOP:
+                    break
+                rows = [first]
+                while len(rows) < self.batch_size:
+                    try:
+                        values = self._queue.get(timeout=0.05)
+                    except queue.Empty:
+                        break
+                    if values is _STOP:
+                        stopping = True
+                        break
+                    rows.append(values)
+                self._write(rows)
+
+    def _write(self, rows):
+        from .log import AppLog
+        from .write_queue import WriteQueueError, get_write_queue
+
+        try:
+            write_queue = get_write_queue()
+            if write_queue is not None:
+                try:
+                    write_queue.run(AppLog.insert_rows, rows)
+                    self.written += len(rows)
+                    return
+                except WriteQueueError:
+                    # queue busy or already stopped at shutdown: write directly
+                    pass
+            with db.engine.begin() as connection:
+                AppLog.insert_rows(rows, connection)
+            self.written += len(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} app log entries: {e}")
+
+
+def get_log_writer():
+    """Return the app's log writer, or ``None`` when ``APPLOG_ASYNC`` is off."""
+    if not current_app.config.get("APPLOG_ASYNC", True):
+        return None
+    writer = current_app.extensions.get("applog_writer")
+    if writer is None:
+        with _create_lock:
+            writer = current_app.extensions.get("applog_writer")
+            if writer is None:
+                writer = LogWriter(
+                    current_app._get_current_object(),
+                    maxsize=current_app.config.get("APPLOG_QUEUE_SIZE", 10000),
+                    batch_size=current_app.config.get("APPLOG_BATCH_SIZE", 200),
+                    flush_interval=current_app.config.get("APPLOG_FLUSH_SECONDS", 1.0),
+                )
+                current_app.extensions["applog_writer"] = writer
+                writer.start()
+    return writer
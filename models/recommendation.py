@@ -146,14 +146,12 @@ class RecommendationEngine:
 
         normalized_recommendations.sort(key=lambda x: x[1], reverse=True)
 
-        # 获取电影对象并返回前top_n个
-        result = []
-        for film_id, score in normalized_recommendations[:top_n]:
-            film = Film.query.get(film_id)
-            if film:
-                result.append((film, score))
-
-        return result
+        # 获取电影对象并返回前top_n个（一次 IN 查询）
+        top = normalized_recommendations[:top_n]
+        films = {
+            f.id: f for f in Film.query.filter(Film.id.in_([fid for fid, _ in top]))
+        }
+        return [(films[fid], score) for fid, score in top if fid in films]
 
     def _get_popular_films(self, top_n: int = 10) -> List[Tuple[Film, float]]:
         """获取热门电影作为备选推荐"""
@@ -168,9 +166,13 @@ class RecommendationEngine:
 
         # 获取相似用户的信息
         similar_users = self.get_similar_users(user_id, top_n=5)
+        users = {
+            u.id: u
+            for u in User.query.filter(User.id.in_([uid for uid, _ in similar_users]))
+        }
         similar_user_objects = []
         for sim_user_id, similarity in similar_users:
-            user = User.query.get(sim_user_id)
+            user = users.get(sim_user_id)
             if user:
                 similar_user_objects.append(
                     {
@@ -21,6 +21,14 @@ MODEL_FILE = os.path.join(
 )
 
 
+def _hydrate(ranked):
+    """[(film_id, score)] -> [(Film, score)] with one IN query, keeping order"""
+    films = {
+        f.id: f for f in Film.query.filter(Film.id.in_([fid for fid, _ in ranked]))
+    }
+    return [(films[fid], score) for fid, score in ranked if fid in films]
+
+
 class ItemBasedRecommender:
     def __init__(self):
         self._load_data()
@@ -84,12 +92,7 @@ class ItemBasedRecommender:
             return [(f, f.like_count / 100.0) for f in films]
 
         ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        result = []
-        for fid, sc in ranked:
-            film = Film.query.get(fid)
-            if film:
-                result.append((film, sc))
-        return result
+        return _hydrate(ranked)
 
 
 class MatrixFactorizationRecommender:
@@ -209,12 +212,7 @@ class MatrixFactorizationRecommender:
         }
         candidates = [(fid, sc) for fid, sc in scores.items() if fid not in interacted]
         candidates.sort(key=lambda x: x[1], reverse=True)
-        result = []
-        for fid, sc in candidates[:top_n]:
-            film = Film.query.get(fid)
-            if film:
-                result.append((film, float(sc)))
-        return result
+        return _hydrate([(fid, float(sc)) for fid, sc in candidates[:top_n]])
 
 
 # 全局实例
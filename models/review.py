@@ -0,0 +1,121 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import db
+
+
+def encode_review_cursor(created_at, user_id):
+    """Opaque keyset cursor for review pages: position after (created_at, user)."""
+    raw = f"{created_at.isoformat()}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_review_cursor(cursor):
+    """Inverse of :func:`encode_review_cursor`; raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, user_id = (
+            base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(created_at), int(user_id)
+    except Exception:
+        raise ValueError(f"invalid review cursor: {cursor!r}")
+
+
+class FilmReview(db.Model):
+    """用户对电影的文字评论，与互动记录一对一（主键相同）
+
+    Kept out of ``user_film_interaction`` so the like/rating/trending scans
+    over interaction rows do not read review text.
+    """
+
+    __tablename__ = "film_review"
+    __table_args__ = (
+        db.ForeignKeyConstraint(
+            ["user_id", "film_id"],
+            ["user_film_interaction.user_id", "user_film_interaction.film_id"],
+            ondelete="CASCADE",
+        ),
+        # keyset paging of a film's reviews (newest first)
+        db.Index("ix_film_review_film_created", "film_id", "created_at"),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    film_id = db.Column(db.Integer, db.ForeignKey("film.id"), primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def __repr__(self):
+        return f"<FilmReview User:{self.user_id} Film:{self.film_id}>"
+
+    @staticmethod
+    def review_page(film_id, limit=5, cursor=None, page=None):
+        """获取电影评论的一页（含作者用户名），单条查询完成
+
+        Reviews are ordered newest first. Pass ``cursor`` (from a previous
+        page's ``next_cursor``) for keyset paging or ``page`` for the legacy
+        offset paging. Returns ``(reviews, total, next_cursor)``; ``total``
+        counts all of the film's reviews and is ``None`` for cursor pages.
+        """
+        from .interaction import UserFilmInteraction
+        from .user import User
+
+        query = (
+            db.session.query(
+                FilmReview.user_id,
+                FilmReview.film_id,
+                UserFilmInteraction.rating,
+                FilmReview.text.label("review_text"),
+                FilmReview.created_at,
+                User.username,
+                func.count().over().label("total"),
+            )
+            .join(
+                UserFilmInteraction,
+                db.and_(
+                    UserFilmInteraction.user_id == FilmReview.user_id,
+                    UserFilmInteraction.film_id == FilmReview.film_id,
+                ),
+            )
+            .join(User, User.id == FilmReview.user_id)
+            .filter(FilmReview.film_id == film_id)
+            .order_by(FilmReview.created_at.desc(), FilmReview.user_id.desc())
+        )
+        if cursor:
+            created_at, user_id = decode_review_cursor(cursor)
+            query = query.filter(
+                db.or_(
+                    FilmReview.created_at < created_at,
+                    db.and_(
+                        FilmReview.created_at == created_at,
+                        FilmReview.user_id < user_id,
+                    ),
+                )
+            )
+        elif page and page > 1:
+            query = query.offset((page - 1) * limit)
+
+        # one extra row tells whether another page exists
+        rows = query.limit(limit + 1).all()
+        reviews = rows[:limit]
+
+        total = None
+        if not cursor:
+            if rows:
+                total = rows[0].total
+            elif page and page > 1:
+                # past the last page: the window count has no row to ride on
+                total = FilmReview.query.filter_by(film_id=film_id).count()
+            else:
+                total = 0
+
+        next_cursor = None
+        if len(rows) > limit and reviews[-1].created_at is not None:
+            last = reviews[-1]
+            next_cursor = encode_review_cursor(last.created_at, last.user_id)
+        return reviews, total, next_cursor
@@ -0,0 +1,130 @@
+"""
+Trending statistics for the recommendations page.
+
+The per-day chart is derived from the ``interaction_daily`` rollup rows of
+the trending window and cached per app for a short TTL. Films are ranked by
+the in-process decayed tracker (``models/trending_tracker.py``) when it has
+scores, and by the rollup's window counts otherwise. The tracker only sees
+the events its own worker served (plus the last checkpoint it restored), so
+that ranking is per worker and may differ between workers; each ranked film
+then shows its tracker score, never a count from the other source.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from utils.metrics import timed
+
+from .film import Film
+from .interaction_daily import InteractionDaily
+
+
+def _cache():
+    return current_app.extensions.setdefault("trending_cache", {})
+
+
+def clear_cache():
+    """Drop cached trending results for the current app."""
+    _cache().clear()
+
+
+def window_counts(days=7, now=None):
+    """Return ``(per_film, daily_interactions)`` for the last ``days``
+    calendar days (today included).
+
+    Counts are liked or reviewed interactions, bucketed by creation day.
+    ``per_film`` maps film id to its window total, ``daily_interactions`` is
+    a list of ``{"date": "YYYY-MM-DD", "count": int}`` from oldest to newest.
+    """
+    now = now or datetime.utcnow()
+    first_day = (now - timedelta(days=days - 1)).date()
+
+    # a few hundred rollup rows give both the per-film and the per-day totals
+    rows = InteractionDaily.query.filter(
+        InteractionDaily.day >= first_day, InteractionDaily.engaged > 0
+    ).with_entities(
+        InteractionDaily.day, InteractionDaily.film_id, InteractionDaily.engaged
+    )
+
+    per_film = {}
+    per_day = {}
+    for row in rows:
+        per_film[row.film_id] = per_film.get(row.film_id, 0) + row.engaged
+        day_key = row.day.strftime("%Y-%m-%d")
+        per_day[day_key] = per_day.get(day_key, 0) + row.engaged
+
+    # calendar days ending today, oldest first
+    daily_interactions = []
+    for i in range(days - 1, -1, -1):
+        day = (now - timedelta(days=i)).strftime("%Y-%m-%d")
+        daily_interactions.append({"date": day, "count": per_day.get(day, 0)})
+
+    return per_film, daily_interactions
+
+
+def _hydrate(film_ids, per_film, scores=None):
+    """Load the ranked films with one primary-key IN query, keeping order.
+
+    Items carry the value they were ranked by: ``score`` (tracker) when
+    ``scores`` is given, ``interaction_count`` (window count) otherwise.
+    """
+    films = {}
+    if film_ids:
+        films = {f.id: f for f in Film.query.filter(Film.id.in_(film_ids))}
+    trending_data = []
+    for film_id in film_ids:
+        if film_id not in films:
+            continue
+        if scores is not None:
+            item = {"film": films[film_id], "score": scores[film_id]}
+        else:
+            item = {"film": films[film_id], "interaction_count": per_film[film_id]}
+        trending_data.append(item)
+    return trending_data
+
+
+def compute_trending(days=7, limit=10, now=None):
+    """Return ``(trending_data, daily_interactions)`` ranked by window counts.
+
+    ``trending_data`` is a list of ``{"film": Film, "interaction_count": int}``
+    sorted by count; see :func:`window_counts` for ``daily_interactions``.
+    """
+    per_film, daily_interactions = window_counts(days=days, now=now)
+    top = sorted(per_film.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return _hydrate([film_id for film_id, _ in top], per_film), daily_interactions
+
+
+@timed("trending")
+def get_trending(days=7, limit=10):
+    """Trending films and daily chart data for the recommendations page.
+
+    Window counts are cached for ``TRENDING_CACHE_TTL`` seconds (0 disables
+    caching). When this worker's decayed tracker has scores, it decides the
+    ranking and each item has a ``score``; otherwise films are ranked by, and
+    show, their window ``interaction_count``.
+    """
+    from .trending_tracker import get_tracker
+
+    ttl = current_app.config.get("TRENDING_CACHE_TTL", 60)
+    cache = _cache()
+    entry = cache.get(days) if ttl else None
+    if entry and entry[0] > time.time():
+        per_film, daily_interactions = entry[1]
+    else:
+        per_film, daily_interactions = window_counts(days=days)
+        if ttl:
+            cache[days] = (time.time() + ttl, (per_film, daily_interactions))
+
+    tracker = get_tracker()
+    ranked = tracker.top(limit) if tracker is not None else []
+    if ranked:
+        scores = dict(ranked)
+        return (
+            _hydrate([film_id for film_id, _ in ranked], per_film, scores=scores),
+            daily_interactions,
+        )
+
+    top = sorted(per_film.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return _hydrate([film_id for film_id, _ in top], per_film), daily_interactions
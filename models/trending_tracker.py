@@ -0,0 +1,324 @@
+"""
+In-process trending tracker with exponentially time-decayed scores.
+
+Committed interaction events are fed to a bounded Space-Saving summary, so
+each event costs O(log K) at worst and reading the top films costs O(K).
+Scores use forward decay: an event at time ``t`` is stored with weight
+``exp(lambda * (t - landmark))`` and divided by the same factor at read time,
+so existing counters never need to be touched when time advances.
+
+A daemon thread checkpoints the scores to the ``trending_score`` table every
+``TRENDING_CHECKPOINT_SECONDS`` (and once more at exit) so a restarted worker
+can pick them up again; requests never wait for it. Each worker tracks the
+events it served itself and upserts one row per film it tracks, so a
+worker's checkpoint does not drop films only another worker has seen; for a
+film tracked by several workers the last writer wins. Rankings read from
+the tracker are therefore per worker (see ``models/trending.py``).
+"""
+
+import atexit
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+
+logger = logging.getLogger("recommendation")
+
+# rescale stored counters before exp() gets anywhere near float overflow
+_MAX_EXPONENT = 50.0
+
+
+class TrendingScore(db.Model):
+    """Checkpointed tracker state, one row per tracked film."""
+
+    __tablename__ = "trending_score"
+
+    film_id = db.Column(db.Integer, db.ForeignKey("film.id"), primary_key=True)
+    score = db.Column(db.Float, nullable=False, default=0.0)
+    # Space-Saving overestimation bound for this counter
+    error = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TrendingScore Film:{self.film_id} {self.score:.2f}>"
+
+
+class TrendingTracker:
+    """Space-Saving heavy hitters with exponentially decayed counts."""
+
+    def __init__(self, capacity=100, half_life=48 * 3600, now=None):
+        self.capacity = int(capacity)
+        self.decay_rate = math.log(2) / float(half_life)
+        self.landmark = time.time() if now is None else now
+        self._counters = {}  # film_id -> [forward-decayed count, error]
+        self._heap = []  # lazy min-heap of (count, film_id)
+        self._lock = threading.Lock()
+        self._dirty = False  # events recorded since the last checkpoint
+        self._engine = None
+        self._interval = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._counters)
+
+    def _rescale(self, now):
+        factor = math.exp(-self.decay_rate * (now - self.landmark))
+        for counter in self._counters.values():
+            counter[0] *= factor
+            counter[1] *= factor
+        self.landmark = now
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [(c[0], film_id) for film_id, c in self._counters.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        """Remove and return ``(film_id, counter)`` with the smallest count."""
+        while self._heap:
+            count, film_id = heapq.heappop(self._heap)
+            counter = self._counters.get(film_id)
+            # skip stale heap entries left behind by later increments
+            if counter is not None and counter[0] == count:
+                del self._counters[film_id]
+                return film_id, counter
+        return None, None
+
+    def record(self, film_id, weight=1.0, now=None):
+        """Add a weighted event for ``film_id``."""
+        if weight <= 0:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.decay_rate * (now - self.landmark) > _MAX_EXPONENT:
+                self._rescale(now)
+            increment = weight * math.exp(self.decay_rate * (now - self.landmark))
+
+            counter = self._counters.get(film_id)
+            if counter is None:
+                error = 0.0
+                if len(self._counters) >= self.capacity:
+                    # Space-Saving: the newcomer inherits the evicted minimum
+                    _, evicted = self._pop_min()
+                    if evicted is not None:
+                        error = evicted[0]
+                counter = [error, error]
+                self._counters[film_id] = counter
+            counter[0] += increment
+            heapq.heappush(self._heap, (counter[0], film_id))
+            self._dirty = True
+
+            # keep lazy heap entries bounded
+            if len(self._heap) > 4 * max(self.capacity, 1):
+                self._rebuild_heap()
+
+    def scores(self, now=None):
+        """Return ``{film_id: (decayed score, error)}`` as of ``now``."""
+        now = time.time() if now is None else now
+        with self._lock:
+            factor = math.exp(-self.decay_rate * (now - self.landmark))
+            return {
+                film_id: (c[0] * factor, c[1] * factor)
+                for film_id, c in self._counters.items()
+            }
+
+    def top(self, limit=10, now=None):
+        """Return ``[(film_id, decayed score), ...]`` sorted by score."""
+        ranked = sorted(
+            ((film_id, score) for film_id, (score, _) in self.scores(now).items()),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return ranked[:limit]
+
+    def load(self, entries, now=None):
+        """Replace state with ``[(film_id, score, error, updated_at_ts), ...]``."""
+        now = time.time() if now is None else now
+        with self._lock:
+            counters = {}
+            for film_id, score, error, updated_ts in entries:
+                age = max(0.0, now - (updated_ts if updated_ts is not None else now))
+                factor = math.exp(-self.decay_rate * age)
+                counters[film_id] = [score * factor, (error or 0.0) * factor]
+            # honour the capacity if it shrank since the checkpoint
+            kept = sorted(counters.items(), key=lambda item: -item[1][0])
+            self._counters = dict(kept[: self.capacity])
+            self.landmark = now
+            self._rebuild_heap()
+
+    def checkpoint(self, now=None, connection=None):
+        """Upsert the current decayed scores into ``trending_score``.
+
+        Runs on ``connection`` when given (the caller's transaction),
+        otherwise in the session, which is then committed. Rows of films
+        this tracker does not hold are left alone.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._dirty = False
+        snapshot = self.scores(now)
+        if snapshot:
+            stamp = datetime.utcfromtimestamp(now)
+            rows = [
+                {
+                    "film_id": film_id,
+                    "score": score,
+                    "error": error,
+                    "updated_at": stamp,
+                }
+                for film_id, (score, error) in snapshot.items()
+            ]
+            table = TrendingScore.__table__
+            execute = (connection or db.session).execute
+            dialect = (connection or db.session.get_bind()).dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+
+                stmt = insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["film_id"],
+                    set_={
+                        name: stmt.excluded[name]
+                        for name in ("score", "error", "updated_at")
+                    },
+                )
+                execute(stmt, rows)
+            else:
+                for row in rows:
+                    result = execute(
+                        update(table)
+                        .where(table.c.film_id == row["film_id"])
+                        .values(row)
+                    )
+                    if result.rowcount == 0:
+                        execute(table.insert().values(row))
+        if connection is None:
+            db.session.commit()
+
+    def start(self, engine, interval):
+        """Checkpoint every ``interval`` seconds from a daemon thread."""
+        if self._thread is not None or interval <= 0:
+            return
+        self._engine = engine
+        self._interval = float(interval)
+        self._thread = threading.Thread(
+            target=self._run, name="trending-checkpoint", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the checkpoint thread and write a last checkpoint."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._checkpoint_in_background()
+
+    def _checkpoint_in_background(self):
+        if not self._dirty:
+            return
+        try:
+            with self._engine.begin() as connection:
+                self.checkpoint(connection=connection)
+        except Exception as e:
+            logger.warning(f"Trending tracker checkpoint failed: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._checkpoint_in_background()
+
+    def restore(self, now=None):
+        """Load the last checkpoint from the database."""
+        rows = db.session.query(
+            TrendingScore.film_id,
+            TrendingScore.score,
+            TrendingScore.error,
+            TrendingScore.updated_at,
+        ).all()
+        self.load(
+            [
+                (
+                    r.film_id,
+                    r.score,
+                    r.error,
+                    (r.updated_at - datetime(1970, 1, 1)).total_seconds()
+                    if r.updated_at
+                    else None,
+                )
+                for r in rows
+            ],
+            now=now,
+        )
+
+
+def get_tracker():
+    """Return the app's tracker, restoring it from the last checkpoint.
+
+    Returns ``None`` when ``TRENDING_TRACKER_ENABLED`` is off. The first
+    call also starts the checkpoint thread.
+    """
+    if not current_app.config.get("TRENDING_TRACKER_ENABLED", True):
+        return None
+    tracker = current_app.extensions.get("trending_tracker")
+    if tracker is None:
+        tracker = TrendingTracker(
+            capacity=current_app.config.get("TRENDING_TRACKER_CAPACITY", 100),
+            half_life=current_app.config.get("TRENDING_HALF_LIFE_HOURS", 48) * 3600,
+        )
+        try:
+            tracker.restore()
+        except Exception as e:
+            logger.warning(f"Trending tracker restore failed: {e}")
+            db.session.rollback()
+        current_app.extensions["trending_tracker"] = tracker
+        tracker.start(
+            db.engine, current_app.config.get("TRENDING_CHECKPOINT_SECONDS", 300)
+        )
+    return tracker
+
+
+def event_weight(before, after):
+    """Weight of a committed change between two InteractionState snapshots.
+
+    New likes and new reviews count once each, matching what the trending
+    window counts; removals are left to decay.
+    """
+    if after is None:
+        return 0.0
+    weight = 0.0
+    if after.liked and not (before and before.liked):
+        weight += 1.0
+    if after.has_review and not (before and before.has_review):
+        weight += 1.0
+    return weight
+
+
+def record_event(film_id, before, after):
+    """Feed a committed interaction change to the tracker.
+
+    Call after the interaction has been committed. Only updates memory; the
+    checkpoint thread persists it. Failures are logged and never propagate
+    to the request.
+    """
+    try:
+        tracker = get_tracker()
+        weight = event_weight(before, after)
+        if tracker is None or not weight:
+            return
+        tracker.record(film_id, weight)
+    except Exception as e:
+        logger.warning(f"Trending tracker update failed: {e}")
+        db.session.rollback()
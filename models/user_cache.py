@@ -0,0 +1,143 @@
+"""
+Short-TTL cache for the Flask-Login user loader.
+
+``load_user`` runs on every authenticated request; with the cache it returns
+a :class:`UserSnapshot` (id, username, email, created_at) for up to
+``USER_CACHE_TTL`` seconds instead of querying ``user``. Committed updates
+or deletes of a User drop its entry in this process; other workers see the
+change once their entry expires.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+
+from .user import User
+
+_INVALIDATE_KEY = "user_cache_invalidate"
+
+
+class UserSnapshot(UserMixin):
+    """Detached, read-only copy of the User columns requests need."""
+
+    __slots__ = ("id", "username", "email", "created_at")
+
+    def __init__(self, id, username, email=None, created_at=None):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.created_at)
+
+    def __repr__(self):
+        return f"<User {self.username}>"
+
+
+class UserCache:
+    """Bounded user id -> (expires_at, UserSnapshot) map."""
+
+    def __init__(self, ttl=30, max_size=10000):
+        self.ttl = float(ttl)
+        self.max_size = int(max_size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[user_id]
+                return None
+            return entry[1]
+
+    def put(self, snapshot, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._entries[snapshot.id] = (now + self.ttl, snapshot)
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_user_cache():
+    """Return the app's user cache, or ``None`` when ``USER_CACHE_TTL`` is 0."""
+    ttl = current_app.config.get("USER_CACHE_TTL", 30)
+    if not ttl:
+        return None
+    cache = current_app.extensions.get("user_cache")
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            "user_cache",
+            UserCache(ttl, current_app.config.get("USER_CACHE_MAX_SIZE", 10000)),
+        )
+    return cache
+
+
+def load_user_snapshot(user_id):
+    """User loader: cached snapshot, or one primary-key query on a miss."""
+    from utils.metrics import count, timed
+
+    cache = get_user_cache()
+    if cache is not None:
+        with timed("user_cache_lookup"):
+            snapshot = cache.get(user_id)
+        if snapshot is not None:
+            count("user_cache_hits")
+            return snapshot
+        count("user_cache_misses")
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = UserSnapshot.from_user(user)
+    if cache is not None:
+        cache.put(snapshot)
+    return snapshot
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _stage_invalidation(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_INVALIDATE_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    user_ids = session.info.pop(_INVALIDATE_KEY, None)
+    if not user_ids or not has_app_context():
+        return
+    cache = current_app.extensions.get("user_cache")
+    if cache is not None:
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_staged(session):
+    session.info.pop(_INVALIDATE_KEY, None)
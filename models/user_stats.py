@@ -0,0 +1,157 @@
+"""
+Denormalized per-user interaction statistics.
+
+One row per user, kept current by the interaction write paths so the
+profile page reads a single row instead of aggregating interactions.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import case, func, update
+
+from app import db
+
+from .interaction import UserFilmInteraction
+
+# interaction delta key -> user_stats column
+USER_COLUMNS = {
+    "interactions": "interaction_count",
+    "likes": "like_count",
+    "reviews": "review_count",
+    "ratings": "rating_count",
+    "rating_sum": "rating_sum",
+}
+
+
+class UserStats(db.Model):
+    __tablename__ = "user_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    interaction_count = db.Column(db.Integer, default=0, nullable=False)
+    like_count = db.Column(db.Integer, default=0, nullable=False)
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UserStats User:{self.user_id}>"
+
+    @property
+    def average_rating(self):
+        """Average rating given by the user (None if no ratings)"""
+        if self.rating_count:
+            return float(self.rating_sum) / float(self.rating_count)
+        return None
+
+    @staticmethod
+    def _aggregate_columns():
+        has_review = UserFilmInteraction.has_review.is_(True)
+        return [
+            func.count().label("interaction_count"),
+            func.coalesce(
+                func.sum(case((UserFilmInteraction.liked.is_(True), 1), else_=0)), 0
+            ).label("like_count"),
+            func.coalesce(func.sum(case((has_review, 1), else_=0)), 0).label(
+                "review_count"
+            ),
+            func.count(UserFilmInteraction.rating).label("rating_count"),
+            func.coalesce(func.sum(UserFilmInteraction.rating), 0).label(
+                "rating_sum"
+            ),
+            func.max(
+                func.coalesce(
+                    UserFilmInteraction.updated_at, UserFilmInteraction.created_at
+                )
+            ).label("last_activity_at"),
+        ]
+
+    @staticmethod
+    def compute(user_id):
+        """Aggregate a fresh (unsaved) UserStats row from the interactions."""
+        row = (
+            db.session.query(*UserStats._aggregate_columns())
+            .filter(UserFilmInteraction.user_id == user_id)
+            .one()
+        )
+        return UserStats(
+            user_id=user_id,
+            interaction_count=row.interaction_count,
+            like_count=row.like_count,
+            review_count=row.review_count,
+            rating_count=row.rating_count,
+            rating_sum=row.rating_sum,
+            last_activity_at=row.last_activity_at,
+        )
+
+    @staticmethod
+    def for_user(user_id):
+        """Return the user's stats row, or a transient all-zero one if missing.
+
+        Never writes: rows are created by the interaction write paths
+        (:meth:`apply_deltas`) and by ``scripts/reconcile_user_stats.py``.
+        """
+        stats = db.session.get(UserStats, user_id)
+        if stats is None:
+            stats = UserStats(
+                user_id=user_id,
+                interaction_count=0,
+                like_count=0,
+                review_count=0,
+                rating_count=0,
+                rating_sum=0,
+            )
+        return stats
+
+    @staticmethod
+    def apply_deltas(user_id, deltas):
+        """Apply interaction deltas to the user's row with one UPDATE.
+
+        Runs in the caller's transaction. A user without a stats row yet is
+        seeded from the (already flushed) interaction history instead.
+        """
+        from .counters import increment
+
+        values = {
+            USER_COLUMNS[key]: increment(getattr(UserStats, USER_COLUMNS[key]), value)
+            for key, value in deltas.items()
+            if key in USER_COLUMNS
+        }
+        values["last_activity_at"] = datetime.utcnow()
+        result = db.session.execute(
+            update(UserStats)
+            .where(UserStats.user_id == user_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.flush()
+            db.session.add(UserStats.compute(user_id))
+
+    @staticmethod
+    def rebuild():
+        """Recompute every user's row from the interaction history.
+
+        Returns the number of rows written. Does not commit.
+        """
+        select = db.select(
+            UserFilmInteraction.user_id, *UserStats._aggregate_columns()
+        ).group_by(UserFilmInteraction.user_id)
+
+        table = UserStats.__table__
+        db.session.execute(table.delete())
+        result = db.session.execute(
+            table.insert().from_select(
+                [
+                    "user_id",
+                    "interaction_count",
+                    "like_count",
+                    "review_count",
+                    "rating_count",
+                    "rating_sum",
+                    "last_activity_at",
+                ],
+                select,
+            )
+        )
+        return result.rowcount
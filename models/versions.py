@@ -0,0 +1,75 @@
+"""
+Cheap data versions for conditional GETs.
+
+Each function returns a tuple that changes whenever the data it covers
+changes, read with one small indexed query instead of loading the rows:
+counts catch inserts and deletes, ``updated_at`` maxima catch edits. Film
+counter updates bump ``Film.updated_at`` too, and unflushed write-behind
+deltas (models/counter_buffer.py) are folded in so overlaid counters are
+covered as well.
+"""
+
+from sqlalchemy import func
+
+from app import db
+
+from .counter_buffer import get_buffer
+from .film import Film
+from .interaction import UserFilmInteraction
+from .review import FilmReview
+
+
+def catalog_version():
+    """Version of the film table as a whole (list pages)."""
+    count, latest = db.session.execute(
+        db.select(func.count(Film.id), func.max(Film.updated_at))
+    ).one()
+    buffer = get_buffer()
+    return (count, latest, len(buffer) if buffer is not None else 0)
+
+
+def film_version(film_id):
+    """Version of one film row, or ``None`` if the film does not exist."""
+    latest = db.session.execute(
+        db.select(Film.updated_at).where(Film.id == film_id)
+    ).first()
+    if latest is None:
+        return None
+    buffer = get_buffer()
+    pending = buffer.pending(film_id) if buffer is not None else {}
+    return (latest[0], tuple(sorted(pending.items())))
+
+
+def review_version(film_id):
+    """Version of a film's written reviews, including the reviewers' ratings.
+
+    Review pages show each author's rating, which lives on the interaction
+    row, so its ``updated_at`` is joined in as well.
+    """
+    return tuple(
+        db.session.execute(
+            db.select(
+                func.count(),
+                func.max(FilmReview.updated_at),
+                func.max(UserFilmInteraction.updated_at),
+            )
+            .select_from(FilmReview)
+            .join(
+                UserFilmInteraction,
+                (UserFilmInteraction.user_id == FilmReview.user_id)
+                & (UserFilmInteraction.film_id == FilmReview.film_id),
+            )
+            .where(FilmReview.film_id == film_id)
+        ).one()
+    )
+
+
+def user_version(user_id):
+    """Version of one user's likes/ratings (liked badges, own rating)."""
+    return tuple(
+        db.session.execute(
+            db.select(func.count(), func.max(UserFilmInteraction.updated_at)).where(
+                UserFilmInteraction.user_id == user_id
+            )
+        ).one()
+    )
@@ -0,0 +1,240 @@
+"""
+Single-writer queue for SQLite deployments.
+
+SQLite allows one writer at a time; concurrent request threads that all
+write end up in "database is locked" errors and lock-retry stalls. With
+``WRITE_QUEUE_ENABLED`` write jobs are put on a bounded queue and executed
+by one writer thread, which runs up to ``WRITE_QUEUE_MAX_BATCH`` queued jobs
+in a single transaction (group commit). Read paths keep using the request's
+own session and are not queued.
+
+A job is a function that only touches ``db.session`` (it may be re-run after
+a rolled back batch) and returns plain data, never ORM objects. The
+``WRITE_QUEUE_TIMEOUT`` only applies while a job is still queued: a job that
+has not started by then is cancelled and the caller gets a
+:class:`WriteQueueError` (nothing was written, so a retry is safe). Once the
+writer has picked a job up, the caller waits for its outcome, so a reported
+failure never hides a write that later commits. The job's own exception is
+raised in the caller.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+from flask import current_app
+
+from app import db
+
+logger = logging.getLogger("interaction")
+
+_STOP = object()
+_create_lock = threading.Lock()
+
+
+class WriteQueueError(Exception):
+    """The write could not be queued or did not finish in time."""
+
+
+class WriteJob:
+    """A queued write and, once executed, its result or error."""
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._state = "pending"  # pending -> running -> done, or cancelled
+
+    def start(self):
+        """Mark the job as running; False if the caller already gave up."""
+        with self._lock:
+            if self._state != "pending":
+                return False
+            self._state = "running"
+            return True
+
+    def cancel(self):
+        """Withdraw a job that has not started; False if it already ran."""
+        with self._lock:
+            if self._state != "pending":
+                return False
+            self._state = "cancelled"
+            return True
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._state = "done"
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Return the job's result, raising its error or WriteQueueError.
+
+        ``timeout`` bounds the time spent queued; a job that has started is
+        always waited for.
+        """
+        if not self._done.wait(timeout):
+            if self.cancel():
+                raise WriteQueueError("write timed out in the queue")
+            # already running: its outcome decides the response
+            self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class WriteQueue:
+    """Bounded job queue drained by one writer thread with group commits."""
+
+    def __init__(self, app, max_batch=50, maxsize=1000, timeout=5.0):
+        self.app = app
+        self.max_batch = max(1, int(max_batch))
+        self.timeout = float(timeout)
+        self.stats = {"jobs": 0, "batches": 0, "failed": 0}
+        self._queue = queue.Queue(maxsize=int(maxsize))
+        self._thread = None
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Finish the queued jobs and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return its WriteJob."""
+        job = WriteJob(fn, args, kwargs)
+        try:
+            self._queue.put(job, timeout=self.timeout)
+        except queue.Full:
+            raise WriteQueueError("write queue is full")
+        return job
+
+    def offer(self, fn, *args, **kwargs):
+        """Queue a fire-and-forget write without blocking; False if full."""
+        try:
+            self._queue.put_nowait(WriteJob(fn, args, kwargs))
+        except queue.Full:
+            return False
+        return True
+
+    def run(self, fn, *args, **kwargs):
+        """Queue ``fn`` and wait for its committed result."""
+        return self.submit(fn, *args, **kwargs).wait(self.timeout)
+
+    def _run(self):
+        with self.app.app_context():
+            stopping = False
+            while not stopping:
+                job = self._queue.get()
+                if job is _STOP:
+                    break
+                batch = [job]
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stopping = True
+                        break
+                    batch.append(job)
+                batch = [job for job in batch if job.start()]
+                if batch:
+                    self._commit(batch)
+                db.session.remove()
+
+    def _commit(self, batch):
+        """Run ``batch`` in one transaction; retry jobs one by one on failure."""
+        results = []
+        try:
+            for job in batch:
+                results.append(job.fn(*job.args, **job.kwargs))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                self.stats["failed"] += 1
+                logger.error(f"Queued write failed: {e}")
+                batch[0].finish(error=e)
+                return
+            # isolate the failing job so the rest of the batch still commits
+            for job in batch:
+                self._commit([job])
+            return
+        self.stats["batches"] += 1
+        self.stats["jobs"] += len(batch)
+        for job, result in zip(batch, results):
+            job.finish(result=result)
+
+
+def _enable_wal(engine):
+    """Let readers proceed while the writer holds the lock (file databases)."""
+    if engine.dialect.name != "sqlite" or engine.url.database in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    except Exception as e:
+        logger.warning(f"Could not enable SQLite WAL mode: {e}")
+
+
+def get_write_queue():
+    """Return the app's write queue, or ``None`` when it is disabled."""
+    if not current_app.config.get("WRITE_QUEUE_ENABLED", False):
+        return None
+    write_queue = current_app.extensions.get("write_queue")
+    if write_queue is None:
+        with _create_lock:
+            write_queue = current_app.extensions.get("write_queue")
+            if write_queue is None:
+                _enable_wal(db.engine)
+                write_queue = WriteQueue(
+                    current_app._get_current_object(),
+                    max_batch=current_app.config.get("WRITE_QUEUE_MAX_BATCH", 50),
+                    maxsize=current_app.config.get("WRITE_QUEUE_MAXSIZE", 1000),
+                    timeout=current_app.config.get("WRITE_QUEUE_TIMEOUT", 5),
+                )
+                current_app.extensions["write_queue"] = write_queue
+                write_queue.start()
+    return write_queue
+
+
+def run_write(fn, *args, **kwargs):
+    """Run a write job and commit it, through the queue when enabled.
+
+    Without the queue the job runs in the request's session and is committed
+    (or rolled back and re-raised) right here, so callers have one code path.
+    """
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.run(fn, *args, **kwargs)
+    try:
+        result = fn(*args, **kwargs)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
@@ -2,6 +2,7 @@ import logging
 
 from flask import Blueprint, flash, redirect, render_template, request, url_for
 from flask_login import current_user, login_required, login_user, logout_user
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from app import db
@@ -130,42 +131,40 @@ def logout():
 @auth_bp.route("/profile")
 @login_required
 def profile():
-    from models.interaction import UserFilmInteraction
-
-    # 获取用户统计数据
-    total_likes = UserFilmInteraction.query.filter_by(
-        user_id=current_user.id, liked=True
-    ).count()
-
-    total_reviews = UserFilmInteraction.query.filter(
-        UserFilmInteraction.user_id == current_user.id,
-        UserFilmInteraction.review_text.isnot(None),
-        UserFilmInteraction.review_text != "",
-    ).count()
-
-    # 计算平均评分
-    rating_interactions = UserFilmInteraction.query.filter(
-        UserFilmInteraction.user_id == current_user.id,
-        UserFilmInteraction.rating.isnot(None),
-    ).all()
-
-    avg_rating_given = None
-    if rating_interactions:
-        avg_rating_given = sum(i.rating for i in rating_interactions) / len(
-            rating_interactions
-        )
+    from models.film import Film
+    from models.interaction import UserFilmInteraction, lazy_guard
+    from models.user_stats import UserStats
+
+    page = max(1, request.args.get("page", 1, type=int))
+    per_page = 20
 
-    # 获取用户的互动记录
+    # 用户统计来自 user_stats 汇总行（尚无汇总行时显示为 0，GET 不写库）
+    stats = UserStats.for_user(current_user.id)
+
+    # 分页获取用户的互动记录（同一查询加载电影信息，评论按页批量加载）
     interactions = (
-        UserFilmInteraction.query.filter_by(user_id=current_user.id)
+        UserFilmInteraction.query.options(
+            joinedload(UserFilmInteraction.film).load_only(
+                Film.title, Film.year, Film.genre
+            ),
+            selectinload(UserFilmInteraction.review),
+            *lazy_guard(),
+        )
+        .filter_by(user_id=current_user.id)
         .order_by(UserFilmInteraction.created_at.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page)
         .all()
     )
 
     return render_template(
         "profile.html",
-        total_likes=total_likes,
-        total_reviews=total_reviews,
-        avg_rating_given=avg_rating_given,
+        total_likes=stats.like_count,
+        total_reviews=stats.review_count,
+        avg_rating_given=stats.average_rating,
         interactions=interactions,
+        page=page,
+        per_page=per_page,
+        # history not yet reconciled into user_stats still lists its rows
+        total=max(stats.interaction_count, (page - 1) * per_page + len(interactions)),
     )
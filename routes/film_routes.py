@@ -5,27 +5,48 @@ from sqlalchemy import func
 
 from app import db
 
+from models.counter_buffer import overlay_pending
+
 # Delayed import to avoid circular imports
 from models.film import Film
+from models.versions import catalog_version, film_version, review_version, user_version
+from utils.conditional import conditional_get
 
 film_bp = Blueprint("film", __name__)
 
 
+def _viewer_version(with_interactions=True):
+    """The HTML depends on who is looking and in which language."""
+    if not current_user.is_authenticated:
+        return (None, session.get("language", "en"))
+    version = (current_user.id, session.get("language", "en"))
+    if with_interactions:
+        version += user_version(current_user.id)
+    return version
+
+
+def _film_list_version():
+    # the list no longer renders the viewer's likes
+    return catalog_version() + _viewer_version(with_interactions=False)
+
+
+def _film_detail_version(film_id):
+    version = film_version(film_id)
+    if version is None:
+        return None  # let the view answer 404
+    return version + review_version(film_id) + _viewer_version()
+
+
 @film_bp.route("/")
 def index():
     films = Film.query.limit(12).all()
-    liked_ids = set()
-    if current_user.is_authenticated:
-        from models.interaction import UserFilmInteraction
-
-        liked = UserFilmInteraction.query.filter_by(
-            user_id=current_user.id, liked=True
-        ).all()
-        liked_ids = set(i.film_id for i in liked)
-    return render_template("index.html", films=films, liked_ids=liked_ids)
+    overlay_pending(films)
+    # liked badges are filled in client-side (/api/interactions/state)
+    return render_template("index.html", films=films)
 
 
 @film_bp.route("/films")
+@conditional_get(_film_list_version)
 def list_films():
     # Restore search/filter/sort functionality.
     # Note: likes/rating sorting is done in memory for model property compatibility.
@@ -69,6 +90,7 @@ def list_films():
 
     total = query.count()
     films = query.offset((page - 1) * per_page).limit(per_page).all()
+    overlay_pending(films)
 
     # get filter options
     genres_q = db.session.query(Film.genre).distinct().all()
@@ -76,19 +98,9 @@ def list_films():
     years_q = db.session.query(Film.year).distinct().filter(Film.year.isnot(None)).all()
     years = sorted([y[0] for y in years_q if y[0]], reverse=True)
 
-    liked_ids = set()
-    if current_user.is_authenticated:
-        from models.interaction import UserFilmInteraction
-
-        liked = UserFilmInteraction.query.filter_by(
-            user_id=current_user.id, liked=True
-        ).all()
-        liked_ids = set(i.film_id for i in liked)
-
     return render_template(
         "film_list.html",
         films=films,
-        liked_ids=liked_ids,
         genres=genres,
         years=years,
         page=page,
@@ -98,10 +110,13 @@ def list_films():
 
 
 @film_bp.route("/films/<int:film_id>")
+@conditional_get(_film_detail_version)
 def film_detail(film_id):
     from models.interaction import UserFilmInteraction
+    from models.review import FilmReview
 
     film = Film.query.get_or_404(film_id)
+    overlay_pending([film])
 
     # get user interaction information
     user_interaction = None
@@ -110,15 +125,11 @@ def film_detail(film_id):
             user_id=current_user.id, film_id=film_id
         ).first()
 
-    # get other users' comments (with text)
-    reviews = (
-        UserFilmInteraction.query.filter(
-            UserFilmInteraction.film_id == film_id,
-            UserFilmInteraction.review_text.isnot(None),
-            UserFilmInteraction.review_text != "",
-        )
-        .order_by(UserFilmInteraction.created_at.desc())
-        .all()
+    # only the first page of other users' comments is rendered inline;
+    # interactions.js fetches the rest from /api/reviews with next_cursor
+    per_page = 5
+    reviews, review_total, next_cursor = FilmReview.review_page(
+        film_id, limit=per_page
     )
 
     return render_template(
@@ -126,15 +137,16 @@ def film_detail(film_id):
         film=film,
         user_interaction=user_interaction,
         reviews=reviews,
+        review_total=review_total,
+        next_cursor=next_cursor,
+        reviews_per_page=per_page,
     )
 
 
 @film_bp.route("/recommendations")
 @login_required
 def recommendations():
-    from datetime import datetime, timedelta
-
-    from models.interaction import UserFilmInteraction
+    from models.trending import get_trending
 
     # For now replace complex recommenders with popularity-based lists:
     # - most_liked: films ordered by like_count desc
@@ -148,69 +160,12 @@ def recommendations():
     highest_rated = Film.query.order_by(avg_expr.desc(), Film.title).limit(12).all()
     recent = Film.query.order_by(Film.created_at.desc()).limit(12).all()
 
-    # Calculate trending/hot films based on recent interactions (last 7 days)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-
-    # Get top 10 films by recent interactions (likes + reviews) in the last 7 days
-    trending_query = (
-        db.session.query(
-            UserFilmInteraction.film_id,
-            func.count(UserFilmInteraction.film_id).label("interaction_count"),
-        )
-        .filter(
-            UserFilmInteraction.created_at >= seven_days_ago,
-            db.or_(
-                UserFilmInteraction.liked.is_(True),
-                UserFilmInteraction.review_text.isnot(None),
-            ),
-        )
-        .group_by(UserFilmInteraction.film_id)
-        .order_by(func.count(UserFilmInteraction.film_id).desc())
-        .limit(10)
-        .all()
+    # Trending films and the daily chart come from one grouped query (cached)
+    trending_data, daily_interactions = get_trending(days=7, limit=10)
+    overlay_pending(
+        {film.id: film for film in most_liked + highest_rated + recent}.values()
     )
 
-    # Get film details for trending films
-    trending_film_ids = [t.film_id for t in trending_query]
-    trending_films = Film.query.filter(Film.id.in_(trending_film_ids)).all()
-
-    # Create trending data with film info
-    trending_data = []
-    for film in trending_films:
-        interaction_count = next(
-            (t.interaction_count for t in trending_query if t.film_id == film.id), 0
-        )
-        trending_data.append({"film": film, "interaction_count": interaction_count})
-
-    # Sort by interaction count
-    trending_data.sort(key=lambda x: x["interaction_count"], reverse=True)
-
-    # Get daily interaction data for the last 7 days for trending chart
-    daily_interactions = []
-    for i in range(7):
-        day = datetime.utcnow() - timedelta(days=i)
-        day_start = datetime(day.year, day.month, day.day)
-        day_end = day_start + timedelta(days=1)
-
-        day_data = (
-            db.session.query(func.count(UserFilmInteraction.film_id).label("count"))
-            .filter(
-                UserFilmInteraction.created_at >= day_start,
-                UserFilmInteraction.created_at < day_end,
-                db.or_(
-                    UserFilmInteraction.liked.is_(True),
-                    UserFilmInteraction.review_text.isnot(None),
-                ),
-            )
-            .scalar()
-            or 0
-        )
-
-        daily_interactions.append({"date": day.strftime("%Y-%m-%d"), "count": day_data})
-
-    # Reverse to show oldest to newest
-    daily_interactions.reverse()
-
     # Minimal stats for the page
     recommendation_data = {
         "user_interactions_count": 0,
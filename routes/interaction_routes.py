@@ -4,8 +4,14 @@ from flask import Blueprint, flash, jsonify, redirect, request, url_for
 from flask_login import current_user, login_required
 
 from app import db
+from models.counters import apply_interaction_change, apply_interaction_changes
 from models.film import Film
 from models.interaction import UserFilmInteraction
+from models.review import FilmReview
+from models.trending_tracker import record_event
+from models.versions import review_version, user_version
+from models.write_queue import WriteQueueError, run_write
+from utils.conditional import conditional_get
 
 interaction_bp = Blueprint("interaction", __name__)
 
@@ -13,44 +19,157 @@ interaction_bp = Blueprint("interaction", __name__)
 interaction_logger = logging.getLogger("interaction")
 
 
+# Write jobs: run through run_write (the single-writer queue when enabled),
+# they only use db.session and return plain data.
+
+
+def _delete_interaction(user_id, film_id):
+    """delete the interaction; returns its previous state (None if missing)"""
+    interaction = db.session.get(UserFilmInteraction, (user_id, film_id))
+    if interaction is None:
+        return None
+    prev_state = interaction.snapshot()
+    created_at = interaction.created_at
+    db.session.delete(interaction)
+    apply_interaction_change(user_id, film_id, created_at, prev_state, None)
+    return prev_state
+
+
+def _save_interaction(user_id, film_id, liked, rating, review_text):
+    """create or update the interaction; returns (prev, new, action, data)"""
+    interaction = db.session.get(UserFilmInteraction, (user_id, film_id))
+    prev_state = None
+    if not interaction:
+        # create new interaction
+        interaction = UserFilmInteraction(
+            user_id=user_id,
+            film_id=film_id,
+            liked=liked,
+            rating=rating,
+            review_text=review_text if review_text else None,
+        )
+        db.session.add(interaction)
+        action = "created"
+    else:
+        prev_state = interaction.snapshot()
+        # update existing interaction
+        interaction.liked = liked
+        interaction.rating = rating
+        interaction.review_text = review_text if review_text else None
+        action = "updated"
+
+    # adjust persisted counters with atomic deltas (UPDATE ... RETURNING)
+    new_state = interaction.snapshot()
+    counters = apply_interaction_change(
+        user_id, film_id, interaction.created_at, prev_state, new_state
+    )
+    data = {
+        "liked": interaction.liked,
+        "rating": interaction.rating,
+        "has_review": interaction.has_review,
+        "review_text": interaction.review_text,
+        "created_at": (
+            interaction.created_at.isoformat() if interaction.created_at else None
+        ),
+        "film_stats": counters.to_json(),
+    }
+    return prev_state, new_state, action, data
+
+
+def _toggle_like(user_id, film_id):
+    """flip the like flag; returns (prev, new, like_count)"""
+    interaction = db.session.get(UserFilmInteraction, (user_id, film_id))
+    prev_state = None
+    if not interaction:
+        # create new interaction, only set like
+        interaction = UserFilmInteraction(user_id=user_id, film_id=film_id, liked=True)
+        db.session.add(interaction)
+    else:
+        # toggle like status
+        prev_state = interaction.snapshot()
+        interaction.liked = not interaction.liked
+
+    new_state = interaction.snapshot()
+    # persisted like count comes back from the UPDATE itself
+    counters = apply_interaction_change(
+        user_id, film_id, interaction.created_at, prev_state, new_state
+    )
+    return prev_state, new_state, counters.like_count
+
+
+def _apply_batch(user_id, changes):
+    """apply coalesced {film_id: fields} changes in one transaction;
+    returns (applied [(film_id, prev, new)], states, film_stats)"""
+    existing = {
+        interaction.film_id: interaction
+        for interaction in UserFilmInteraction.query.filter(
+            UserFilmInteraction.user_id == user_id,
+            UserFilmInteraction.film_id.in_(list(changes)),
+        )
+    }
+    applied, counter_changes, states = [], [], {}
+    for film_id, fields in changes.items():
+        interaction = existing.get(film_id)
+        prev_state = interaction.snapshot() if interaction is not None else None
+        if interaction is None:
+            if not fields.get("liked") and fields.get("rating") is None:
+                states[film_id] = {"liked": False, "rating": None}
+                continue  # nothing to create
+            interaction = UserFilmInteraction(
+                user_id=user_id, film_id=film_id, liked=False
+            )
+            db.session.add(interaction)
+        if "liked" in fields:
+            interaction.liked = fields["liked"]
+        if "rating" in fields:
+            interaction.rating = fields["rating"]
+        new_state = interaction.snapshot()
+        states[film_id] = {"liked": new_state.liked, "rating": new_state.rating}
+        if new_state != prev_state:
+            applied.append((film_id, prev_state, new_state))
+            counter_changes.append(
+                (film_id, interaction.created_at, prev_state, new_state)
+            )
+    counters = {}
+    if counter_changes:
+        counters = apply_interaction_changes(user_id, counter_changes)
+    film_stats = {film_id: c.to_json() for film_id, c in counters.items()}
+    return applied, states, film_stats
+
+
+def _busy_response():
+    # WriteQueueError: the write was withdrawn before it started, so a retry
+    # cannot apply it twice
+    return (
+        jsonify({"success": False, "message": "Server busy, please try again"}),
+        503,
+    )
+
+
 @interaction_bp.route(
     "/api/interaction/<int:film_id>", methods=["POST", "PUT", "DELETE"]
 )
 @login_required
 def handle_interaction(film_id):
     """handle user-film interactions (like, rating, comment)"""
-    film = Film.query.get_or_404(film_id)
-
-    # get or create interaction record
-    interaction = UserFilmInteraction.query.filter_by(
-        user_id=current_user.id, film_id=film_id
-    ).first()
+    film_title = Film.query.get_or_404(film_id).title
 
     if request.method == "DELETE":
-        # delete interaction
-        if interaction:
-            # adjust persisted film stats
-            try:
-                if interaction.liked:
-                    film.like_count = max(0, (film.like_count or 0) - 1)
-                if interaction.rating:
-                    film.rating_count = max(0, (film.rating_count or 0) - 1)
-                    film.rating_sum = max(
-                        0, (film.rating_sum or 0) - (interaction.rating or 0)
-                    )
-                db.session.delete(interaction)
-                db.session.add(film)
-                db.session.commit()
-                interaction_logger.info(
-                    f"Interaction deleted: User {current_user.username} - "
-                    f"Film {film.title}"
-                )
-                return jsonify({"success": True, "message": "评价已删除"})
-            except Exception as e:
-                db.session.rollback()
-                interaction_logger.error(f"Failed to delete interaction: {e}")
-                return jsonify({"success": False, "message": "删除失败"}), 500
-        return jsonify({"success": False, "message": "未找到评价记录"}), 404
+        # delete interaction, adjusting persisted counters with atomic deltas
+        try:
+            prev_state = run_write(_delete_interaction, current_user.id, film_id)
+        except Exception as e:
+            interaction_logger.error(f"Failed to delete interaction: {e}")
+            if isinstance(e, WriteQueueError):
+                return _busy_response()
+            return jsonify({"success": False, "message": "删除失败"}), 500
+        if prev_state is None:
+            return jsonify({"success": False, "message": "未找到评价记录"}), 404
+        interaction_logger.info(
+            f"Interaction deleted: User {current_user.username} - "
+            f"Film {film_title}"
+        )
+        return jsonify({"success": True, "message": "评价已删除"})
 
     # POST/PUT: create or update interaction
     data = request.get_json() if request.is_json else request.form
@@ -65,132 +184,65 @@ def handle_interaction(film_id):
     if isinstance(rating, str) and rating:
         try:
             rating = int(rating)
-            if not (1 <= rating <= 5):
-                rating = None
         except ValueError:
             rating = None
-    elif not rating:
+    if not _valid_rating(rating):
+        # JSON bodies skip the string parsing: 99, 3.7 or true are invalid too
         rating = None
 
-    # handle create or update with persisted counters
-    prev_liked = None
-    prev_rating = None
-    if not interaction:
-        # create new interaction
-        interaction = UserFilmInteraction(
-            user_id=current_user.id,
-            film_id=film_id,
-            liked=liked,
-            rating=rating,
-            review_text=review_text if review_text else None,
-        )
-        db.session.add(interaction)
-        prev_liked = None
-        prev_rating = None
-        action = "created"
-    else:
-        prev_liked = interaction.liked
-        prev_rating = interaction.rating
-        # update existing interaction
-        interaction.liked = liked
-        interaction.rating = rating
-        interaction.review_text = review_text if review_text else None
-        action = "updated"
-
-    # adjust film persisted stats based on diff
     try:
-        # liked diff
-        if prev_liked is None:
-            if liked:
-                film.like_count = (film.like_count or 0) + 1
-        else:
-            if prev_liked != bool(liked):
-                if liked:
-                    film.like_count = (film.like_count or 0) + 1
-                else:
-                    film.like_count = max(0, (film.like_count or 0) - 1)
-
-        # rating diff
-        if prev_rating is None and rating is not None:
-            film.rating_count = (film.rating_count or 0) + 1
-            film.rating_sum = (film.rating_sum or 0) + (rating or 0)
-        elif prev_rating is not None and rating is None:
-            film.rating_count = max(0, (film.rating_count or 0) - 1)
-            film.rating_sum = max(0, (film.rating_sum or 0) - (prev_rating or 0))
-        elif prev_rating is not None and rating is not None and prev_rating != rating:
-            film.rating_sum = (film.rating_sum or 0) + (rating - prev_rating)
-
-        db.session.add(film)
-        db.session.commit()
-        interaction_logger.info(
-            f"Interaction {action}: User {current_user.username} - "
-            f"Film {film.title} - Liked: {liked}, Rating: {rating}"
-        )
-
-        # return updated statistics
-        # refresh film object to get latest statistics
-        db.session.refresh(film)
-        return jsonify(
-            {
-                "success": True,
-                "message": "Rating saved",
-                "data": {
-                    "liked": interaction.liked,
-                    "rating": interaction.rating,
-                    "has_review": interaction.has_review,
-                    "review_text": interaction.review_text,
-                    "created_at": (
-                        interaction.created_at.isoformat()
-                        if interaction.created_at
-                        else None
-                    ),
-                    "film_stats": {
-                        "average_rating": film.average_rating,
-                        "like_count": film.like_count,
-                        "rating_count": film.rating_count,
-                    },
-                },
-            }
+        prev_state, new_state, action, result = run_write(
+            _save_interaction, current_user.id, film_id, liked, rating, review_text
         )
     except Exception as e:
-        db.session.rollback()
         interaction_logger.error(
             f"Interaction save failed: User {current_user.username} - "
-            f"Film {film.title} - Error: {str(e)}"
+            f"Film {film_title} - Error: {str(e)}"
         )
+        if isinstance(e, WriteQueueError):
+            return _busy_response()
         return (
             jsonify({"success": False, "message": "Save failed, please try again"}),
             500,
         )
 
+    record_event(film_id, prev_state, new_state)
+    interaction_logger.info(
+        f"Interaction {action}: User {current_user.username} - "
+        f"Film {film_title} - Liked: {liked}, Rating: {rating}"
+    )
+
+    # return updated statistics
+    return jsonify({"success": True, "message": "Rating saved", "data": result})
+
 
 @interaction_bp.route("/api/reviews/<int:film_id>", methods=["GET"])
+@conditional_get(review_version, private=False)
 def get_reviews(film_id):
     """Paginate comments for specified film (only with text),
     used for frontend no refresh loading."""
+    cursor = request.args.get("cursor") or None
     page = int(request.args.get("page", 1))
-    per_page = int(request.args.get("per_page", 5))
-
-    reviews_query = UserFilmInteraction.query.filter(
-        UserFilmInteraction.film_id == film_id,
-        UserFilmInteraction.review_text.isnot(None),
-        UserFilmInteraction.review_text != "",
-    ).order_by(UserFilmInteraction.created_at.desc())
+    per_page = max(1, min(int(request.args.get("per_page", 5)), 50))
 
-    total = reviews_query.count()
-    reviews = reviews_query.offset((page - 1) * per_page).limit(per_page).all()
+    # keyset cursor pages (or legacy offset pages) with the author joined in
+    try:
+        reviews, total, next_cursor = FilmReview.review_page(
+            film_id, limit=per_page, cursor=cursor, page=None if cursor else page
+        )
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid cursor"}), 400
 
     results = []
     for r in reviews:
         # UserFilmInteraction uses composite PK, no single 'id' field.
         composite_id = f"{r.user_id}-{r.film_id}"
-        composite_id = f"{r.user_id}-{r.film_id}"
         results.append(
             {
                 "id": composite_id,
                 "user": {
                     "id": r.user_id,
-                    "username": getattr(r.user, "username", None),
+                    "username": r.username,
                 },
                 "rating": r.rating,
                 "review_text": r.review_text,
@@ -202,67 +254,163 @@ def get_reviews(film_id):
         {
             "success": True,
             "data": results,
-            "page": page,
+            "page": None if cursor else page,
             "per_page": per_page,
             "total": total,
+            "next_cursor": next_cursor,
         }
     )
 
 
-@interaction_bp.route("/api/like/<int:film_id>", methods=["POST"])
+MAX_BATCH_CHANGES = 100
+
+
+def _valid_rating(rating):
+    return isinstance(rating, int) and not isinstance(rating, bool) and (
+        1 <= rating <= 5
+    )
+
+
+def _batch_changes(payload):
+    """{film_id: {"liked": bool, "rating": 1-5 or None}} from a batch body.
+
+    Later changes to the same film win field by field, so a burst of
+    toggles collapses into its final state. Raises ValueError.
+    """
+    items = payload.get("changes") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not 0 < len(items) <= MAX_BATCH_CHANGES:
+        raise ValueError(f"changes must be a list of 1-{MAX_BATCH_CHANGES} items")
+    changes = {}
+    for item in items:
+        film_id = item.get("film_id") if isinstance(item, dict) else None
+        if not isinstance(film_id, int) or isinstance(film_id, bool):
+            raise ValueError("film_id must be an integer")
+        fields = changes.setdefault(film_id, {})
+        if "liked" in item:
+            if not isinstance(item["liked"], bool):
+                raise ValueError("liked must be true or false")
+            fields["liked"] = item["liked"]
+        if "rating" in item:
+            rating = item["rating"]
+            if rating is not None and not _valid_rating(rating):
+                raise ValueError("rating must be 1-5 or null")
+            fields["rating"] = rating
+    return changes
+
+
+@interaction_bp.route("/api/interactions/batch", methods=["POST"])
 @login_required
-def toggle_like(film_id):
-    """AJAX like/unlike"""
-    film = Film.query.get_or_404(film_id)
+def batch_interactions():
+    """Apply many like/rating changes in one transaction.
+
+    Body: ``{"changes": [{"film_id": 1, "liked": true}, {"film_id": 2,
+    "rating": 4}]}``; ``liked``/``rating`` set absolute values, so a batch
+    can safely be re-sent. Accepts ``text/plain`` bodies too, which is
+    what ``navigator.sendBeacon`` posts when the page is closed.
+    """
+    try:
+        changes = _batch_changes(request.get_json(force=True, silent=True))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    known = set(
+        db.session.execute(
+            db.select(Film.id).where(Film.id.in_(list(changes)))
+        ).scalars()
+    )
+    skipped = sorted(film_id for film_id in changes if film_id not in known)
+    changes = {k: v for k, v in changes.items() if k in known}
+    applied, states, film_stats = [], {}, {}
+    if changes:
+        try:
+            applied, states, film_stats = run_write(
+                _apply_batch, current_user.id, changes
+            )
+        except Exception as e:
+            interaction_logger.error(
+                f"Interaction batch failed: User {current_user.username} - "
+                f"{len(changes)} films - Error: {str(e)}"
+            )
+            if isinstance(e, WriteQueueError):
+                return _busy_response()
+            return (
+                jsonify({"success": False, "message": "Save failed, please try again"}),
+                500,
+            )
+
+    for film_id, prev_state, new_state in applied:
+        record_event(film_id, prev_state, new_state)
+    interaction_logger.info(
+        f"Interaction batch: User {current_user.username} - "
+        f"{len(applied)} of {len(changes)} films changed"
+    )
+    results = {
+        film_id: dict(state, film_stats=film_stats.get(film_id))
+        for film_id, state in states.items()
+    }
+    return jsonify({"success": True, "results": results, "skipped": skipped})
 
-    interaction = UserFilmInteraction.query.filter_by(
-        user_id=current_user.id, film_id=film_id
-    ).first()
 
-    if not interaction:
-        # create new interaction, only set like
-        interaction = UserFilmInteraction(
-            user_id=current_user.id, film_id=film_id, liked=True
-        )
-        db.session.add(interaction)
-        # increment persisted like count
-        film.like_count = (film.like_count or 0) + 1
-    else:
-        # toggle like status
-        prev = interaction.liked
-        interaction.liked = not interaction.liked
-        # adjust persisted like count
-        if prev != interaction.liked:
-            if interaction.liked:
-                film.like_count = (film.like_count or 0) + 1
-            else:
-                film.like_count = max(0, (film.like_count or 0) - 1)
+MAX_STATE_IDS = 100
 
+
+def _state_ids():
+    """Film ids of ?ids=1,2,3 (deduplicated), or None if malformed."""
     try:
-        db.session.add(film)
-        db.session.commit()
-        # refresh statistics
-        db.session.refresh(film)
+        ids = {int(part) for part in request.args.get("ids", "").split(",") if part}
+    except ValueError:
+        return None
+    return sorted(ids) if len(ids) <= MAX_STATE_IDS else None
 
-        action = "liked" if interaction.liked else "unliked"
-        interaction_logger.info(
-            f"Film {action}: User {current_user.username} - Film {film.title}"
+
+def _viewer_state_version():
+    ids = _state_ids()
+    if ids is None:
+        return None
+    return (current_user.id, tuple(ids)) + user_version(current_user.id)
+
+
+@interaction_bp.route("/api/interactions/state", methods=["GET"])
+@login_required
+@conditional_get(_viewer_state_version)
+def viewer_state():
+    """The current user's liked state for a batch of films.
+
+    Lets shared (cached) pages render neutral like buttons and decorate
+    them client-side: ``{"liked": [film ids]}``.
+    """
+    ids = _state_ids()
+    if ids is None:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"ids must be up to {MAX_STATE_IDS} integers",
+                }
+            ),
+            400,
         )
+    liked = UserFilmInteraction.liked_film_ids(current_user.id, ids)
+    return jsonify({"success": True, "liked": liked})
 
-        return jsonify(
-            {
-                "success": True,
-                "liked": interaction.liked,
-                "like_count": film.like_count,
-                "message": f"{'Liked' if interaction.liked else 'Unliked'}",
-            }
+
+@interaction_bp.route("/api/like/<int:film_id>", methods=["POST"])
+@login_required
+def toggle_like(film_id):
+    """AJAX like/unlike"""
+    film_title = Film.query.get_or_404(film_id).title
+
+    try:
+        prev_state, new_state, like_count = run_write(
+            _toggle_like, current_user.id, film_id
         )
     except Exception as e:
-        db.session.rollback()
         interaction_logger.error(
             f"Like toggle failed: User {current_user.username} - "
-            f"Film {film.title} - Error: {str(e)}"
+            f"Film {film_title} - Error: {str(e)}"
         )
+        if isinstance(e, WriteQueueError):
+            return _busy_response()
         return (
             jsonify(
                 {"success": False, "message": "Operation failed, please try again"}
@@ -270,41 +418,48 @@ def toggle_like(film_id):
             500,
         )
 
+    record_event(film_id, prev_state, new_state)
+    action = "liked" if new_state.liked else "unliked"
+    interaction_logger.info(
+        f"Film {action}: User {current_user.username} - Film {film_title}"
+    )
+
+    return jsonify(
+        {
+            "success": True,
+            "liked": new_state.liked,
+            "like_count": like_count,
+            "message": f"{'Liked' if new_state.liked else 'Unliked'}",
+        }
+    )
+
 
 # keep backward compatibility route
 @interaction_bp.route("/like/<int:film_id>", methods=["POST"])
 @login_required
 def like_film(film_id):
     """traditional like route, redirect to detail page"""
-    film = Film.query.get_or_404(film_id)
-
-    interaction = UserFilmInteraction.query.filter_by(
-        user_id=current_user.id, film_id=film_id
-    ).first()
+    film_title = Film.query.get_or_404(film_id).title
 
-    if not interaction:
-        interaction = UserFilmInteraction(
-            user_id=current_user.id, film_id=film_id, liked=True
+    try:
+        prev_state, new_state, _ = run_write(_toggle_like, current_user.id, film_id)
+    except Exception as e:
+        interaction_logger.error(
+            f"Like toggle failed: User {current_user.username} - "
+            f"Film {film_title} - Error: {str(e)}"
         )
-        db.session.add(interaction)
-        film.like_count = (film.like_count or 0) + 1
-    else:
-        prev = interaction.liked
-        interaction.liked = not interaction.liked
-        if prev != interaction.liked:
-            if interaction.liked:
-                film.like_count = (film.like_count or 0) + 1
-            else:
-                film.like_count = max(0, (film.like_count or 0) - 1)
+        if isinstance(e, WriteQueueError):
+            flash("Server busy, please try again", "error")
+        else:
+            flash("Operation failed, please try again", "error")
+        return redirect(url_for("film.film_detail", film_id=film_id))
 
-    db.session.add(film)
-    db.session.commit()
-    db.session.refresh(film)
+    record_event(film_id, prev_state, new_state)
 
-    action = "liked" if interaction.liked else "unliked"
+    action = "liked" if new_state.liked else "unliked"
     interaction_logger.info(
-        f"Film {action}: User {current_user.username} - Film {film.title}"
+        f"Film {action}: User {current_user.username} - Film {film_title}"
     )
 
-    flash(f"{'Liked' if interaction.liked else 'Unliked'}", "success")
+    flash(f"{'Liked' if new_state.liked else 'Unliked'}", "success")
     return redirect(url_for("film.film_detail", film_id=film_id))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB = os.path.join(ROOT, "instance", "app.db")
+
+# (index name, table, columns) - db.create_all() only adds these to new tables
+INDEXES = [
+    ("ix_film_review_film_created", "film_review", "film_id, created_at"),
+    ("ix_film_updated_at", "film", "updated_at"),
+    ("ix_app_log_user_timestamp", "app_log", "user_id, timestamp"),
+    ("ix_app_log_action_timestamp", "app_log", "action, timestamp"),
+]
+
+
+def main():
+    if not os.path.exists(DB):
+        print("DB not found:", DB)
+        return
+    conn = sqlite3.connect(DB)
+    try:
+        for name, table, columns in INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns});")
+            print("Ensured", name)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,16 @@ def main():
         if not column_exists(conn, "film", "rating_sum"):
             conn.execute("ALTER TABLE film ADD COLUMN rating_sum INTEGER DEFAULT 0;")
             print("Added rating_sum")
+        for column in [f"rating_{star}" for star in range(1, 6)] + ["review_count"]:
+            if not column_exists(conn, "film", column):
+                conn.execute(f"ALTER TABLE film ADD COLUMN {column} INTEGER DEFAULT 0;")
+                print("Added", column)
+        if not column_exists(conn, "film", "updated_at"):
+            conn.execute("ALTER TABLE film ADD COLUMN updated_at DATETIME;")
+            conn.execute(
+                "UPDATE film SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP);"
+            )
+            print("Added updated_at")
         conn.commit()
     finally:
         conn.close()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Archive AppLog rows older than APPLOG_RETENTION_DAYS to compressed,
+date-partitioned files under APPLOG_ARCHIVE_DIR and delete them in chunks.
+
+Usage: python scripts/archive_app_logs.py [retention_days]
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models.log_archive import archive_logs  # noqa: E402
+
+
+def main():
+    env = os.environ.get("FLASK_ENV") or "production"
+    app = create_app(env)
+    with app.app_context():
+        days = (
+            int(sys.argv[1])
+            if len(sys.argv) > 1
+            else app.config.get("APPLOG_RETENTION_DAYS", 90)
+        )
+        archive_dir = app.config["APPLOG_ARCHIVE_DIR"]
+        before = datetime.utcnow() - timedelta(days=days)
+        print(f"Archiving app logs before {before:%Y-%m-%d} to {archive_dir}")
+        moved = archive_logs(before, archive_dir)
+        print("Archive complete:", moved, "rows moved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,36 +15,42 @@ def main():
     app = create_app(env)
     with app.app_context():
 
+        has_review = UserFilmInteraction.has_review.is_(True)
+
+        def count_if(condition):
+            return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+        # one grouped pass over the interactions for every film's counters
+        rows = (
+            db.session.query(
+                UserFilmInteraction.film_id,
+                count_if(UserFilmInteraction.liked.is_(True)).label("like_count"),
+                db.func.count(UserFilmInteraction.rating).label("rating_count"),
+                db.func.coalesce(db.func.sum(UserFilmInteraction.rating), 0).label(
+                    "rating_sum"
+                ),
+                *[
+                    count_if(UserFilmInteraction.rating == star).label(
+                        f"rating_{star}"
+                    )
+                    for star in range(1, 6)
+                ],
+                count_if(has_review).label("review_count"),
+            )
+            .group_by(UserFilmInteraction.film_id)
+            .all()
+        )
+        stats = {row.film_id: row for row in rows}
+
         films = Film.query.all()
         print("Backfilling stats for", len(films), "films")
+        columns = ["like_count", "rating_count", "rating_sum", "review_count"] + [
+            f"rating_{star}" for star in range(1, 6)
+        ]
         for f in films:
-            like_count = (
-                db.session.query(UserFilmInteraction)
-                .filter_by(film_id=f.id, liked=True)
-                .count()
-            )
-            rating_sum = (
-                db.session.query(
-                    db.func.coalesce(db.func.sum(UserFilmInteraction.rating), 0)
-                )
-                .filter(
-                    UserFilmInteraction.film_id == f.id,
-                    UserFilmInteraction.rating.isnot(None),
-                )
-                .scalar()
-                or 0
-            )
-            rating_count = (
-                db.session.query(UserFilmInteraction)
-                .filter(
-                    UserFilmInteraction.film_id == f.id,
-                    UserFilmInteraction.rating.isnot(None),
-                )
-                .count()
-            )
-            f.like_count = int(like_count)
-            f.rating_sum = int(rating_sum)
-            f.rating_count = int(rating_count)
+            row = stats.get(f.id)
+            for column in columns:
+                setattr(f, column, int(getattr(row, column)) if row else 0)
             db.session.add(f)
         db.session.commit()
         print("Backfill complete.")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, precompressed copies of static/css and static/js into
+ASSET_DIST_DIR (static/dist), plus the per-page critical CSS bundles.
+Reload the web app afterwards so it picks up the new manifest.
+
+Usage: python scripts/build_assets.py
+"""
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BASE_DIR, Config  # noqa: E402
+from utils.assets import build_assets  # noqa: E402
+from utils.critical_css import build_critical_css  # noqa: E402
+
+
+def main():
+    manifest = build_assets(os.path.join(BASE_DIR, "static"), Config.ASSET_DIST_DIR)
+    for name, hashed in sorted(manifest.items()):
+        print(f"  {name} -> {hashed}")
+    print(f"{len(manifest)} asset(s) written to {Config.ASSET_DIST_DIR}")
+
+    bundles = build_critical_css(
+        os.path.join(BASE_DIR, "templates"),
+        os.path.join(BASE_DIR, "static", "css", "style.css"),
+        Config.ASSET_DIST_DIR,
+    )
+    for name, css in sorted(bundles.items()):
+        print(f"  critical CSS for {name}: {len(css)} bytes")
+
+
+if __name__ == "__main__":
+    main()
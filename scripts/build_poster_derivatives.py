@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Render resized JPEG and WebP derivatives of static/posters into
+static/posters/derived (widths from POSTER_DERIVATIVE_WIDTHS).
+
+Only posters without up-to-date derivatives are processed; derivatives of
+removed or changed sources are deleted. Needs Pillow (pip install Pillow).
+
+Usage: python scripts/build_poster_derivatives.py [--force]
+"""
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import BASE_DIR, Config  # noqa: E402
+from utils.posters import PosterManifest, build_derivatives  # noqa: E402
+
+
+def main():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow is required: pip install Pillow")
+        return 1
+
+    posters_dir = os.path.join(BASE_DIR, "static", "posters")
+    manifest = PosterManifest(posters_dir, cache_path=Config.POSTER_MANIFEST_CACHE)
+    created, removed = build_derivatives(
+        manifest,
+        Config.POSTER_DERIVATIVE_WIDTHS.values(),
+        jpeg_quality=Config.POSTER_JPEG_QUALITY,
+        webp_quality=Config.POSTER_WEBP_QUALITY,
+        force="--force" in sys.argv[1:],
+    )
+    print(
+        f"{len(manifest)} poster(s): {created} derivative(s) written, "
+        f"{removed} stale removed."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
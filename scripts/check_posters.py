@@ -6,26 +6,27 @@ Run on PythonAnywhere: python3 scripts/check_posters.py
 import os
 
 from app import create_app
+from utils.posters import PosterManifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 def check_static_posters():
-    """Get list of poster files in static/posters"""
-    static_dir = "static"
-    posters_dir = os.path.join(static_dir, "posters")
+    """Get list of poster files in static/posters (from the poster manifest)"""
+    posters_dir = os.path.join(ROOT, "static", "posters")
 
     if not os.path.exists(posters_dir):
         print(f"ERROR: static/posters directory not found: {posters_dir}")
         return []
 
-    posters = [
-        f
-        for f in os.listdir(posters_dir)
-        if f.lower().endswith((".jpg", ".png", ".jpeg"))
-    ]
-    posters = sorted(posters)
+    manifest = PosterManifest(
+        posters_dir, cache_path=os.path.join(ROOT, "instance", "poster_manifest.json")
+    ).build()
+    posters = sorted(manifest.entries)
     print(f"Found {len(posters)} poster file(s) in static/posters/:")
     for poster in posters[:10]:
-        print(f"  - {poster}")
+        entry = manifest.get(poster)
+        print(f"  - {poster} ({entry['width']}x{entry['height']}, {entry['hash']})")
     if len(posters) > 10:
         print(f"  ... and {len(posters) - 10} more")
     return posters
@@ -43,6 +44,7 @@ def check_database_posters(limit_show=10):
         local_posters = 0
         remote_posters = 0
         no_posters = 0
+        manifest = app.extensions["poster_manifest"]
 
         for film in films:
             if not film.poster_url:
@@ -55,6 +57,8 @@ def check_database_posters(limit_show=10):
         print(f"  - {local_posters} films reference local poster files")
         print(f"  - {remote_posters} films reference remote poster URLs")
         print(f"  - {no_posters} films have no poster_url")
+        missing = manifest.missing(film.poster_url for film in films)
+        print(f"  - {len(missing)} local poster files are missing")
 
         if local_posters > 0:
             print(f"\nFirst {limit_show} films with local poster filenames:")
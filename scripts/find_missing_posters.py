@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import os
 import sqlite3
+import sys
 
-DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "instance", "app.db")
-STATIC_POSTERS = os.path.join(
-    os.path.dirname(os.path.dirname(__file__)), "static", "posters"
-)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.posters import PosterManifest  # noqa: E402
+
+DB = os.path.join(ROOT, "instance", "app.db")
+STATIC_POSTERS = os.path.join(ROOT, "static", "posters")
 
 
 def main():
@@ -19,16 +23,12 @@ def main():
 
     cur.execute("SELECT id, title, poster_url FROM film")
     rows = cur.fetchall()
-    missing = []
-    for id, title, poster in rows:
-        if not poster:
-            continue
-        poster_path = os.path.join(STATIC_POSTERS, poster)
-        if poster.startswith("http") or poster.startswith("//"):
-            # remote poster, skip file existence check
-            continue
-        if not os.path.exists(poster_path):
-            missing.append((id, title, poster))
+    # remote posters are skipped; local names are looked up in the manifest
+    manifest = PosterManifest(
+        STATIC_POSTERS, cache_path=os.path.join(ROOT, "instance", "poster_manifest.json")
+    ).build()
+    missing_names = set(manifest.missing(poster for _, _, poster in rows))
+    missing = [row for row in rows if row[2] in missing_names]
 
     print("\\nMissing local poster files:")
     for m in missing:
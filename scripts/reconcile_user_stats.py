@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from models.user_stats import UserStats  # noqa: E402
+
+
+def main():
+    env = os.environ.get("FLASK_ENV") or "production"
+    app = create_app(env)
+    with app.app_context():
+        print("Reconciling user_stats from interaction history")
+        rows = UserStats.rebuild()
+        db.session.commit()
+        print("Reconcile complete:", rows, "user rows written.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Move review text out of user_film_interaction into film_review.
+
+Adds the has_review flag, copies non-empty reviews into the new table and
+then drops (or, on SQLite < 3.35, clears) the old review_text column.
+"""
+import os
+import sqlite3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB = os.path.join(ROOT, "instance", "app.db")
+
+
+def column_exists(conn, table, column):
+    cur = conn.execute(f"PRAGMA table_info({table});")
+    cols = [row[1] for row in cur.fetchall()]
+    return column in cols
+
+
+def main():
+    if not os.path.exists(DB):
+        print("DB not found:", DB)
+        return
+    conn = sqlite3.connect(DB)
+    try:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS film_review (
+                user_id INTEGER NOT NULL,
+                film_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at DATETIME,
+                updated_at DATETIME,
+                PRIMARY KEY (user_id, film_id),
+                FOREIGN KEY(user_id, film_id) REFERENCES user_film_interaction
+                    (user_id, film_id) ON DELETE CASCADE,
+                FOREIGN KEY(user_id) REFERENCES user (id),
+                FOREIGN KEY(film_id) REFERENCES film (id)
+            );
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_film_review_created_at "
+            "ON film_review (created_at);"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_film_review_film_created "
+            "ON film_review (film_id, created_at);"
+        )
+
+        if not column_exists(conn, "user_film_interaction", "has_review"):
+            conn.execute(
+                "ALTER TABLE user_film_interaction "
+                "ADD COLUMN has_review BOOLEAN NOT NULL DEFAULT 0;"
+            )
+            print("Added has_review")
+
+        if column_exists(conn, "user_film_interaction", "review_text"):
+            cur = conn.execute(
+                """
+                INSERT OR REPLACE INTO film_review
+                    (user_id, film_id, text, created_at, updated_at)
+                SELECT user_id, film_id, review_text, created_at, updated_at
+                FROM user_film_interaction
+                WHERE review_text IS NOT NULL AND trim(review_text) != '';
+                """
+            )
+            print("Copied", cur.rowcount, "reviews")
+            conn.execute(
+                """
+                UPDATE user_film_interaction
+                SET has_review = EXISTS (
+                    SELECT 1 FROM film_review r
+                    WHERE r.user_id = user_film_interaction.user_id
+                      AND r.film_id = user_film_interaction.film_id
+                );
+                """
+            )
+            conn.commit()
+            try:
+                conn.execute(
+                    "ALTER TABLE user_film_interaction DROP COLUMN review_text;"
+                )
+                print("Dropped review_text")
+            except sqlite3.OperationalError:
+                # older SQLite: keep the column but free the bytes
+                conn.execute("UPDATE user_film_interaction SET review_text = NULL;")
+                print("Cleared review_text (DROP COLUMN unsupported)")
+        conn.commit()
+        conn.execute("VACUUM;")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,8 +22,12 @@ function initializeInteractions() {
     if (deleteButton) {
         deleteButton.addEventListener('click', handleDeleteInteraction);
     }
+    // Pages are shared between users (and cached), so fill in this user's likes
+    loadViewerState(likeButtons);
     // Initialize comment UX (char counter, disable empty submit)
     initializeCommentFeatures();
+    // Bind "Load more" for paginated comments
+    initializeReviewsPager();
 }
 
 function initializeCommentFeatures() {
@@ -59,7 +63,54 @@ function initializeCommentFeatures() {
     updateCounter();
 }
 
-async function handleLikeClick(event) {
+// Liked/rated state of the films on this page, in one request
+async function loadViewerState(likeButtons) {
+    // only logged-in pages render the user menu
+    if (!likeButtons.length || !document.querySelector('.user-menu')) return;
+    const ids = [...new Set(Array.from(likeButtons, b => b.dataset.filmId).filter(Boolean))];
+    if (!ids.length) return;
+    try {
+        const resp = await fetch(`/api/interactions/state?ids=${ids.join(',')}`, {
+            credentials: 'same-origin',
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        });
+        if (!resp.ok) return;
+        const state = await resp.json();
+        if (!state.success) return;
+        const liked = new Set(state.liked);
+        likeButtons.forEach(button => {
+            if (liked.has(Number(button.dataset.filmId))) {
+                updateLikeButton(button, true, false);
+            }
+        });
+    } catch (e) {
+        console.warn('Could not load liked state', e);
+    }
+}
+
+// Like toggles are applied to the page at once and sent in batches: clicks
+// within INTERACTION_FLUSH_DELAY of each other go out as one request, and
+// repeated toggles of a film collapse into its final state (or into nothing
+// when it ends where it started). Whatever is still pending when the page is
+// hidden or closed goes out with sendBeacon.
+const INTERACTION_FLUSH_DELAY = 800;
+const BATCH_URL = '/api/interactions/batch';
+const pendingChanges = new Map();   // filmId -> {liked, rating} to send
+const confirmedLikes = new Map();   // filmId -> {liked, count} as the server has it
+let flushTimer = null;
+
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') sendPendingWithBeacon();
+});
+window.addEventListener('pagehide', sendPendingWithBeacon);
+
+function redirectToLogin() {
+    // try to preserve current path for redirect after login
+    const next = encodeURIComponent(window.location.pathname + window.location.search);
+    window.location.href = `/login?next=${next}`;
+}
+
+function handleLikeClick(event) {
     event.preventDefault();
 
     const button = event.currentTarget;
@@ -69,83 +120,142 @@ async function handleLikeClick(event) {
         console.error('Film ID not found');
         return;
     }
+    // only logged-in pages render the user menu
+    if (!document.querySelector('.user-menu')) {
+        redirectToLogin();
+        return;
+    }
 
-    // Disable button to prevent double clicks
-    button.disabled = true;
-    button.setAttribute('aria-busy', 'true');
-    button.classList.add('processing');
+    const liked = button.getAttribute('aria-pressed') !== 'true';
+    const countElement = document.querySelector(`[data-like-count="${filmId}"]`);
+    const count = countElement ? parseInt(countElement.textContent, 10) || 0 : null;
+    if (!confirmedLikes.has(filmId)) {
+        confirmedLikes.set(filmId, { liked: !liked, count: count });
+    }
+    setLikeButtons(filmId, liked);
+    if (count !== null) updateLikeCount(filmId, Math.max(0, count + (liked ? 1 : -1)));
+    queueInteraction(filmId, { liked: liked });
+}
+
+function setLikeButtons(filmId, liked, animate = true) {
+    document.querySelectorAll(`.like-btn[data-film-id="${filmId}"], .btn-like[data-film-id="${filmId}"]`)
+        .forEach(button => updateLikeButton(button, liked, animate));
+}
+
+function queueInteraction(filmId, fields) {
+    pendingChanges.set(filmId, Object.assign(pendingChanges.get(filmId) || {}, fields));
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flushInteractions, INTERACTION_FLUSH_DELAY);
+}
+
+function takePendingChanges() {
+    const changes = [];
+    pendingChanges.forEach((fields, filmId) => {
+        const confirmed = confirmedLikes.get(filmId);
+        // toggled back to where the server has it: nothing to send
+        if ('liked' in fields && confirmed && fields.liked === confirmed.liked) {
+            delete fields.liked;
+        }
+        if (Object.keys(fields).length) changes.push({ film_id: Number(filmId), ...fields });
+    });
+    pendingChanges.clear();
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    return changes;
+}
+
+async function flushInteractions() {
+    const changes = takePendingChanges();
+    if (!changes.length) return;
 
     try {
-        const response = await fetch(`/api/like/${filmId}`, {
+        const response = await fetch(BATCH_URL, {
             method: 'POST',
             credentials: 'same-origin',
+            keepalive: true,
             headers: {
                 'Content-Type': 'application/json',
                 'X-Requested-With': 'XMLHttpRequest'
-            }
+            },
+            body: JSON.stringify({ changes: changes })
         });
-        // If server returned unauthorized for AJAX, redirect to login
         if (response.status === 401) {
-            // try to preserve current path for redirect after login
-            const next = encodeURIComponent(window.location.pathname + window.location.search);
-            window.location.href = `/login?next=${next}`;
+            redirectToLogin();
             return;
         }
-        // Inspect content type before parsing JSON to detect HTML redirects (e.g., login page)
         const ct = response.headers.get('content-type') || '';
-        if (!ct.includes('application/json')) {
-            // likely a redirect to login or an HTML error page
-            if (response.url && response.url.includes('/login')) {
-                // redirect user to login
-                window.location.href = response.url;
-                return;
-            }
-            showMessage(`Operation failed (${response.status})`, 'error');
-            return;
-        }
-
-        let data = null;
-        try {
-            data = await response.json();
-        } catch (e) {
-            console.warn('Could not parse like response as JSON', e);
-            showMessage('Unexpected server response, please retry', 'error');
+        const data = ct.includes('application/json') ? await response.json() : null;
+        if (!data || !data.success) {
+            revertLikes(changes);
+            showMessage((data && data.message) || `Operation failed (${response.status})`, 'error');
             return;
         }
-
-        if (data && data.success) {
-            // Update button status
-            updateLikeButton(button, data.liked);
-
-            // Update like count
-            updateLikeCount(filmId, data.like_count);
-
-            // Show message
-            showMessage(data.message || 'Like updated', 'success');
-        } else {
-            // server returned success=false
-            const msg = data.message || `Operation failed (${response.status})`;
-            showMessage(msg, 'error');
-        }
+        Object.entries(data.results).forEach(([filmId, result]) => {
+            const count = result.film_stats ? result.film_stats.like_count : null;
+            const confirmed = confirmedLikes.get(filmId) || {};
+            confirmedLikes.set(filmId, {
+                liked: result.liked,
+                count: count !== null ? count : confirmed.count
+            });
+            // clicks made while the batch was in flight win
+            if (pendingChanges.has(filmId)) return;
+            setLikeButtons(filmId, result.liked, false);
+            if (count !== null) updateLikeCount(filmId, count);
+        });
+        // films that no longer exist
+        revertLikes(changes.filter(change => (data.skipped || []).includes(change.film_id)));
     } catch (error) {
-        console.error('Like request failed:', error);
+        console.error('Interaction batch failed:', error);
+        revertLikes(changes);
         // Show clearer error for network/fetch problems
         const errMsg = error && error.message ? error.message : 'Network error, please retry';
         showMessage(errMsg, 'error');
-    } finally {
-        // Re-enable button and clear processing state
-        button.disabled = false;
-        button.removeAttribute('aria-busy');
-        button.classList.remove('processing');
     }
 }
 
+function revertLikes(changes) {
+    changes.forEach(change => {
+        const filmId = String(change.film_id);
+        const confirmed = confirmedLikes.get(filmId);
+        if (!('liked' in change) || !confirmed || pendingChanges.has(filmId)) return;
+        setLikeButtons(filmId, confirmed.liked, false);
+        if (confirmed.count !== null) updateLikeCount(filmId, confirmed.count);
+    });
+}
+
+function sendPendingWithBeacon() {
+    const changes = takePendingChanges();
+    if (!changes.length) return;
+    const body = JSON.stringify({ changes: changes });
+    // text/plain keeps the beacon a simple request; the server parses it as JSON
+    const sent = navigator.sendBeacon
+        && navigator.sendBeacon(BATCH_URL, new Blob([body], { type: 'text/plain' }));
+    if (!sent) {
+        fetch(BATCH_URL, {
+            method: 'POST',
+            credentials: 'same-origin',
+            keepalive: true,
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        }).catch(() => {});
+    }
+    // no response to wait for: assume the server now has these states
+    changes.forEach(change => {
+        if (!('liked' in change)) return;
+        const filmId = String(change.film_id);
+        const confirmed = confirmedLikes.get(filmId) || { count: null };
+        confirmedLikes.set(filmId, { liked: change.liked, count: confirmed.count });
+    });
+}
+
 async function handleInteractionSubmit(event) {
     event.preventDefault();
 
     const form = event.target;
     const filmId = form.dataset.filmId || getFilmIdFromUrl();
     const submitButton = form.querySelector('button[type="submit"]');
+    // queued like toggles must not land after (and undo) this save
+    await flushInteractions();
 
     if (!filmId) {
         showMessage('Unable to get film ID', 'error');
@@ -188,6 +298,8 @@ async function handleInteractionSubmit(event) {
                 if (result.data) {
                     updateInteractionDisplay(result.data);
                     updateFilmStats(result.data.film_stats);
+                    setLikeButtons(String(filmId), result.data.liked, false);
+                    confirmedLikes.delete(String(filmId));
                 }
 
                 // Optimistic append: if server returned review content or we have local text, prepend immediately
@@ -207,7 +319,7 @@ async function handleInteractionSubmit(event) {
 
                 // Reload first page of comments to ensure consistency (after short delay)
                 setTimeout(() => {
-                    loadReviews(filmId, 1);
+                    loadReviews(filmId);
                 }, 800);
             } else {
                 showMessage(result.message || 'Save failed', 'error');
@@ -221,18 +333,20 @@ async function handleInteractionSubmit(event) {
     }
 }
 
-// Load specified page of comments and render to page
-async function loadReviews(filmId, page = 1, per_page = 5) {
+// Load a page of comments. Without a cursor the first page replaces the list;
+// with the next_cursor of the previous page the results are appended.
+async function loadReviews(filmId, cursor = null, per_page = 5) {
     try {
-        const resp = await fetch(`/api/reviews/${filmId}?page=${page}&per_page=${per_page}`);
+        const params = new URLSearchParams({ per_page: per_page });
+        if (cursor) params.set('cursor', cursor);
+        const resp = await fetch(`/api/reviews/${filmId}?${params.toString()}`);
         const json = await resp.json();
         if (!json.success) return;
 
         const container = document.getElementById('reviews-container');
         if (!container) return;
 
-        // Render comments
-        container.innerHTML = '';
+        if (!cursor) container.innerHTML = '';
         json.data.forEach(review => {
             const div = document.createElement('div');
             div.className = 'review-item';
@@ -247,36 +361,44 @@ async function loadReviews(filmId, page = 1, per_page = 5) {
             container.appendChild(div);
         });
 
-        // Pagination controls
-        const pageInfo = document.getElementById('reviews-pagination');
-        if (pageInfo) {
-            const total = json.total;
-            const totalPages = Math.max(1, Math.ceil(total / per_page));
-            pageInfo.innerHTML = renderReviewsPagination(page, totalPages);
-            // Bind pagination buttons
-            pageInfo.querySelectorAll('.review-page-btn').forEach(btn => {
-                btn.addEventListener('click', (e) => {
-                    const p = parseInt(e.currentTarget.dataset.page);
-                    loadReviews(filmId, p, per_page);
-                });
-            });
-        }
+        updateReviewsPager(json.next_cursor);
     } catch (e) {
         console.error('Load reviews failed', e);
     }
 }
 
-function renderReviewsPagination(current, totalPages) {
-    let html = '';
-    if (totalPages <= 1) return html;
-    if (current > 1) {
-        html += `<button class="review-page-btn" data-page="${current-1}">Previous</button>`;
-    }
-    html += `<span> Page ${current} / ${totalPages} </span>`;
-    if (current < totalPages) {
-        html += `<button class="review-page-btn" data-page="${current+1}">Next</button>`;
+// "Load more" control below the server-rendered first page of comments
+function initializeReviewsPager() {
+    const pager = document.getElementById('reviews-pagination');
+    if (!pager) return;
+
+    pager.addEventListener('click', async (e) => {
+        const button = e.target.closest('.review-load-more');
+        if (!button) return;
+        const cursor = pager.dataset.nextCursor;
+        if (!cursor) return;
+        button.disabled = true;
+        await loadReviews(pager.dataset.filmId, cursor, parseInt(pager.dataset.perPage) || 5);
+        button.disabled = false;
+    });
+}
+
+function updateReviewsPager(nextCursor) {
+    const pager = document.getElementById('reviews-pagination');
+    if (!pager) return;
+
+    pager.dataset.nextCursor = nextCursor || '';
+    let button = pager.querySelector('.review-load-more');
+    if (nextCursor && !button) {
+        button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'btn btn-outline btn-sm review-load-more';
+        // translated label rendered by the server (film_detail.html)
+        button.textContent = pager.dataset.loadMoreLabel || 'Load more';
+        pager.appendChild(button);
+    } else if (!nextCursor && button) {
+        button.remove();
     }
-    return html;
 }
 
 function escapeHtml(text) {
@@ -302,6 +424,7 @@ async function handleDeleteInteraction(event) {
     const button = event.target;
     button.disabled = true;
     button.textContent = 'Deleting...';
+    await flushInteractions();
 
     try {
         const response = await fetch(`/api/interaction/${filmId}`, {
@@ -333,16 +456,17 @@ async function handleDeleteInteraction(event) {
     }
 }
 
-function updateLikeButton(button, liked) {
+function updateLikeButton(button, liked, animate = true) {
     // set aria and visual state, keep icon
     button.setAttribute('aria-pressed', liked ? 'true' : 'false');
     if (liked) {
         button.classList.add('liked');
-        // add small animation class
-        button.classList.add('liked-anim');
         button.innerHTML = '<i class="fas fa-heart"></i> <span class="like-label">Liked</span>';
-        // remove animation class after animation (300ms)
-        setTimeout(() => button.classList.remove('liked-anim'), 350);
+        if (animate) {
+            // add small animation class, removed after the animation (300ms)
+            button.classList.add('liked-anim');
+            setTimeout(() => button.classList.remove('liked-anim'), 350);
+        }
     } else {
         button.classList.remove('liked');
         button.innerHTML = '<i class="fas fa-heart"></i> <span class="like-label">Like</span>';
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Tests for HTTP caching (conditional GETs)"""
+
+import time
+
+from flask import template_rendered
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest caching client"}
+
+
+def _app_with_film():
+    from models.film import Film
+
+    app = create_app("testing")
+    with app.app_context():
+        film = Film(title="Versioned")
+        db.session.add(film)
+        db.session.commit()
+        return app, film.id
+
+
+def test_film_pages_answer_conditional_gets():
+    from models.counters import apply_film_deltas
+
+    app, film_id = _app_with_film()
+    client = app.test_client()
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(template.name)
+
+    template_rendered.connect(record, app)
+
+    resp = client.get(f"/films/{film_id}", headers=HEADERS)
+    etag, last_modified = resp.headers["ETag"], resp.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+    assert {"private", "no-cache"} <= set(
+        part.strip() for part in resp.headers["Cache-Control"].split(",")
+    )
+    assert rendered == ["film_detail.html"]
+
+    resp = client.get(f"/films/{film_id}", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 304 and resp.headers["ETag"] == etag
+    assert rendered == ["film_detail.html"]  # not rendered again
+    resp = client.get(
+        f"/films/{film_id}", headers={**HEADERS, "If-Modified-Since": last_modified}
+    )
+    assert resp.status_code == 304
+
+    # counter updates bump the film's version
+    time.sleep(0.01)
+    with app.app_context():
+        apply_film_deltas(film_id, {"like_count": 1})
+        db.session.commit()
+    resp = client.get(f"/films/{film_id}", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+    # so does the session language
+    etag = resp.headers["ETag"]
+    client.get("/language/zh", headers=HEADERS)
+    resp = client.get(f"/films/{film_id}", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 200
+
+    resp = client.get("/films/9999", headers=HEADERS)
+    assert resp.status_code == 404 and "ETag" not in resp.headers
+
+
+def test_film_list_and_reviews_versions():
+    from models.film import Film
+
+    app, film_id = _app_with_film()
+    client = app.test_client()
+
+    etag = client.get("/films", headers=HEADERS).headers["ETag"]
+    resp = client.get("/films", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 304
+    with app.app_context():
+        db.session.add(Film(title="Another"))
+        db.session.commit()
+    resp = client.get("/films", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 200 and b"Another" in resp.data
+
+    resp = client.get(f"/api/reviews/{film_id}", headers=HEADERS)
+    assert "public" in resp.headers["Cache-Control"]
+    resp = client.get(
+        f"/api/reviews/{film_id}",
+        headers={**HEADERS, "If-None-Match": resp.headers["ETag"]},
+    )
+    assert resp.status_code == 304
+    with app.app_context():
+        assert app.extensions["metrics"].get("conditional_not_modified") == 2
+
+
+def test_reviews_version_follows_reviewer_rating():
+    from models.user import User
+
+    app, film_id = _app_with_film()
+    with app.app_context():
+        db.session.add(
+            User(
+                username="critic",
+                email="critic@example.com",
+                password_hash=generate_password_hash("password"),
+            )
+        )
+        db.session.commit()
+    client = app.test_client()
+    client.post(
+        "/login", data={"username": "critic", "password": "password"}, headers=HEADERS
+    )
+    review = {"rating": 2, "review": "Not for me"}
+    client.post(f"/api/interaction/{film_id}", json=review, headers=HEADERS)
+    resp = client.get(f"/api/reviews/{film_id}", headers=HEADERS)
+    assert resp.get_json()["data"][0]["rating"] == 2
+    etag = resp.headers["ETag"]
+
+    # same text, new rating: the listed rating changes, so must the ETag
+    time.sleep(0.01)
+    client.post(
+        f"/api/interaction/{film_id}", json={**review, "rating": 5}, headers=HEADERS
+    )
+    resp = client.get(
+        f"/api/reviews/{film_id}", headers={**HEADERS, "If-None-Match": etag}
+    )
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    assert resp.get_json()["data"][0]["rating"] == 5
+
+
+def test_anonymous_page_cache_hits_and_invalidation(monkeypatch):
+    from config import TestingConfig
+    from models.film import Film
+    from models.user import User
+
+    monkeypatch.setattr(TestingConfig, "PAGE_CACHE_ENABLED", True)
+    app, film_id = _app_with_film()
+    cache = app.extensions["page_cache"]
+    client = app.test_client()
+
+    first = client.get("/films?sort=title&search=", headers=HEADERS)
+    assert first.headers["X-Page-Cache"] == "miss"
+    # same page: empty parameters and parameter order do not matter
+    second = client.get("/films?search=&sort=title", headers=HEADERS)
+    assert second.headers["X-Page-Cache"] == "hit" and second.data == first.data
+    # cached pages still answer conditional requests
+    resp = client.get(
+        "/films?sort=title", headers={**HEADERS, "If-None-Match": first.headers["ETag"]}
+    )
+    assert resp.status_code == 304
+
+    client.get("/language/zh", headers=HEADERS)
+    assert client.get("/films?sort=title", headers=HEADERS).headers["X-Page-Cache"] == (
+        "miss"
+    )
+
+    # committing a film change empties the cache
+    with app.app_context():
+        db.session.add(Film(title="Fresh"))
+        db.session.commit()
+    resp = client.get("/films?sort=title", headers=HEADERS)
+    assert resp.headers["X-Page-Cache"] == "miss" and b"Fresh" in resp.data
+
+    # logged-in users get pages of their own, and only where no likes are embedded
+    with app.app_context():
+        db.session.add(
+            User(
+                username="cached",
+                email="cached@example.com",
+                password_hash=generate_password_hash("password"),
+            )
+        )
+        db.session.commit()
+    member = app.test_client()
+    member.post(
+        "/login", data={"username": "cached", "password": "password"}, headers=HEADERS
+    )
+    resp = member.get("/films?sort=title", headers=HEADERS)
+    assert resp.headers["X-Page-Cache"] == "miss" and b"cached" in resp.data
+    resp = member.get("/films?sort=title", headers=HEADERS)
+    assert resp.headers["X-Page-Cache"] == "hit"
+    # (adding the user emptied the cache, so this is a fresh anonymous render)
+    assert b"cached" not in client.get("/films?sort=title", headers=HEADERS).data
+    assert "X-Page-Cache" not in member.get(f"/films/{film_id}", headers=HEADERS).headers
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 5)
+    with app.app_context():
+        assert app.extensions["metrics"].get("page_cache_hits") == 3
+
+
+def test_counter_flush_empties_page_cache(monkeypatch):
+    from config import TestingConfig
+    from models.counter_buffer import get_buffer
+
+    monkeypatch.setattr(TestingConfig, "PAGE_CACHE_ENABLED", True)
+    monkeypatch.setattr(TestingConfig, "COUNTER_BUFFER_ENABLED", True)
+    monkeypatch.setattr(TestingConfig, "COUNTER_BUFFER_FLUSH_MS", 0)
+    app, film_id = _app_with_film()
+    client = app.test_client()
+    url = f"/films/{film_id}"
+
+    client.get(url, headers=HEADERS)
+    assert client.get(url, headers=HEADERS).headers["X-Page-Cache"] == "hit"
+
+    # deltas another worker buffered (so never overlaid here) reach the
+    # database in a flush, which commits outside the Session hooks
+    with app.app_context():
+        buffer = get_buffer()
+    buffer.add(film_id, None, {"like_count": 7}, {})
+    assert client.get(url, headers=HEADERS).headers["X-Page-Cache"] == "hit"
+    assert buffer.flush() == 1
+    resp = client.get(url, headers=HEADERS)
+    assert resp.headers["X-Page-Cache"] == "miss"
+
+
+def test_page_cache_tiers(tmp_path):
+    from utils.page_cache import PageCache, SharedPageStore
+
+    # the in-process tier evicts least recently used pages past max_bytes
+    local = PageCache(ttl=60, max_bytes=10)
+    local.put("a", 200, [], b"12345")
+    local.put("b", 200, [], b"12345")
+    local.get("a")
+    local.put("c", 200, [], b"12345")
+    assert local.get("b") is None and local.get("a") is not None
+    assert local.get("c", now=time.time() + 120) is None
+
+    # two workers sharing one store see each other's pages and invalidations
+    path = str(tmp_path / "pages.db")
+    worker_a = PageCache(shared=SharedPageStore(path))
+    worker_b = PageCache(shared=SharedPageStore(path))
+    worker_a.put("/films", 200, [["Content-Type", "text/html"]], b"<html>")
+    page = worker_b.get("/films")
+    assert page.body == b"<html>" and page.headers == [["Content-Type", "text/html"]]
+    worker_b.invalidate()
+    assert worker_a.get("/films") is None and worker_b.get("/films") is None
+
+
+def test_viewer_state_endpoint():
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.user import User
+
+    app = create_app("testing")
+    with app.app_context():
+        films = [Film(title=f"State {i}") for i in range(3)]
+        user = User(
+            username="viewer",
+            email="viewer@example.com",
+            password_hash=generate_password_hash("password"),
+        )
+        db.session.add_all(films + [user])
+        db.session.flush()
+        ids = [film.id for film in films]
+        db.session.add_all(
+            [
+                UserFilmInteraction(user_id=user.id, film_id=ids[0], liked=True),
+                UserFilmInteraction(
+                    user_id=user.id, film_id=ids[1], liked=False, rating=4
+                ),
+            ]
+        )
+        db.session.commit()
+    client = app.test_client()
+    query = ",".join(str(i) for i in ids)
+
+    assert client.get(f"/api/interactions/state?ids={query}").status_code != 200
+    client.post(
+        "/login", data={"username": "viewer", "password": "password"}, headers=HEADERS
+    )
+    # the cards no longer carry the viewer's likes
+    assert b"liked" not in client.get("/films", headers=HEADERS).data
+
+    resp = client.get(f"/api/interactions/state?ids={query}", headers=HEADERS)
+    # rated but not liked films are left out
+    assert resp.get_json() == {"success": True, "liked": [ids[0]]}
+    resp = client.get(
+        f"/api/interactions/state?ids={query}",
+        headers={**HEADERS, "If-None-Match": resp.headers["ETag"]},
+    )
+    assert resp.status_code == 304
+
+    assert client.get("/api/interactions/state?ids=1,x").status_code == 400
+    too_many = ",".join(str(i) for i in range(1, 102))
+    assert client.get(f"/api/interactions/state?ids={too_many}").status_code == 400
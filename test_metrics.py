@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Tests for request metrics and the /metrics endpoint"""
+
+import json
+import os
+
+import pytest
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest metrics client"}
+
+
+def test_histogram_quantiles_and_merge():
+    from utils.metrics import Histogram, Metrics
+
+    histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert abs(histogram.quantile(0.5) - 0.15) < 1e-9
+    assert histogram.quantile(0.99) <= 0.4
+
+    # two workers' snapshots add up
+    a, b = Metrics(), Metrics()
+    a.inc("http_requests", labels={"endpoint": "film.index", "status": "200"})
+    b.inc("http_requests", 2, labels={"endpoint": "film.index", "status": "200"})
+    b.observe("http_request_duration_seconds", 0.02, {"endpoint": "film.index"})
+    merged = Metrics()
+    merged.merge_snapshot(a.snapshot())
+    merged.merge_snapshot(b.snapshot())
+    assert merged.get("http_requests", {"status": "200", "endpoint": "film.index"}) == 3
+    duration = merged.histogram(
+        "http_request_duration_seconds", {"endpoint": "film.index"}
+    )
+    assert duration.count == 1
+
+
+def test_request_metrics_exposed(tmp_path, monkeypatch):
+    from config import TestingConfig
+    from models.film import Film
+
+    monkeypatch.setattr(TestingConfig, "METRICS_SHARED_DIR", str(tmp_path))
+    app = create_app("testing")
+    with app.app_context():
+        db.session.add(Film(title="Measured"))
+        db.session.commit()
+    client = app.test_client()
+    client.get("/films", headers=HEADERS)
+    client.get("/films", headers=HEADERS)
+    client.get("/films/9999", headers=HEADERS)
+
+    with app.app_context():
+        metrics = app.extensions["metrics"]
+        labels = {"endpoint": "film.list_films", "method": "GET", "status": "200"}
+        assert metrics.get("http_requests", labels) == 2
+        queries = metrics.histogram(
+            "http_request_db_queries", {"endpoint": "film.list_films"}
+        )
+        assert queries.count == 2 and queries.sum > 0
+
+    resp = client.get("/metrics", headers=HEADERS)
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain; version=0.0.4")
+    text = resp.get_data(as_text=True)
+    assert "# TYPE app_http_requests_total counter" in text
+    assert (
+        'app_http_requests_total{endpoint="film.list_films",method="GET",'
+        'status="200"} 2' in text
+    )
+    assert 'status="404"' in text
+    assert "# TYPE app_http_request_duration_seconds histogram" in text
+    assert (
+        'app_http_request_duration_seconds_count{endpoint="film.list_films"} 2'
+        in text
+    )
+    assert (
+        'app_http_request_duration_seconds_quantile{endpoint="film.list_films",'
+        'quantile="0.95"}' in text
+    )
+    assert "app_db_queries_total" in text
+    # the worker published its totals for the others, under pid and start
+    (shared,) = tmp_path.glob("metrics-*.json")
+    assert shared.name.startswith(f"metrics-{os.getpid()}-")
+
+    # only loopback scrapers, unless a token is configured
+    resp = client.get(
+        "/metrics", headers=HEADERS, environ_base={"REMOTE_ADDR": "203.0.113.9"}
+    )
+    assert resp.status_code == 403
+    # production refuses everyone until a token is set
+    app.config["METRICS_REQUIRE_TOKEN"] = True
+    assert client.get("/metrics", headers=HEADERS).status_code == 403
+    app.config["METRICS_TOKEN"] = "secret"
+    assert client.get("/metrics", headers=HEADERS).status_code == 403
+    resp = client.get(
+        "/metrics",
+        headers={**HEADERS, "Authorization": "Bearer secret"},
+        environ_base={"REMOTE_ADDR": "203.0.113.9"},
+    )
+    assert resp.status_code == 200
+
+
+def test_metrics_merge_worker_files(tmp_path, monkeypatch):
+    from utils import metrics as metrics_module
+    from utils.metrics import Metrics, merged_metrics
+
+    # pid 101 was reused by a later worker: both files count
+    for name, amount in (("101-1000", 1), ("101-2000", 2), ("102-1000", 4)):
+        worker = Metrics()
+        worker.inc("db_queries", amount)
+        (tmp_path / f"metrics-{name}.json").write_text(json.dumps(worker.snapshot()))
+    (tmp_path / "metrics-103-1000.json").write_text("{broken")
+    monkeypatch.setattr(metrics_module, "_pid_alive", lambda pid: True)
+    assert merged_metrics(str(tmp_path)).get("db_queries") == 7
+
+
+def test_metrics_dead_worker_files_are_retired(tmp_path, monkeypatch):
+    from utils import metrics as metrics_module
+    from utils.metrics import Metrics, merged_metrics
+
+    if metrics_module.fcntl is None:
+        pytest.skip("pruning needs fcntl")
+    for name, amount in (("101-1000", 1), ("101-2000", 2), ("102-1000", 4)):
+        worker = Metrics()
+        worker.inc("db_queries", amount)
+        (tmp_path / f"metrics-{name}.json").write_text(json.dumps(worker.snapshot()))
+    monkeypatch.setattr(metrics_module, "_pid_alive", lambda pid: pid == 102)
+
+    assert merged_metrics(str(tmp_path)).get("db_queries") == 7
+    names = sorted(p.name for p in tmp_path.glob("metrics-*.json"))
+    assert names == ["metrics-102-1000.json", "metrics-retired.json"]
+
+    # folding again (e.g. once 102 exits too) never loses a count
+    monkeypatch.setattr(metrics_module, "_pid_alive", lambda pid: False)
+    assert merged_metrics(str(tmp_path)).get("db_queries") == 7
+    assert merged_metrics(str(tmp_path)).get("db_queries") == 7
+    names = sorted(p.name for p in tmp_path.glob("metrics-*.json"))
+    assert names == ["metrics-retired.json"]
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Query-count tests for review and profile pages"""
+
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest query counter"}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, params, context, many):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _setup(app, reviewers=5):
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.user import User
+
+    db.create_all()
+    film = Film(title="Queried")
+    users = [
+        User(
+            username=f"reviewer{i}",
+            email=f"reviewer{i}@example.com",
+            password_hash=generate_password_hash("password"),
+        )
+        for i in range(reviewers)
+    ]
+    db.session.add_all([film] + users)
+    db.session.commit()
+    for user in users:
+        db.session.add(
+            UserFilmInteraction(
+                user_id=user.id,
+                film_id=film.id,
+                liked=True,
+                rating=4,
+                review_text=f"Review by {user.username}",
+            )
+        )
+    db.session.commit()
+    return film, users
+
+
+def test_review_page_is_one_query():
+    app = create_app("testing")
+    with app.app_context():
+        film, _ = _setup(app)
+        url = f"/api/reviews/{film.id}?per_page=5"
+        client = app.test_client()
+
+        with count_queries() as statements:
+            resp = client.get(url, headers=HEADERS)
+
+        assert resp.status_code == 200
+        assert resp.json["total"] == 5
+        assert {r["user"]["username"] for r in resp.json["data"]} == {
+            f"reviewer{i}" for i in range(5)
+        }
+        # the conditional GET version lookup, then the page itself
+        assert len(statements) == 2
+        assert "max(film_review.updated_at)" in statements[0]
+
+        with count_queries() as statements:
+            resp = client.get(
+                url, headers={**HEADERS, "If-None-Match": resp.headers["ETag"]}
+            )
+        assert resp.status_code == 304
+        assert len(statements) == 1
+
+
+def test_detail_and_profile_do_not_lazy_load():
+    """RAISE_ON_LAZY_LOAD turns a forgotten eager load into a 500"""
+    app = create_app("testing")
+    with app.app_context():
+        film, users = _setup(app)
+        client = app.test_client()
+        client.post(
+            "/login",
+            data={"username": users[0].username, "password": "password"},
+            headers=HEADERS,
+        )
+
+        assert client.get(f"/films/{film.id}", headers=HEADERS).status_code == 200
+        resp = client.get("/profile", headers=HEADERS)
+        assert resp.status_code == 200
+        assert b"Queried" in resp.data
+
+
+def test_review_cursor_pages_cover_all_reviews():
+    app = create_app("testing")
+    with app.app_context():
+        film, _ = _setup(app, reviewers=12)
+        base = f"/api/reviews/{film.id}?per_page=5"
+        client = app.test_client()
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            url = base + (f"&cursor={cursor}" if cursor else "")
+            data = client.get(url, headers=HEADERS).json
+            seen.extend(r["id"] for r in data["data"])
+            pages += 1
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+
+        assert pages == 3
+        assert len(seen) == len(set(seen)) == 12
+
+        bad = client.get(base + "&cursor=not-a-cursor", headers=HEADERS)
+        assert bad.status_code == 400
+
+        # the detail page renders only the first page inline
+        html = client.get(f"/films/{film.id}", headers=HEADERS).data.decode()
+        assert html.count('class="review-item"') == 5
+        assert "review-load-more" in html
+        assert 'data-load-more-label="Load more"' in html
+
+
+def test_profile_stats_and_pagination():
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.user import User
+    from models.user_stats import UserStats
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        user = User(
+            username="heavy",
+            email="heavy@example.com",
+            password_hash=generate_password_hash("password"),
+        )
+        films = [Film(title=f"History {i:02d}") for i in range(25)]
+        db.session.add_all([user] + films)
+        db.session.commit()
+        for i, film in enumerate(films):
+            db.session.add(
+                UserFilmInteraction(
+                    user_id=user.id,
+                    film_id=film.id,
+                    liked=i % 2 == 0,
+                    rating=(i % 5) + 1 if i < 10 else None,
+                    review_text="text" if i < 3 else None,
+                )
+            )
+        db.session.commit()
+
+        client = app.test_client()
+        client.post(
+            "/login",
+            data={"username": "heavy", "password": "password"},
+            headers=HEADERS,
+        )
+
+        # a user without a user_stats row sees zeros, and GET writes nothing
+        with count_queries() as statements:
+            html = client.get("/profile", headers=HEADERS).data.decode()
+        assert not [s for s in statements if not s.lstrip().startswith("SELECT")]
+        assert "<h2>0</h2>" in html
+        assert UserStats.query.count() == 0
+
+        # rows for existing history come from scripts/reconcile_user_stats.py
+        UserStats.rebuild()
+        db.session.commit()
+        client.get("/profile", headers=HEADERS)  # reloads the expired user
+        with count_queries() as statements:
+            html = client.get("/profile", headers=HEADERS).data.decode()
+        # stats row, history page and its reviews; the user loader is served
+        # from the identity map (the test's app context keeps the session)
+        assert len(statements) == 3
+        assert html.count('class="interaction-item"') == 20
+        assert "<h2>13</h2>" in html and "<h2>3</h2>" in html and "3.0" in html
+
+        html = client.get("/profile?page=2", headers=HEADERS).data.decode()
+        assert html.count('class="interaction-item"') == 5
+
+
+def test_user_loader_cache_skips_user_query():
+    from models.user import User
+    from utils.metrics import get_metrics
+
+    app = create_app("testing")
+    with app.app_context():
+        film, users = _setup(app, reviewers=1)
+        film_id, user_id = film.id, users[0].id
+
+    client = app.test_client()
+    client.post(
+        "/login",
+        data={"username": "reviewer0", "password": "password"},
+        headers=HEADERS,
+    )
+    client.post(f"/api/like/{film_id}", headers=HEADERS)
+
+    with app.app_context():
+        with count_queries() as statements:
+            client.post(f"/api/like/{film_id}", headers=HEADERS)
+        assert not any(re.search(r"FROM user\b", s) for s in statements)
+        assert get_metrics().get("user_cache_hits") >= 1
+
+        # a committed profile change drops the cached snapshot
+        db.session.get(User, user_id).username = "renamed"
+        db.session.commit()
+        assert app.extensions["user_cache"].get(user_id) is None
+
+    html = client.get("/profile", headers=HEADERS).data.decode()
+    assert "renamed" in html
+
+
+def test_request_query_stats_and_n_plus_one():
+    import pytest
+
+    from models.film import Film
+    from utils.query_stats import NPlusOneError
+
+    app = create_app("testing")
+
+    @app.route("/_n_plus_one")
+    def n_plus_one():
+        ids = [f.id for f in Film.query.with_entities(Film.id)]
+        return str(sum(len(db.session.get(Film, i).title) for i in ids))
+
+    with app.app_context():
+        film, users = _setup(app, reviewers=12)
+        db.session.add_all([Film(title=f"Extra {i}") for i in range(5)])
+        db.session.commit()
+        film_id = film.id
+    client = app.test_client()
+
+    # the review pages and the profile stay clear of the detector
+    resp = client.get(f"/api/reviews/{film_id}?per_page=10", headers=HEADERS)
+    assert resp.status_code == 200
+    timing = resp.headers["Server-Timing"]
+    assert re.match(r'db;dur=[\d.]+;desc="2 queries"', timing)
+    client.post(
+        "/login", data={"username": "reviewer0", "password": "password"}, headers=HEADERS
+    )
+    assert client.get("/profile", headers=HEADERS).status_code == 200
+
+    # one primary-key SELECT per film is flagged
+    with pytest.raises(NPlusOneError, match="SELECT film"):
+        client.get("/_n_plus_one", headers=HEADERS)
+    app.config["N_PLUS_ONE_RAISE"] = False
+    assert client.get("/_n_plus_one", headers=HEADERS).status_code == 200
+    with app.app_context():
+        assert app.extensions["metrics"].get("n_plus_one") == 2
+        assert app.extensions["metrics"].histogram(
+            "http_request_db_seconds", {"endpoint": "n_plus_one"}
+        )
+
+
+def test_slow_query_log_has_plan(caplog):
+    from utils import query_stats
+
+    app = create_app("testing")
+    app.config["SLOW_QUERY_SECONDS"] = 0
+    query_stats._explained.clear()
+    with app.app_context():
+        film, _ = _setup(app, reviewers=2)
+        film_id = film.id
+
+    with caplog.at_level("WARNING", logger="sql"):
+        app.test_client().get(f"/api/reviews/{film_id}", headers=HEADERS)
+    slow = [r.getMessage() for r in caplog.records if r.name == "sql"]
+    assert any("endpoint=interaction.get_reviews" in m for m in slow)
+    # SQLite's plan mentions how each table is read
+    assert any("plan=" in m and ("SEARCH" in m or "SCAN" in m) for m in slow)
+
+
+def test_failed_statement_does_not_leak_start_time():
+    from sqlalchemy.exc import OperationalError
+
+    from utils import query_stats
+
+    app = create_app("testing")
+    with app.app_context(), db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("SELECT * FROM no_such_table")
+        assert not conn.info.get(query_stats._START_KEY)
+        conn.exec_driver_sql("SELECT 1")
+        assert not conn.info.get(query_stats._START_KEY)
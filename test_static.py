@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Tests for poster and static asset handling"""
+
+import struct
+import zlib
+
+import pytest
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest static client"}
+
+
+def _png(width, height):
+    """Smallest valid PNG header + IHDR chunk for the given size."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+    )
+
+
+def test_poster_manifest_tracks_files(tmp_path):
+    from utils.posters import PosterManifest
+
+    (tmp_path / "a.png").write_bytes(_png(300, 450))
+    (tmp_path / "notes.txt").write_text("not a poster")
+    cache = tmp_path / "cache" / "manifest.json"
+    manifest = PosterManifest(
+        str(tmp_path), url_prefix="/static/posters", cache_path=str(cache)
+    ).build()
+
+    assert list(manifest.entries) == ["a.png"]
+    poster = manifest.poster_for("a.png")
+    assert poster.url == "/static/posters/a.png"
+    assert (poster.width, poster.height) == (300, 450)
+    assert manifest.poster_for("missing.png") is None
+    assert manifest.poster_for("https://example.com/p.jpg").url.startswith("https")
+    assert manifest.missing(["a.png", "b.png", "//cdn/x.jpg", None]) == ["b.png"]
+
+    # changes are picked up only once the check interval has passed
+    (tmp_path / "b.png").write_bytes(_png(10, 20))
+    assert manifest.refresh(now=manifest._checked_at + 0.1) is False
+    assert manifest.refresh(now=manifest._checked_at + 60) is True
+    assert manifest.get("b.png")["width"] == 10
+
+    # an unchanged folder is only stat'ed, not rescanned
+    scans = []
+    original_scan = manifest._scan
+    manifest._scan = lambda: scans.append(1) or original_scan()
+    assert manifest.refresh(now=manifest._checked_at + 60) is False
+    assert scans == []
+    (tmp_path / "b.png").unlink()
+    assert manifest.refresh(now=manifest._checked_at + 60) is True
+    assert scans == [1] and "b.png" not in manifest
+
+    # a fresh manifest reuses the cached hashes
+    reloaded = PosterManifest(str(tmp_path), cache_path=str(cache))
+    assert reloaded.entries == manifest.entries
+
+
+def test_poster_derivatives_in_srcset(tmp_path):
+    from utils.posters import PosterManifest, derivative_name, derivative_widths
+
+    (tmp_path / "big.png").write_bytes(_png(1200, 1800))
+    (tmp_path / "small.png").write_bytes(_png(500, 750))
+    manifest = PosterManifest(str(tmp_path)).build()
+    assert manifest.poster_for("big.png").srcset == ""
+
+    targets = (400, 600, 900)
+    assert derivative_widths(500, targets) == [400, 500]
+    derived = tmp_path / "derived"
+    derived.mkdir()
+    for name in ("big.png", "small.png"):
+        entry = manifest.get(name)
+        for width in derivative_widths(entry["width"], targets):
+            for ext in ("jpg", "webp"):
+                if ext == "jpg" and width == entry["width"]:
+                    continue
+                out = derivative_name(name, width, entry["hash"], ext)
+                (derived / out).write_bytes(b"")
+    # a derivative of an older version of the file is ignored
+    (derived / "big-400w.0123456789abcdef.jpg").write_bytes(b"")
+    assert manifest.refresh(now=manifest._checked_at + 60) is True
+
+    big = manifest.poster_for("big.png")
+    assert big.url == "/static/posters/big.png"
+    assert big.srcset.split(", ") == [
+        f"/static/posters/derived/big-{w}w.{big.hash}.jpg {w}w" for w in targets
+    ]
+    assert big.webp_srcset.count(".webp") == 3
+    # a small source has no upscaled copy: the original fills the top slot
+    small = manifest.poster_for("small.png")
+    assert small.srcset.endswith("/static/posters/small.png 500w")
+    assert small.webp_srcset.endswith(f"small-500w.{small.hash}.webp 500w")
+
+
+def test_build_poster_derivatives(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    from utils.posters import PosterManifest, build_derivatives
+
+    Image.new("RGB", (1000, 1500), "red").save(tmp_path / "a.jpg")
+    manifest = PosterManifest(str(tmp_path))
+    assert build_derivatives(manifest, (400, 900)) == (4, 0)
+    assert manifest.poster_for("a.jpg").srcset.count("w.") == 2
+    with Image.open(tmp_path / "derived" / manifest._scan_derived()[0]) as image:
+        assert image.size in ((400, 600), (900, 1350))
+    # nothing to do until a source changes
+    assert build_derivatives(manifest, (400, 900)) == (0, 0)
+    Image.new("RGB", (1000, 1500), "blue").save(tmp_path / "a.jpg")
+    assert build_derivatives(manifest, (400, 900)) == (4, 4)
+
+
+def test_templates_use_manifest_posters():
+    from models.film import Film
+
+    app = create_app("testing")
+    manifest = app.extensions["poster_manifest"]
+    name = sorted(manifest.entries)[0]
+    entry = manifest.get(name)
+    with app.app_context():
+        db.session.add_all(
+            [
+                Film(title="Has poster", poster_url=name),
+                Film(title="Lost poster", poster_url="does-not-exist.jpg"),
+            ]
+        )
+        db.session.commit()
+
+    html = app.test_client().get("/films", headers=HEADERS).data.decode()
+    assert f'src="/static/posters/{name}"' in html
+    assert "<picture>" in html
+    assert f'width="{entry["width"]}" height="{entry["height"]}"' in html
+    assert "does-not-exist.jpg" not in html
+
+
+def test_fingerprinted_assets(tmp_path, monkeypatch):
+    import gzip
+    import os
+
+    from config import TestingConfig
+    from utils.assets import build_assets
+
+    static = os.path.join(os.path.dirname(__file__), "static")
+    manifest = build_assets(static, str(tmp_path))
+    hashed = manifest["css/style.css"]
+    assert hashed.startswith("css/style.") and hashed != "css/style.css"
+    assert (tmp_path / (hashed + ".gz")).exists()
+    # rebuilding unchanged sources keeps the same names
+    assert build_assets(static, str(tmp_path)) == manifest
+
+    monkeypatch.setattr(TestingConfig, "ASSET_DIST_DIR", str(tmp_path))
+    app = create_app("testing")
+    client = app.test_client()
+    html = client.get("/", headers=HEADERS).data.decode()
+    assert f'href="/static/dist/{hashed}"' in html
+    assert 'href="/static/css/style.css"' not in html
+
+    resp = client.get(
+        f"/static/dist/{hashed}", headers={**HEADERS, "Accept-Encoding": "gzip"}
+    )
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert resp.mimetype == "text/css"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    with open(os.path.join(static, "css", "style.css"), "rb") as fh:
+        source = fh.read()
+    assert gzip.decompress(resp.data) == source
+
+    plain = client.get(f"/static/dist/{hashed}", headers=HEADERS)
+    assert "Content-Encoding" not in plain.headers and plain.data == source
+    assert client.get("/static/dist/css/style.css", headers=HEADERS).status_code == 404
+    # unfingerprinted files keep the default caching
+    resp = client.get("/static/css/style.css", headers=HEADERS)
+    assert "immutable" not in resp.headers.get("Cache-Control", "")
+
+
+def test_critical_css_inlined_per_page(tmp_path, monkeypatch):
+    import os
+
+    from config import TestingConfig
+    from utils.critical_css import build_critical_css, extract_css, parse_css
+
+    css = """
+    /* comment { } */
+    .films-grid { display: grid; }
+    .films-grid:hover, .unused { color: red; }
+    @media (max-width: 768px) { .films-grid { gap: 1rem; } .unused { x: y; } }
+    @keyframes spin { to { transform: rotate(1turn); } }
+    .footer { color: gray; }
+    .icon { background: url('data:image/svg+xml,<svg a="b;c"/>'); }
+    """
+    assert [prelude for prelude, _ in parse_css(css)][0] == ".films-grid"
+    tokens = {
+        "classes": {"films-grid", "footer", "icon"},
+        "tags": set(),
+        "attributes": set(),
+    }
+    assert extract_css(css, tokens) == (
+        ".films-grid{display:grid}"
+        "@media (max-width: 768px){.films-grid{gap:1rem}}"
+        ".icon{background:url('data:image/svg+xml,<svg a=\"b;c\"/>')}"
+    )
+
+    root = os.path.dirname(__file__)
+    bundles = build_critical_css(
+        os.path.join(root, "templates"),
+        os.path.join(root, "static", "css", "style.css"),
+        str(tmp_path),
+    )
+    assert ".films-grid{" in bundles["film_list.html"]
+    assert ".films-grid{" not in bundles["login.html"]
+
+    monkeypatch.setattr(TestingConfig, "ASSET_DIST_DIR", str(tmp_path))
+    app = create_app("testing")
+    html = app.test_client().get("/films", headers=HEADERS).data.decode()
+    assert f"<style>{bundles['film_list.html']}</style>" in html
+    assert 'rel="preload" href="/static/css/style.css" as="style"' in html
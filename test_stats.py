@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Tests for denormalized statistics maintained on write"""
+
+import time
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest stats client"}
+
+
+def _login(app, username):
+    client = app.test_client()
+    client.post(
+        "/login",
+        data={"username": username, "password": "password"},
+        headers=HEADERS,
+    )
+    return client
+
+
+def _make_user(username):
+    from models.user import User
+
+    user = User(
+        username=username,
+        email=f"{username}@example.com",
+        password_hash=generate_password_hash("password"),
+    )
+    db.session.add(user)
+    return user
+
+
+def test_user_stats_incremental_matches_rebuild():
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.user_stats import UserStats
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        user = _make_user("statsuser")
+        films = [Film(title=f"Stats {i}") for i in range(4)]
+        db.session.add_all(films)
+        db.session.commit()
+        user_id = user.id
+        film_ids = [f.id for f in films]
+
+        # history written before the stats row existed
+        db.session.add(
+            UserFilmInteraction(
+                user_id=user_id, film_id=film_ids[0], liked=True, rating=3
+            )
+        )
+        db.session.commit()
+
+        client = _login(app, "statsuser")
+        client.post(f"/api/like/{film_ids[1]}")
+        client.post(
+            f"/api/interaction/{film_ids[2]}",
+            json={"liked": False, "rating": 5, "review": "Superb"},
+        )
+        client.post(
+            f"/api/interaction/{film_ids[1]}",
+            json={"liked": True, "rating": 4, "review": ""},
+        )
+        client.post(f"/like/{film_ids[3]}")
+        client.delete(f"/api/interaction/{film_ids[0]}")
+
+        def row():
+            db.session.expire_all()
+            s = db.session.get(UserStats, user_id)
+            return (
+                s.interaction_count,
+                s.like_count,
+                s.review_count,
+                s.rating_count,
+                s.rating_sum,
+            )
+
+        incremental = row()
+        assert incremental == (3, 2, 1, 2, 9)
+
+        UserStats.rebuild()
+        db.session.commit()
+        assert row() == incremental
+
+
+def test_film_histogram_and_review_count():
+    from models.film import Film
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        _make_user("rater1")
+        _make_user("rater2")
+        film = Film(title="Histogram")
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+
+    # requests from two users must not share an outer app context (and g)
+    one = _login(app, "rater1")
+    two = _login(app, "rater2")
+    one.post(f"/api/interaction/{film_id}", json={"rating": 5, "review": "Top"})
+    two.post(f"/api/interaction/{film_id}", json={"rating": 3, "review": ""})
+    resp = one.post(
+        f"/api/interaction/{film_id}", json={"rating": 4, "review": "Still good"}
+    )
+    distribution = resp.json["data"]["film_stats"]["rating_distribution"]
+    assert [d["count"] for d in distribution] == [0, 1, 1, 0, 0]
+
+    with app.app_context():
+        film = db.session.get(Film, film_id)
+        assert (film.rating_3, film.rating_4, film.rating_5) == (1, 1, 0)
+        assert film.review_count == 1
+
+    html = two.get(f"/films/{film_id}", headers=HEADERS).data.decode()
+    assert "rating-distribution" in html
+
+    one.delete(f"/api/interaction/{film_id}")
+    with app.app_context():
+        film = db.session.get(Film, film_id)
+        assert (film.rating_3, film.rating_4, film.review_count) == (1, 0, 0)
+        assert film.rating_count == 1 and film.rating_sum == 3
+
+
+def test_out_of_range_json_rating_is_ignored():
+    from models.film import Film
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        _make_user("sloppy")
+        film = Film(title="Unrated")
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+
+    client = _login(app, "sloppy")
+    for rating in (99, 3.7, True, 0):
+        resp = client.post(f"/api/interaction/{film_id}", json={"rating": rating})
+        assert resp.json["success"] is True
+    with app.app_context():
+        film = db.session.get(Film, film_id)
+        assert (film.rating_count, film.rating_sum) == (0, 0)
+        assert (film.rating_1, film.rating_5) == (0, 0)
+
+
+def test_review_text_lives_in_film_review():
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.review import FilmReview
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        user = _make_user("writer")
+        film = Film(title="Reviewed")
+        db.session.add(film)
+        db.session.commit()
+        user_id, film_id = user.id, film.id
+
+    client = _login(app, "writer")
+    url = f"/api/interaction/{film_id}"
+    resp = client.post(url, json={"rating": 4, "review": "First take"})
+    assert resp.json["data"]["has_review"] is True
+    client.post(url, json={"rating": 4, "review": "Second take"})
+
+    with app.app_context():
+        interaction = db.session.get(UserFilmInteraction, (user_id, film_id))
+        assert interaction.has_review is True
+        assert interaction.review_text == "Second take"
+        assert FilmReview.query.count() == 1
+
+    # clearing the text removes the review row but keeps the interaction
+    client.post(url, json={"rating": 4, "review": "  "})
+    with app.app_context():
+        interaction = db.session.get(UserFilmInteraction, (user_id, film_id))
+        assert interaction.has_review is False and interaction.review_text is None
+        assert FilmReview.query.count() == 0
+
+    client.post(url, json={"rating": 4, "review": "Back again"})
+    client.delete(url)
+    with app.app_context():
+        assert FilmReview.query.count() == 0
+
+
+def test_counters_apply_atomic_deltas(monkeypatch):
+    from models.counters import apply_film_deltas
+    from models.film import Film
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        _make_user("counter")
+        film = Film(title="Counted", like_count=5)
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+
+    # the like is added on top of whatever is stored, not recomputed
+    client = _login(app, "counter")
+    resp = client.post(f"/api/like/{film_id}")
+    assert resp.json["like_count"] == 6
+
+    with app.app_context():
+        # another writer bumped the row behind the session's back
+        db.session.execute(
+            db.update(Film).where(Film.id == film_id).values(like_count=10)
+        )
+        db.session.commit()
+    resp = client.post(f"/api/like/{film_id}")
+    assert resp.json["like_count"] == 9
+
+    with app.app_context():
+        counters = apply_film_deltas(film_id, {"like_count": -50, "rating_5": 1})
+        db.session.commit()
+        assert (counters.like_count, counters.rating_5) == (0, 1)
+        assert db.session.get(Film, film_id).like_count == 0
+        assert apply_film_deltas(film_id + 100, {"like_count": 1}) is None
+
+        # SQLite before 3.35 has no RETURNING: update, then read back
+        monkeypatch.setattr(db.session.get_bind().dialect, "update_returning", False)
+        counters = apply_film_deltas(film_id, {"like_count": 3})
+        db.session.commit()
+        assert counters.like_count == 3 and counters.rating_5 == 1
+        assert apply_film_deltas(film_id + 100, {"like_count": 1}) is None
+
+
+def test_counter_buffer_write_behind():
+    from models.counter_buffer import CounterBuffer, get_buffer, overlay_pending
+    from models.film import Film
+    from models.interaction_daily import InteractionDaily
+
+    app = create_app("testing")
+    app.config.update(
+        COUNTER_BUFFER_ENABLED=True,
+        COUNTER_BUFFER_FLUSH_MS=0,
+        COUNTER_BUFFER_MAX_EVENTS=3,
+    )
+    with app.app_context():
+        db.create_all()
+        for name in ("fan1", "fan2", "fan3"):
+            _make_user(name)
+        film = Film(title="Hot")
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+
+    fans = [_login(app, name) for name in ("fan1", "fan2", "fan3")]
+    assert fans[0].post(f"/api/like/{film_id}").json["like_count"] == 1
+    assert fans[1].post(f"/api/like/{film_id}").json["like_count"] == 2
+
+    with app.app_context():
+        # nothing written yet, but readers see the unflushed deltas
+        assert db.session.get(Film, film_id).like_count == 0
+        assert InteractionDaily.query.count() == 0
+        assert len(get_buffer()) == 2
+        film = db.session.get(Film, film_id)
+        overlay_pending([film])
+        overlay_pending([film])
+        assert film.like_count == 2 and not db.session.dirty
+    html = fans[2].get(f"/films/{film_id}", headers=HEADERS).data.decode()
+    assert "Hot" in html
+
+    # the third event reaches max_events and flushes in one transaction
+    assert fans[2].post(f"/api/like/{film_id}").json["like_count"] == 3
+    with app.app_context():
+        assert db.session.get(Film, film_id).like_count == 3
+        assert InteractionDaily.query.one().likes == 3
+        assert len(get_buffer()) == 0
+
+        # deltas of a rolled back transaction never reach the buffer
+        get_buffer().stage(db.session, film_id, None, {"like_count": 1}, {})
+        db.session.rollback()
+        assert get_buffer().pending(film_id) == {}
+
+        # with a flush thread, max_events wakes it instead of flushing inline
+        buffer = CounterBuffer(db.engine, flush_interval=3600, max_events=2)
+        buffer.start()
+        try:
+            buffer.add(film_id, None, {"like_count": 1}, {})
+            buffer.add(film_id, None, {"like_count": 1}, {})
+            deadline = time.time() + 5
+            while len(buffer) and time.time() < deadline:
+                time.sleep(0.01)
+            db.session.expire_all()
+            assert db.session.get(Film, film_id).like_count == 5
+        finally:
+            buffer.stop()
@@ -107,7 +107,7 @@ def test_trending_data():
                         UserFilmInteraction.created_at >= seven_days_ago,
                         db.or_(
                             UserFilmInteraction.liked.is_(True),
-                            UserFilmInteraction.review_text.isnot(None),
+                            UserFilmInteraction.has_review.is_(True),
                         ),
                     )
                     .group_by(UserFilmInteraction.film_id)
@@ -134,7 +134,7 @@ def test_trending_data():
                             UserFilmInteraction.created_at < day_end,
                             db.or_(
                                 UserFilmInteraction.liked.is_(True),
-                                UserFilmInteraction.review_text.isnot(None),
+                                UserFilmInteraction.has_review.is_(True),
                             ),
                         )
                         .scalar()
@@ -163,5 +163,238 @@ def test_trending_data():
     return True
 
 
+def test_trending_service():
+    """Trending service returns per-film and per-day counts from the rollup"""
+    from datetime import datetime, timedelta
+
+    from werkzeug.security import generate_password_hash
+
+    from models.counters import apply_interaction_change
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.interaction_daily import InteractionDaily
+    from models.trending import compute_trending, get_trending
+    from models.user import User
+
+    app = create_app("testing")
+
+    with app.app_context():
+        db.create_all()
+
+        users = [
+            User(
+                username=f"trend{i}",
+                email=f"trend{i}@example.com",
+                password_hash=generate_password_hash("password"),
+            )
+            for i in range(3)
+        ]
+        films = [Film(title=f"Trending {i}") for i in range(3)]
+        db.session.add_all(users + films)
+        db.session.commit()
+
+        now = datetime.utcnow()
+        rows = [
+            # film 0: two engaged interactions, one today and one yesterday
+            (users[0], films[0], True, None, now),
+            (users[1], films[0], False, "Nice", now - timedelta(days=1)),
+            # film 1: one like today
+            (users[2], films[1], True, None, now),
+            # rating only - does not count towards trending
+            (users[0], films[1], False, None, now),
+            # outside the window
+            (users[1], films[2], True, None, now - timedelta(days=10)),
+        ]
+        for user, film, liked, review, created in rows:
+            db.session.add(
+                UserFilmInteraction(
+                    user_id=user.id,
+                    film_id=film.id,
+                    liked=liked,
+                    rating=4,
+                    review_text=review,
+                    created_at=created,
+                )
+            )
+        db.session.commit()
+        InteractionDaily.rebuild()
+        db.session.commit()
+
+        trending_data, daily = compute_trending(days=7, limit=10, now=now)
+        assert [(t["film"].id, t["interaction_count"]) for t in trending_data] == [
+            (films[0].id, 2),
+            (films[1].id, 1),
+        ]
+        assert len(daily) == 7
+        assert daily[-1] == {"date": now.strftime("%Y-%m-%d"), "count": 2}
+        assert daily[-2]["count"] == 1
+        assert sum(d["count"] for d in daily) == 3
+
+        # cached results survive new writes until the TTL expires
+        app.config["TRENDING_CACHE_TTL"] = 60
+        cached, _ = get_trending()
+        interaction = UserFilmInteraction(
+            user_id=users[2].id, film_id=films[2].id, liked=True, created_at=now
+        )
+        db.session.add(interaction)
+        apply_interaction_change(
+            users[2].id, films[2].id, now, None, interaction.snapshot()
+        )
+        db.session.commit()
+        again, _ = get_trending()
+        assert [t["film"].id for t in again] == [t["film"].id for t in cached]
+        app.config["TRENDING_CACHE_TTL"] = 0
+        fresh, _ = get_trending()
+        assert films[2].id in [t["film"].id for t in fresh]
+
+
+def test_interaction_daily_incremental_matches_rebuild():
+    """Incremental rollup updates agree with a rebuild from history"""
+    from werkzeug.security import generate_password_hash
+
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.interaction_daily import InteractionDaily
+    from models.user import User
+
+    app = create_app("testing")
+
+    with app.app_context():
+        db.create_all()
+        user = User(
+            username="rollup",
+            email="rollup@example.com",
+            password_hash=generate_password_hash("password"),
+        )
+        film = Film(title="Rollup")
+        db.session.add_all([user, film])
+        db.session.commit()
+
+        client = app.test_client()
+        client.post(
+            "/login",
+            data={"username": "rollup", "password": "password"},
+            headers={"User-Agent": "pytest rollup client"},
+        )
+        client.post(f"/api/like/{film.id}")
+        client.post(
+            f"/api/interaction/{film.id}",
+            json={"liked": True, "rating": 5, "review": "Loved it"},
+        )
+        client.post(f"/api/like/{film.id}")
+
+        def snapshot():
+            return [
+                (r.day, r.film_id, r.likes, r.ratings, r.reviews, r.engaged,
+                 r.unique_users)
+                for r in InteractionDaily.query.order_by(InteractionDaily.day)
+            ]
+
+        incremental = snapshot()
+        assert incremental[0][2:] == (0, 1, 1, 1, 1)
+
+        InteractionDaily.rebuild()
+        db.session.commit()
+        assert snapshot() == incremental
+
+        client.delete(f"/api/interaction/{film.id}")
+        db.session.expire_all()
+        assert snapshot()[0][2:] == (0, 0, 0, 0, 0)
+
+
+def test_decayed_tracker_bounded_and_decaying():
+    """Tracker keeps at most K films and halves scores every half-life"""
+    from models.trending_tracker import TrendingTracker
+
+    tracker = TrendingTracker(capacity=3, half_life=3600, now=0)
+    for film_id, hits in [(1, 5), (2, 3), (3, 2)]:
+        for _ in range(hits):
+            tracker.record(film_id, now=0)
+
+    assert [film_id for film_id, _ in tracker.top(now=0)] == [1, 2, 3]
+    score = dict(tracker.top(now=3600))[1]
+    assert abs(score - 2.5) < 1e-9
+
+    # a new film evicts the minimum and inherits its count as error
+    tracker.record(4, now=3600)
+    assert len(tracker) == 3
+    scores = tracker.scores(now=3600)
+    assert 3 not in scores
+    assert abs(scores[4][1] - 1.0) < 1e-9
+
+    # very long gaps rescale instead of overflowing
+    tracker.record(1, now=3600 * 1000)
+    assert dict(tracker.top(now=3600 * 1000))[1] >= 1.0
+
+
+def test_decayed_tracker_checkpoint_restore():
+    """A restarted tracker recovers checkpointed scores"""
+    import time
+
+    from models.film import Film
+    from models.trending_tracker import TrendingTracker
+
+    app = create_app("testing")
+
+    with app.app_context():
+        db.create_all()
+        films = [Film(title=f"Tracked {i}") for i in range(2)]
+        db.session.add_all(films)
+        db.session.commit()
+
+        now = time.time()
+        tracker = TrendingTracker(capacity=10, half_life=3600, now=now)
+        tracker.record(films[0].id, weight=2.0, now=now)
+        tracker.record(films[1].id, now=now)
+        tracker.checkpoint(now)
+
+        restored = TrendingTracker(capacity=10, half_life=3600, now=now)
+        restored.restore(now=now)
+        assert [fid for fid, _ in restored.top(now=now)] == [films[0].id, films[1].id]
+        assert abs(dict(restored.top(now=now))[films[0].id] - 2.0) < 1e-6
+
+        # another worker's checkpoint upserts its films and keeps the rest
+        other = TrendingTracker(capacity=10, half_life=3600, now=now)
+        other.record(films[1].id, weight=3.0, now=now)
+        other.checkpoint(now)
+        restored.restore(now=now)
+        assert [fid for fid, _ in restored.top(now=now)] == [films[1].id, films[0].id]
+
+        # the checkpoint thread writes a last checkpoint when stopped
+        worker = TrendingTracker(capacity=10, half_life=3600)
+        worker.start(db.engine, 3600)
+        worker.record(films[0].id, weight=5.0)
+        worker.stop()
+        restored.restore()
+        assert restored.top(limit=1)[0][0] == films[0].id
+
+
+
+def test_tracker_ranked_trending_shows_tracker_scores():
+    """Films ranked by the tracker show its score, not a rollup count"""
+    from models.film import Film
+    from models.trending import get_trending
+    from models.trending_tracker import get_tracker
+
+    app = create_app("testing")
+    app.config["TRENDING_TRACKER_ENABLED"] = True
+
+    with app.app_context():
+        db.create_all()
+        film = Film(title="Only tracked")
+        db.session.add(film)
+        db.session.commit()
+
+        # no interaction_daily rows: the window count of this film is 0
+        tracker = get_tracker()
+        try:
+            tracker.record(film.id, weight=2.0)
+            trending_data, _ = get_trending()
+            assert [t["film"].id for t in trending_data] == [film.id]
+            assert "interaction_count" not in trending_data[0]
+            assert abs(trending_data[0]["score"] - 2.0) < 1e-3
+        finally:
+            tracker.stop()
+
 if __name__ == "__main__":
     test_trending_data()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Tests for the write paths (single-writer queue)"""
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+
+HEADERS = {"User-Agent": "pytest writes client"}
+
+
+def _add_film(title):
+    from models.film import Film
+
+    db.session.add(Film(title=title))
+    return title
+
+
+def _fail():
+    raise ValueError("broken job")
+
+
+def test_write_queue_group_commit_and_isolation():
+    from models.film import Film
+    from models.write_queue import WriteQueue, WriteQueueError
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+
+    write_queue = WriteQueue(app, max_batch=10, timeout=5)
+    # queued before the writer starts, so they land in one batch
+    jobs = [write_queue.submit(_add_film, f"Queued {i}") for i in range(3)]
+    stale = write_queue.submit(_add_film, "Too late")
+    with pytest.raises(WriteQueueError):
+        stale.wait(0.01)
+    write_queue.start()
+    assert [job.wait(5) for job in jobs] == ["Queued 0", "Queued 1", "Queued 2"]
+    assert write_queue.stats == {"jobs": 3, "batches": 1, "failed": 0}
+
+    # a failing job is retried alone and does not sink its batch
+    write_queue.stop()
+    good = write_queue.submit(_add_film, "Survivor")
+    bad = write_queue.submit(_fail)
+    write_queue.start()
+    assert good.wait(5) == "Survivor"
+    with pytest.raises(ValueError):
+        bad.wait(5)
+    write_queue.stop()
+    assert write_queue.stats["failed"] == 1
+
+    with app.app_context():
+        titles = {f.title for f in Film.query.all()}
+        assert titles == {"Queued 0", "Queued 1", "Queued 2", "Survivor"}
+
+
+def test_write_job_started_is_waited_for():
+    import threading
+
+    from models.write_queue import WriteJob
+
+    # the writer picked the job up just before the caller's timeout
+    job = WriteJob(_add_film, ("Late",), {})
+    assert job.start()
+    threading.Timer(0.1, job.finish, kwargs={"result": "Late"}).start()
+    assert job.wait(0.01) == "Late"
+    assert not job.cancel()
+
+
+def test_interaction_and_log_writes_go_through_queue():
+    from models.film import Film
+    from models.log import AppLog
+    from models.user import User
+
+    app = create_app("testing")
+    app.config.update(WRITE_QUEUE_ENABLED=True, APPLOG_ASYNC=True)
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            User(
+                username="queued",
+                email="queued@example.com",
+                password_hash=generate_password_hash("password"),
+            )
+        )
+        film = Film(title="Queued film")
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+
+    client = app.test_client()
+    client.post(
+        "/login",
+        data={"username": "queued", "password": "password"},
+        headers=HEADERS,
+    )
+    resp = client.post(f"/api/like/{film_id}", headers=HEADERS)
+    assert resp.json["liked"] is True and resp.json["like_count"] == 1
+    resp = client.post(
+        f"/api/interaction/{film_id}",
+        json={"liked": True, "rating": 4, "review": "Queued review"},
+        headers=HEADERS,
+    )
+    assert resp.json["data"]["film_stats"]["rating_count"] == 1
+    assert client.delete(f"/api/interaction/{film_id}").json["success"] is True
+
+    # the log writer hands its batch to the write queue on shutdown
+    app.extensions["applog_writer"].stop()
+    write_queue = app.extensions["write_queue"]
+    write_queue.stop()
+    assert write_queue.stats["failed"] == 0
+    with app.app_context():
+        assert db.session.get(Film, film_id).like_count == 0
+        assert AppLog.query.filter_by(action="USER_LOGIN_SUCCESS").count() == 1
+
+
+def test_form_like_reports_busy_queue(monkeypatch):
+    import routes.interaction_routes as interaction_routes
+    from models.film import Film
+    from models.user import User
+    from models.write_queue import WriteQueueError
+
+    app = create_app("testing")
+    with app.app_context():
+        db.session.add(
+            User(
+                username="busy",
+                email="busy@example.com",
+                password_hash=generate_password_hash("password"),
+            )
+        )
+        film = Film(title="Busy film")
+        db.session.add(film)
+        db.session.commit()
+        film_id = film.id
+    client = app.test_client()
+    client.post(
+        "/login", data={"username": "busy", "password": "password"}, headers=HEADERS
+    )
+
+    def busy(*args):
+        raise WriteQueueError("write queue is full")
+
+    monkeypatch.setattr(interaction_routes, "run_write", busy)
+    resp = client.post(f"/like/{film_id}", headers=HEADERS)
+    assert resp.status_code == 302
+    assert resp.headers["Location"].endswith(f"/films/{film_id}")
+    with client.session_transaction() as session:
+        assert ("error", "Server busy, please try again") in session["_flashes"]
+
+
+def test_batch_interactions_one_transaction():
+    from sqlalchemy import event
+
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.user import User
+    from models.user_stats import UserStats
+
+    app = create_app("testing")
+    with app.app_context():
+        user = User(
+            username="batcher",
+            email="batcher@example.com",
+            password_hash=generate_password_hash("password"),
+        )
+        films = [Film(title=f"Batch {i}") for i in range(3)]
+        db.session.add_all(films + [user])
+        db.session.commit()
+        film_ids = [film.id for film in films]
+        user_id = user.id
+
+    client = app.test_client()
+    client.post(
+        "/login", data={"username": "batcher", "password": "password"}, headers=HEADERS
+    )
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0] + " " + statement.split()[1])
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", record)
+    changes = [
+        {"film_id": film_ids[0], "liked": True},
+        {"film_id": film_ids[0], "liked": False},
+        {"film_id": film_ids[0], "liked": True},  # a burst: only the last counts
+        {"film_id": film_ids[1], "rating": 4},
+        {"film_id": film_ids[2], "liked": False},  # no row, nothing to do
+        {"film_id": 9999, "liked": True},
+    ]
+    resp = client.post("/api/interactions/batch", json={"changes": changes})
+    with app.app_context():
+        event.remove(db.engine, "before_cursor_execute", record)
+    body = resp.get_json()
+    assert body["success"] and body["skipped"] == [9999]
+    assert body["results"][str(film_ids[0])]["liked"] is True
+    assert body["results"][str(film_ids[0])]["film_stats"]["like_count"] == 1
+    assert body["results"][str(film_ids[1])]["rating"] == 4
+    assert body["results"][str(film_ids[2])]["film_stats"] is None
+    # one counter UPDATE per changed film and one for the user's stats
+    assert statements.count("UPDATE film") == 2
+    assert statements.count("UPDATE user_stats") == 1
+
+    # sendBeacon posts text/plain; absolute values make a resend harmless
+    beacon = '{"changes": [{"film_id": %d, "liked": false}]}' % film_ids[0]
+    for _ in range(2):
+        resp = client.post(
+            "/api/interactions/batch", data=beacon, content_type="text/plain"
+        )
+        assert resp.get_json()["success"]
+    with app.app_context():
+        assert db.session.get(Film, film_ids[0]).like_count == 0
+        assert db.session.get(Film, film_ids[1]).rating_count == 1
+        assert UserFilmInteraction.query.filter_by(user_id=user_id).count() == 2
+        stats = db.session.get(UserStats, user_id)
+        assert (stats.like_count, stats.rating_count, stats.rating_sum) == (0, 1, 4)
+
+    for bad in ({}, {"changes": []}, {"changes": [{"film_id": "1"}]}):
+        assert client.post("/api/interactions/batch", json=bad).status_code == 400
+    resp = client.post(
+        "/api/interactions/batch", json={"changes": [{"film_id": 1, "rating": 6}]}
+    )
+    assert resp.status_code == 400
+
+
+def _log_values(action):
+    from datetime import datetime
+
+    return {
+        "timestamp": datetime.utcnow(),
+        "user_id": None,
+        "username": None,
+        "action": action,
+        "resource_type": "user",
+        "resource_id": None,
+        "description": action,
+        "ip_address": None,
+        "user_agent": None,
+        "extra_data": None,
+    }
+
+
+def test_log_writer_batches_and_counts_drops(caplog):
+    from models.log import AppLog
+    from models.log_writer import LogWriter
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+
+    writer = LogWriter(app, maxsize=3, batch_size=10, flush_interval=0.05)
+    with caplog.at_level("WARNING", logger="app"):
+        assert [writer.put(_log_values(f"A{i}")) for i in range(4)] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        with app.app_context():
+            writer.put(_log_values("A4"))
+            writer.put(_log_values("A5"))
+            assert app.extensions["metrics"].get("applog_dropped") == 2
+    assert writer.dropped == 3
+    # one warning per interval, not one per dropped entry
+    warnings = [r for r in caplog.records if "dropping entries" in r.getMessage()]
+    assert len(warnings) == 1
+    writer.start()
+    writer.stop()
+    assert (writer.written, writer.failed) == (3, 0)
+
+    with app.app_context():
+        assert AppLog.query.count() == 3
+
+
+def test_log_action_does_not_commit_caller_session():
+    from models.film import Film
+    from models.log import AppLog
+
+    app = create_app("testing")
+    app.config.update(APPLOG_ASYNC=True)
+    with app.test_request_context(headers=HEADERS):
+        db.create_all()
+        db.session.add(Film(title="Uncommitted"))
+        AppLog.log_action("TEST", "film", "queued entry")
+        db.session.rollback()
+        app.extensions["applog_writer"].stop()
+        assert Film.query.count() == 0
+        assert AppLog.query.filter_by(action="TEST").count() == 1
+
+
+def test_log_keyset_pages_and_archive(tmp_path):
+    from datetime import datetime, timedelta
+
+    from models.log import AppLog
+    from models.log_archive import archive_logs, archive_path, read_archive
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        start = datetime(2024, 1, 1, 12)
+        rows = []
+        for i in range(7):
+            values = _log_values("LOGIN" if i % 2 else "VIEW")
+            values.update(timestamp=start + timedelta(days=i // 3), user_id=i % 2)
+            rows.append(values)
+        AppLog.insert_rows(rows)
+        db.session.commit()
+
+        seen = []
+        logs, cursor = AppLog.log_page(user_id=1, limit=2)
+        while True:
+            seen.extend(logs)
+            if cursor is None:
+                break
+            logs, cursor = AppLog.log_page(user_id=1, limit=2, cursor=cursor)
+        assert len(seen) == 3 and all(log.user_id == 1 for log in seen)
+        assert [log.timestamp for log in seen] == sorted(
+            (log.timestamp for log in seen), reverse=True
+        )
+        assert len(AppLog.get_logs_by_action("VIEW", limit=10)) == 4
+
+        plan = db.session.execute(
+            db.text(
+                "EXPLAIN QUERY PLAN SELECT * FROM app_log WHERE user_id = 1 "
+                "ORDER BY timestamp DESC, id DESC"
+            )
+        ).fetchall()
+        assert "ix_app_log_user_timestamp" in " ".join(str(r[-1]) for r in plan)
+
+        # days 0 and 1 (six rows) are archived, day 2 stays
+        moved = archive_logs(start + timedelta(days=2), str(tmp_path), batch_size=4)
+        assert moved == 6 and AppLog.query.count() == 1
+        archived = list(read_archive(archive_path(str(tmp_path), start.date())))
+        assert len(archived) == 3
+        assert archived[0]["timestamp"].startswith("2024-01-01")
@@ -0,0 +1,5 @@
+"""
+工具模块（请求指标、缓存等 Web 层基础设施）
+"""
+
+# 此文件可以为空，只用于标记这是一个Python包
@@ -0,0 +1,182 @@
+"""
+Fingerprinted, precompressed static assets.
+
+``scripts/build_assets.py`` copies every CSS/JS file under ``static`` to
+``ASSET_DIST_DIR`` as ``<name>.<content hash>.<ext>``, next to ``.gz`` and
+(when the optional ``brotli`` package is installed) ``.br`` copies, and
+writes ``manifest.json`` mapping logical names to the hashed ones.
+
+With a manifest loaded, ``url_for('static', filename='css/style.css')``
+resolves to ``/static/dist/css/style.<hash>.css``. The static view serves
+those files, and the content-hashed poster derivatives, with a one-year
+``immutable`` Cache-Control, picking the precompressed copy the client
+accepts. A changed file gets a new URL, so browsers never revalidate.
+"""
+
+import gzip
+import json
+import logging
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+
+from .critical_css import critical_css_global, load_critical_css
+from .posters import DERIVED_DIR, file_hash
+
+logger = logging.getLogger("app")
+
+ASSET_DIRS = ("css", "js")
+ASSET_EXTENSIONS = (".css", ".js")
+DIST_PREFIX = "dist/"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+# preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def _write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest(dist_dir):
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def build_assets(static_folder, dist_dir):
+    """Write hashed and compressed copies of the CSS/JS files; return the manifest.
+
+    Unchanged files keep their hashed name and are not rewritten. Outputs
+    of builds older than the previous one are removed, so pages rendered
+    just before a deploy can still load their assets.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    previous = _read_manifest(dist_dir)
+    manifest = {}
+    for folder in ASSET_DIRS:
+        source_dir = os.path.join(static_folder, folder)
+        if not os.path.isdir(source_dir):
+            continue
+        for filename in sorted(os.listdir(source_dir)):
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            name = f"{folder}/{filename}"
+            source = os.path.join(source_dir, filename)
+            out_name = hashed_name(name, file_hash(source))
+            manifest[name] = out_name
+            out = os.path.join(dist_dir, out_name)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            with open(source, "rb") as fh:
+                data = fh.read()
+            if not os.path.exists(out):
+                _write(out, data)
+            if not os.path.exists(out + ".gz"):
+                _write(out + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None and not os.path.exists(out + ".br"):
+                _write(out + ".br", brotli.compress(data, quality=11))
+
+    keep = set(manifest.values()) | set(previous.values())
+    for dirpath, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, dist_dir).replace(os.sep, "/")
+            base = rel[:-3] if rel.endswith((".gz", ".br")) else rel
+            # top-level files are build metadata (manifest, critical CSS)
+            if "/" in rel and base not in keep:
+                os.remove(path)
+
+    _write(
+        os.path.join(dist_dir, MANIFEST_NAME),
+        json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"),
+    )
+    return manifest
+
+
+class AssetManifest:
+    """Logical static name -> fingerprinted file in ``dist_dir``."""
+
+    def __init__(self, dist_dir=None):
+        self.dist_dir = dist_dir
+        self.assets = {}
+        # hashed name -> [(encoding, suffix)] of its precompressed copies
+        self.files = {}
+        # page template -> inlined critical CSS (see utils/critical_css.py)
+        self.critical = {}
+        if dist_dir:
+            self.load()
+
+    def load(self):
+        self.assets = _read_manifest(self.dist_dir)
+        self.files = {
+            hashed: [
+                (encoding, suffix)
+                for encoding, suffix in ENCODINGS
+                if os.path.exists(os.path.join(self.dist_dir, hashed + suffix))
+            ]
+            for hashed in self.assets.values()
+            if os.path.exists(os.path.join(self.dist_dir, hashed))
+        }
+        self.critical = load_critical_css(self.dist_dir)
+        if self.assets:
+            logger.info(f"Loaded {len(self.files)} fingerprinted static assets")
+        return self
+
+    def url_defaults(self, endpoint, values):
+        """``url_for`` hook: point static URLs at the fingerprinted copy."""
+        if endpoint != "static":
+            return
+        hashed = self.assets.get(values.get("filename"))
+        if hashed in self.files:
+            values["filename"] = DIST_PREFIX + hashed
+
+    def static_view(self, filename):
+        """Replacement for Flask's static view."""
+        name = filename[len(DIST_PREFIX) :]
+        if filename.startswith(DIST_PREFIX) and name in self.files:
+            return self._send(name)
+        response = current_app.send_static_file(filename)
+        if filename.startswith(f"posters/{DERIVED_DIR}/"):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    def _send(self, name):
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        for encoding, suffix in self.files[name]:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(
+                    self.dist_dir, name + suffix, mimetype=mimetype
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist_dir, name, mimetype=mimetype)
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def init_assets(app):
+    """Load the asset manifest and route static URLs through it."""
+    manifest = AssetManifest(app.config.get("ASSET_DIST_DIR"))
+    app.extensions["assets"] = manifest
+    app.url_defaults(manifest.url_defaults)
+    app.jinja_env.globals["critical_css"] = critical_css_global(manifest.critical)
+    if "static" in app.view_functions:
+        app.view_functions["static"] = manifest.static_view
+    return manifest
@@ -0,0 +1,98 @@
+"""
+Conditional GET (ETag / Last-Modified) for views built from versioned data.
+
+``@conditional_get(version)`` calls ``version(**view_args)`` before the
+view runs. It returns a tuple of cheap data versions (see
+``models/versions.py``), or ``None`` to skip validation. The tuple is hashed
+into a weak ETag and its newest datetime becomes ``Last-Modified``. A
+matching ``If-None-Match`` (or ``If-Modified-Since``) gets a 304 without
+running the view or rendering its template, so an unchanged page costs a
+version lookup.
+
+Responses carry ``Cache-Control: no-cache`` so clients always revalidate.
+Views whose output depends on the viewer are also marked ``private``, and
+their version includes the user and language.
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from .metrics import count
+
+
+def _seed():
+    """Hash of the templates and asset manifest, so a deploy changes every ETag."""
+    seed = current_app.extensions.get("etag_seed")
+    if seed is None:
+        digest = hashlib.sha1()
+        folder = os.path.join(current_app.root_path, current_app.template_folder)
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as fh:
+                    digest.update(name.encode() + fh.read())
+        assets = current_app.extensions.get("assets")
+        if assets is not None:
+            digest.update(repr(sorted(assets.assets.items())).encode())
+        seed = current_app.extensions["etag_seed"] = digest.hexdigest()[:8]
+    return seed
+
+
+def etag_for(parts):
+    return hashlib.sha1(repr((_seed(),) + tuple(parts)).encode()).hexdigest()[:24]
+
+
+def last_modified_of(parts):
+    """Newest (naive UTC) datetime in ``parts``, second precision, or None."""
+    stamps = [part for part in parts if isinstance(part, datetime)]
+    if not stamps:
+        return None
+    return max(stamps).replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional_get(version, private=True):
+    """Answer conditional GETs for a view from ``version(**view_args)``."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # flashed messages are consumed by the render, so always render
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                return view(*args, **kwargs)
+            parts = version(**kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            etag = etag_for(parts)
+            last_modified = last_modified_of(parts)
+            if _not_modified(etag, last_modified):
+                count("conditional_not_modified")
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            if private:
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            return response
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,210 @@
+"""
+Per-page critical CSS.
+
+``build_critical_css`` reads ``static/css/style.css`` and, for each page
+template (plus the templates it extends, imports or includes), keeps only
+the rules whose selectors can match the classes, ids, tags and attributes
+that template uses. Interaction states (``:hover``, ``:focus``,
+``:active``), animations, print styles and the footer are left out, since
+none of them affect the first paint. The result is written to ``critical.json`` in the
+asset dist dir. ``base.html`` inlines the bundle for the page it renders and
+loads the full stylesheet asynchronously; the full sheet repeats the same
+rules in the same order, so the final cascade is unchanged.
+
+This is a small selector matcher for this stylesheet, not a general CSS
+engine: a selector is kept when every class/id/tag/attribute it names
+appears in the page's templates, regardless of nesting.
+"""
+
+import json
+import os
+import re
+
+from jinja2 import pass_context
+from markupsafe import Markup
+
+CRITICAL_NAME = "critical.json"
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_REFERENCE_RE = re.compile(
+    r"""\{%-?\s*(?:extends|import|from|include)\s+["']([^"']+)["']"""
+)
+_CLASS_ATTR_RE = re.compile(r"""\b(?:class|id)\s*=\s*(["'])(.*?)\1""", re.S)
+_TAG_RE = re.compile(r"<([a-zA-Z][\w-]*)")
+_ATTR_NAME_RE = re.compile(r"\s([a-zA-Z][\w:-]*)\s*=")
+_WORD_RE = re.compile(r"[a-zA-Z_][\w-]*")
+
+_PSEUDO_RE = re.compile(r"::?([\w-]+)(\((?:[^()]|\([^()]*\))*\))?")
+_ATTR_SELECTOR_RE = re.compile(r"\[\s*([\w-]+)[^\]]*\]")
+_CLASS_RE = re.compile(r"\.([\w-]+)")
+_ID_RE = re.compile(r"#([\w-]+)")
+_SELECTOR_TAG_RE = re.compile(r"(?:^|[\s>+~(])([a-zA-Z][\w-]*)")
+# states that only matter once the user interacts with the page
+_INTERACTION_PSEUDOS = {"hover", "focus", "focus-visible", "focus-within", "active"}
+_DROPPED_AT_RULES = ("@keyframes", "@-webkit-keyframes", "@font-face", "@media print")
+# page chrome that is always below the fold
+_BELOW_FOLD_CLASSES = ("footer",)
+
+
+def _split_top(text, sep):
+    """Split on ``sep`` outside of parentheses, brackets and quotes."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_css(text):
+    """Yield ``(prelude, body)`` for each top-level block of ``text``.
+
+    ``body`` is the raw text between the braces (nested blocks included);
+    statements such as ``@import ...;`` come back with ``body=None``.
+    """
+    text = _COMMENT_RE.sub("", text)
+    depth, quote, start, body_start = 0, None, 0, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "{":
+            if depth == 0:
+                body_start = i + 1
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                yield text[start : body_start - 1].strip(), text[body_start:i]
+                start = i + 1
+        elif ch == ";" and depth == 0:
+            statement = text[start:i].strip()
+            if statement:
+                yield statement, None
+            start = i + 1
+
+
+def template_tokens(template_folder, name, _seen=None):
+    """Class/id words, tag names and attribute names used by a template.
+
+    Follows ``extends``/``import``/``include`` references, so a page's
+    tokens include ``base.html`` and its macros.
+    """
+    seen = set() if _seen is None else _seen
+    tokens = {"classes": set(), "tags": set(), "attributes": set()}
+    if name in seen:
+        return tokens
+    seen.add(name)
+    with open(os.path.join(template_folder, name), encoding="utf-8") as fh:
+        source = fh.read()
+    for _, value in _CLASS_ATTR_RE.findall(source):
+        tokens["classes"].update(_WORD_RE.findall(value))
+    tokens["tags"].update(tag.lower() for tag in _TAG_RE.findall(source))
+    tokens["attributes"].update(_ATTR_NAME_RE.findall(source))
+    for ref in _REFERENCE_RE.findall(source):
+        for key, values in template_tokens(template_folder, ref, seen).items():
+            tokens[key].update(values)
+    return tokens
+
+
+def selector_matches(selector, tokens):
+    """True if ``selector`` can match the page and is not interaction-only."""
+    pseudos = [match.group(1) for match in _PSEUDO_RE.finditer(selector)]
+    if _INTERACTION_PSEUDOS.intersection(pseudos):
+        return False
+    bare = _PSEUDO_RE.sub("", selector)
+    for attribute in _ATTR_SELECTOR_RE.findall(bare):
+        if attribute not in tokens["attributes"]:
+            return False
+    bare = _ATTR_SELECTOR_RE.sub("", bare)
+    names = _CLASS_RE.findall(bare) + _ID_RE.findall(bare)
+    if not all(name in tokens["classes"] for name in names):
+        return False
+    if any(name.startswith(_BELOW_FOLD_CLASSES) for name in names):
+        return False
+    bare = _ID_RE.sub("", _CLASS_RE.sub("", bare))
+    return all(tag.lower() in tokens["tags"] for tag in _SELECTOR_TAG_RE.findall(bare))
+
+
+def _minify(body):
+    declarations = []
+    for declaration in _split_top(re.sub(r"\s+", " ", body), ";"):
+        prop, colon, value = declaration.partition(":")
+        if colon:
+            declarations.append(f"{prop.strip()}:{value.strip()}")
+    return ";".join(declarations)
+
+
+def extract_css(css_text, tokens):
+    """CSS text of the rules in ``css_text`` that can apply to ``tokens``."""
+    out = []
+    for prelude, body in parse_css(css_text):
+        if body is None:
+            out.append(prelude + ";")
+        elif prelude.startswith("@"):
+            if prelude.startswith(_DROPPED_AT_RULES):
+                continue
+            inner = extract_css(body, tokens)
+            if inner:
+                prelude = re.sub(r"\s+", " ", prelude)
+                out.append(f"{prelude}{{{inner}}}")
+        else:
+            selectors = [
+                selector.strip()
+                for selector in _split_top(prelude, ",")
+                if selector.strip() and selector_matches(selector.strip(), tokens)
+            ]
+            if selectors and body.strip():
+                out.append(f"{','.join(selectors)}{{{_minify(body)}}}")
+    return "".join(out)
+
+
+def build_critical_css(template_folder, css_path, dist_dir):
+    """Write ``critical.json`` ({template name: css}); return it."""
+    with open(css_path, encoding="utf-8") as fh:
+        css_text = fh.read()
+    bundles = {}
+    for name in sorted(os.listdir(template_folder)):
+        if not name.endswith(".html") or name.startswith("_") or name == "base.html":
+            continue
+        bundles[name] = extract_css(css_text, template_tokens(template_folder, name))
+    os.makedirs(dist_dir, exist_ok=True)
+    path = os.path.join(dist_dir, CRITICAL_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(bundles, fh, ensure_ascii=False, sort_keys=True)
+    os.replace(path + ".tmp", path)
+    return bundles
+
+
+def load_critical_css(dist_dir):
+    """Bundles written by ``build_critical_css``, or {} if not built."""
+    if not dist_dir:
+        return {}
+    try:
+        with open(os.path.join(dist_dir, CRITICAL_NAME), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def critical_css_global(bundles):
+    """Jinja global ``critical_css()``: the bundle of the page being rendered."""
+
+    @pass_context
+    def critical_css(context):
+        # built from our own stylesheet, so safe to inline unescaped
+        return Markup(bundles.get(context.name, ""))
+
+    return critical_css
@@ -0,0 +1,427 @@
+"""
+Request metrics: counters, histograms and the Prometheus ``/metrics`` view.
+
+Counters and histograms are kept per app (process-wide); counters are also
+kept per request in ``g.metrics``, so a request's own numbers can be logged
+next to its timing. Every request records its latency and DB query count
+per endpoint (queries are counted by ``utils/query_stats.py``) and a count
+per endpoint/method/status. ``timed(operation)``
+adds timings of other work, such as the trending recommender or cache
+lookups.
+
+Each worker process aggregates on its own. With ``METRICS_SHARED_DIR`` set,
+workers also write their totals to ``metrics-<pid>-<start>.json`` in that
+directory (at most every ``METRICS_SHARED_INTERVAL`` seconds), and
+``/metrics`` serves the sum of all files. The worker's start time keeps a
+later worker that reuses a PID from overwriting an exited worker's file.
+On each scrape the files of workers that are gone (``os.kill(pid, 0)``
+fails) are folded into ``metrics-retired.json`` and deleted, under a file
+lock, so totals never go backwards while the directory stays at one file
+per live worker plus one. Pruning needs ``fcntl`` (POSIX); elsewhere the
+files are kept. Clear the directory on deploy.
+
+``/metrics`` answers loopback clients, or clients that send
+``Authorization: Bearer <METRICS_TOKEN>`` when a token is configured. With
+``METRICS_REQUIRE_TOKEN`` (production) it answers no one until a token is
+set, since behind a reverse proxy every client looks like loopback.
+Percentiles (p50/p95/p99) are estimated from the histogram buckets.
+"""
+
+import glob
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead worker files are not pruned
+    fcntl = None
+
+from flask import current_app, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger("app")
+
+PREFIX = "app"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUANTILES = (0.5, 0.95, 0.99)
+_LOOPBACK = ("127.0.0.1", "::1")
+_WORKER_FILE_RE = re.compile(r"metrics-(\d+)-\d+\.json$")
+RETIRED_FILE = "metrics-retired.json"
+# pid -> start time of the worker's shared file; a forked worker (new pid)
+# gets its own entry
+_started = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        if other.buckets != self.buckets:
+            return
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile by interpolating within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # beyond the largest bound
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def to_json(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": self.counts,
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls(data["buckets"])
+        histogram.counts = list(data["counts"])
+        histogram.sum = data["sum"]
+        histogram.count = data["count"]
+        return histogram
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+class Metrics:
+    """Thread-safe named counters and histograms, optionally labelled."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, labels=None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get(self, name, labels=None):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def histogram(self, name, labels=None):
+        with self._lock:
+            return self._histograms.get((name, _label_key(labels)))
+
+    def snapshot(self):
+        """JSON-serialisable copy of every counter and histogram."""
+        with self._lock:
+            return {
+                "counters": [
+                    [name, list(map(list, labels)), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                "histograms": [
+                    [name, list(map(list, labels)), histogram.to_json()]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+            }
+
+    def merge_snapshot(self, data):
+        """Add a ``snapshot()`` (e.g. another worker's) into these metrics."""
+        with self._lock:
+            for name, labels, value in data.get("counters", ()):
+                key = (name, tuple(map(tuple, labels)))
+                self._counters[key] = self._counters.get(key, 0) + value
+            for name, labels, histogram_data in data.get("histograms", ()):
+                key = (name, tuple(map(tuple, labels)))
+                histogram = Histogram.from_json(histogram_data)
+                if key in self._histograms:
+                    self._histograms[key].merge(histogram)
+                else:
+                    self._histograms[key] = histogram
+
+    def render(self):
+        """Prometheus text exposition (format 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), histogram in histograms:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                le = labels + (("le", _format_value(bound)),)
+                lines.append(f"{metric}_bucket{_format_labels(le)} {cumulative}")
+            le = labels + (("le", "+Inf"),)
+            lines.append(f"{metric}_bucket{_format_labels(le)} {histogram.count}")
+            lines.append(
+                f"{metric}_sum{_format_labels(labels)} {_format_value(histogram.sum)}"
+            )
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        # p50/p95/p99 estimates, for dashboards without histogram_quantile()
+        for (name, labels), histogram in histograms:
+            metric = f"{PREFIX}_{name}_quantile"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            for q in QUANTILES:
+                quantile_labels = labels + (("quantile", str(q)),)
+                value = _format_value(histogram.quantile(q))
+                lines.append(f"{metric}{_format_labels(quantile_labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def get_metrics():
+    """Return the app's Metrics."""
+    return current_app.extensions.setdefault("metrics", Metrics())
+
+
+def count(name, amount=1):
+    """Add ``amount`` to counter ``name`` for the app and the current request."""
+    get_metrics().inc(name, amount)
+    if has_request_context():
+        counters = g.setdefault("metrics", {})
+        counters[name] = counters.get(name, 0) + amount
+
+
+@contextmanager
+def timed(operation):
+    """Observe the duration of a block as ``operation_duration_seconds``.
+
+    A no-op outside an app context (scripts, background jobs).
+    """
+    if not has_app_context():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().observe(
+            "operation_duration_seconds",
+            time.perf_counter() - started,
+            {"operation": operation},
+        )
+
+
+def record_request(response, duration):
+    """Record one finished request; called from ``after_request``."""
+    endpoint = request.endpoint or "unmatched"
+    metrics = get_metrics()
+    metrics.inc(
+        "http_requests",
+        labels={
+            "endpoint": endpoint,
+            "method": request.method,
+            "status": str(response.status_code),
+        },
+    )
+    metrics.observe("http_request_duration_seconds", duration, {"endpoint": endpoint})
+    metrics.observe(
+        "http_request_db_queries",
+        g.get("metrics", {}).get("db_queries", 0),
+        {"endpoint": endpoint},
+        buckets=QUERY_BUCKETS,
+    )
+    _maybe_write_shared(metrics)
+
+
+def _shared_path(directory):
+    pid = os.getpid()
+    started = _started.setdefault(pid, int(time.time() * 1000))
+    return os.path.join(directory, f"metrics-{pid}-{started}.json")
+
+
+def write_shared(metrics, directory):
+    """Write this worker's totals for the other workers to read."""
+    os.makedirs(directory, exist_ok=True)
+    path = _shared_path(directory)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(metrics.snapshot(), fh)
+    os.replace(path + ".tmp", path)
+
+
+def _maybe_write_shared(metrics):
+    directory = current_app.config.get("METRICS_SHARED_DIR")
+    if not directory:
+        return
+    interval = current_app.config.get("METRICS_SHARED_INTERVAL", 5)
+    state = current_app.extensions.setdefault("metrics_shared", {"written": 0.0})
+    now = time.time()
+    if now - state["written"] < interval:
+        return
+    state["written"] = now
+    try:
+        write_shared(metrics, directory)
+    except OSError as e:
+        logger.warning(f"Metrics snapshot write failed: {e}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _load_snapshot(path):
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def retire_dead_files(directory):
+    """Fold the files of exited workers into ``RETIRED_FILE``.
+
+    Returns the number of files folded. Runs under an exclusive lock so
+    two scrapes never fold the same file twice.
+    """
+    if fcntl is None:
+        return 0
+    own = _shared_path(directory)
+    dead = []
+    for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+        match = _WORKER_FILE_RE.search(os.path.basename(path))
+        if match is None or path == own:
+            continue
+        pid = int(match.group(1))
+        # a file with our own pid but another start is a previous worker's
+        if pid == os.getpid() or not _pid_alive(pid):
+            dead.append(path)
+    if not dead:
+        return 0
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    with open(os.path.join(directory, "metrics-retired.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired = Metrics()
+        if os.path.exists(retired_path):
+            retired.merge_snapshot(_load_snapshot(retired_path))
+        folded = []
+        for path in dead:
+            try:
+                retired.merge_snapshot(_load_snapshot(path))
+            except FileNotFoundError:
+                continue  # folded by another worker meanwhile
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable metrics file {path}: {e}")
+            folded.append(path)
+        if not folded:
+            return 0
+        with open(retired_path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(retired.snapshot(), fh)
+        os.replace(retired_path + ".tmp", retired_path)
+        for path in folded:
+            os.remove(path)
+    return len(folded)
+
+
+def merged_metrics(directory):
+    """Metrics summed over every worker file in ``directory``."""
+    try:
+        retire_dead_files(directory)
+    except OSError as e:
+        logger.warning(f"Retiring dead metrics files failed: {e}")
+    merged = Metrics()
+    for path in sorted(glob.glob(os.path.join(directory, "metrics-*.json"))):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                merged.merge_snapshot(json.load(fh))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics file {path}: {e}")
+    return merged
+
+
+def _allowed():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        auth = request.headers.get("Authorization", "")
+        return hmac.compare_digest(auth.encode(), f"Bearer {token}".encode())
+    if current_app.config.get("METRICS_REQUIRE_TOKEN"):
+        return False
+    return request.remote_addr in _LOOPBACK
+
+
+def metrics_view():
+    if not _allowed():
+        return current_app.response_class("Forbidden\n", status=403)
+    metrics = get_metrics()
+    directory = current_app.config.get("METRICS_SHARED_DIR")
+    if directory:
+        write_shared(metrics, directory)
+        metrics = merged_metrics(directory)
+    return current_app.response_class(
+        metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+def init_metrics(app):
+    """Register ``/metrics``; no-op unless ``METRICS_ENABLED``."""
+    if app.config.get("METRICS_ENABLED", True):
+        app.add_url_rule("/metrics", "metrics", metrics_view)
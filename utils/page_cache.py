@@ -0,0 +1,367 @@
+"""
+Full-page cache for rendered film pages.
+
+Anonymous GETs of ``PAGE_CACHE_ENDPOINTS`` (home, film list, film detail)
+are keyed by path, normalised query string and ``session['language']``.
+A hit is answered in ``before_request`` without touching the view, the
+database or Jinja. Home and the film list no longer embed the viewer's
+likes (``interactions.js`` fetches them from ``/api/interactions/state``),
+so for logged-in users the only personal part is the nav bar: on
+``PAGE_CACHE_USER_ENDPOINTS`` they get entries of their own, keyed by user
+id as well. Requests with pending flashed messages always get a fresh
+render.
+
+Entries live in a size-bounded in-process LRU tier (``PAGE_CACHE_MAX_BYTES``)
+and, when ``PAGE_CACHE_SHARED_PATH`` is set, in a SQLite file shared by
+all workers of the host. Every entry is tagged with a cache generation.
+Committing a change to a film, interaction, review or user bumps the
+generation, which empties the cache. With the shared tier the generation
+lives in the shared file too, so a write in one worker invalidates all
+of them. ``PAGE_CACHE_TTL`` bounds how long any page is kept.
+
+Hits and misses are counted as ``page_cache_hits`` / ``page_cache_misses``
+in the app metrics; ``PageCache.stats()`` adds the hit ratio.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+from flask import current_app, g, has_app_context, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .metrics import count, timed
+
+logger = logging.getLogger("app")
+
+_CHANGED_KEY = "page_cache_changed"
+# headers never replayed from the cache
+_SKIPPED_HEADERS = {"set-cookie", "content-length", "x-page-cache"}
+
+CachedPage = namedtuple(
+    "CachedPage", ["generation", "expires", "status", "headers", "body"]
+)
+
+
+class SharedPageStore:
+    """Page entries and the cache generation in a SQLite file."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._puts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page (key TEXT PRIMARY KEY, "
+                "generation INTEGER, expires REAL, status INTEGER, "
+                "headers TEXT, body BLOB)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            self._local.conn = conn
+        return conn
+
+    def generation(self):
+        row = (
+            self._connect()
+            .execute("SELECT value FROM meta WHERE name = 'generation'")
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def bump(self):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO meta (name, value) VALUES ('generation', 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1"
+            )
+            conn.execute(
+                "DELETE FROM page WHERE generation < "
+                "(SELECT value FROM meta WHERE name = 'generation')"
+            )
+
+    def get(self, key, generation, now):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT generation, expires, status, headers, body FROM page "
+                "WHERE key = ? AND generation = ? AND expires > ?",
+                (key, generation, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return CachedPage(row[0], row[1], row[2], json.loads(row[3]), row[4])
+
+    def put(self, key, page):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    page.generation,
+                    page.expires,
+                    page.status,
+                    json.dumps(page.headers),
+                    page.body,
+                ),
+            )
+            self._puts += 1
+            if self._puts % 50 == 0:
+                self._trim(conn)
+
+    def _trim(self, conn):
+        """Drop expired pages, then the soonest-expiring ones over max_bytes."""
+        conn.execute("DELETE FROM page WHERE expires <= ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM page")
+        excess = total.fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        doomed, freed = [], 0
+        for key, size in conn.execute(
+            "SELECT key, LENGTH(body) FROM page ORDER BY expires"
+        ):
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM page WHERE key = ?", doomed)
+
+
+class PageCache:
+    """Size-bounded LRU of rendered pages, optionally backed by a shared store."""
+
+    def __init__(self, ttl=60, max_bytes=32 * 1024 * 1024, shared=None):
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self.shared = shared
+        self.size = 0
+        self._generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def generation(self):
+        if self.shared is not None:
+            return self.shared.generation()
+        return self._generation
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        generation = self.generation()
+        with self._lock:
+            page = self._entries.get(key)
+            if page is not None:
+                if page.generation == generation and page.expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return page
+                self._drop(key)
+        page = None
+        if self.shared is not None:
+            page = self.shared.get(key, generation, now)
+            if page is not None:
+                self._store(key, page)
+        with self._lock:
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return page
+
+    def put(self, key, status, headers, body, generation=None, now=None):
+        """Cache a rendered page; ``generation`` is the one seen before rendering."""
+        now = time.time() if now is None else now
+        generation = self.generation() if generation is None else generation
+        page = CachedPage(generation, now + self.ttl, status, headers, body)
+        self._store(key, page)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, page)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared page cache write failed: {e}")
+        return page
+
+    def _store(self, key, page):
+        if len(page.body) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = page
+            self.size += len(page.body)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        page = self._entries.pop(key, None)
+        if page is not None:
+            self.size -= len(page.body)
+
+    def invalidate(self):
+        """Forget every page (in this process and, if shared, in all of them)."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.size = 0
+        if self.shared is not None:
+            try:
+                self.shared.bump()
+            except sqlite3.Error as e:
+                logger.error(f"Shared page cache invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def page_cache_key():
+    """Cache key for the current request, or ``None`` if it is not cacheable."""
+    if request.method != "GET" or request.endpoint not in current_app.config.get(
+        "PAGE_CACHE_ENDPOINTS", ()
+    ):
+        return None
+    if session.get("_flashes"):
+        return None
+    viewer = ""
+    if current_user.is_authenticated:
+        if request.endpoint not in current_app.config.get(
+            "PAGE_CACHE_USER_ENDPOINTS", ()
+        ):
+            return None
+        viewer = f"u{current_user.id}|"
+    query = urlencode(
+        sorted((k, v) for k, v in request.args.items(multi=True) if v.strip())
+    )
+    return f"{viewer}{session.get('language', 'en')}|{request.path}?{query}"
+
+
+def get_page_cache():
+    return current_app.extensions.get("page_cache")
+
+
+def init_page_cache(app):
+    """Register the cache hooks; no-op unless ``PAGE_CACHE_ENABLED``."""
+    if not app.config.get("PAGE_CACHE_ENABLED", False):
+        return None
+    shared = None
+    if app.config.get("PAGE_CACHE_SHARED_PATH"):
+        shared = SharedPageStore(
+            app.config["PAGE_CACHE_SHARED_PATH"],
+            max_bytes=app.config.get("PAGE_CACHE_SHARED_MAX_BYTES", 64 * 1024 * 1024),
+        )
+    cache = PageCache(
+        ttl=app.config.get("PAGE_CACHE_TTL", 60),
+        max_bytes=app.config.get("PAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+        shared=shared,
+    )
+    app.extensions["page_cache"] = cache
+
+    @app.before_request
+    def _serve_cached_page():
+        key = page_cache_key()
+        if key is None:
+            return None
+        with timed("page_cache_lookup"):
+            page = cache.get(key)
+        if page is None:
+            count("page_cache_misses")
+            g.page_cache = (key, cache.generation())
+            return None
+        count("page_cache_hits")
+        response = current_app.response_class(
+            page.body, status=page.status, headers=page.headers
+        )
+        response.headers["X-Page-Cache"] = "hit"
+        return response.make_conditional(request)
+
+    @app.after_request
+    def _store_page(response):
+        pending = g.pop("page_cache", None)
+        if pending is None or response.status_code != 200:
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        key, generation = pending
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in _SKIPPED_HEADERS
+        ]
+        cache.put(key, 200, headers, response.get_data(), generation=generation)
+        response.headers["X-Page-Cache"] = "miss"
+        return response
+
+    return cache
+
+
+def _watched_types():
+    from models.film import Film
+    from models.interaction import UserFilmInteraction
+    from models.review import FilmReview
+    from models.user import User
+
+    return (Film, UserFilmInteraction, FilmReview, User)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_page_changes(session, flush_context):
+    watched = _watched_types()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, watched):
+            session.info[_CHANGED_KEY] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_changes(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if (
+        (orm_execute_state.is_update or orm_execute_state.is_delete)
+        and mapper is not None
+        and issubclass(mapper.class_, _watched_types())
+    ):
+        orm_execute_state.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pages(session):
+    if not session.info.pop(_CHANGED_KEY, False) or not has_app_context():
+        return
+    cache = current_app.extensions.get("page_cache")
+    if cache is not None:
+        cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_page_changes(session):
+    session.info.pop(_CHANGED_KEY, None)
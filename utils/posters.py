@@ -0,0 +1,410 @@
+"""
+Poster manifest for ``static/posters``.
+
+Maps each poster filename to its size on disk, pixel dimensions and a
+content hash. It is built once at startup and rebuilt only when a throttled
+check (every ``POSTER_MANIFEST_CHECK_SECONDS``) sees a file added, removed or
+modified, so rendering a page of film cards is a dict lookup per card
+instead of a filesystem check. The check stats just the two folders and
+rescans their files only when a folder's mtime moved, which adding,
+removing or renaming a file does; a poster overwritten in place keeps the
+folder mtime, so replace files by rename (or restart) to publish an edit.
+Hashes of unchanged files are reused from the previous build (and from the
+JSON cache file across restarts).
+
+Resized JPEG/WebP derivatives live in ``static/posters/derived`` and are
+named ``<stem>-<width>w.<source hash>.<ext>``, so a changed source gets new
+URLs and the manifest can index them by hash from the filenames alone.
+They are rendered offline by ``scripts/build_poster_derivatives.py``
+(needs Pillow); templates get ``srcset`` strings for whatever exists.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, has_request_context, request
+
+logger = logging.getLogger("app")
+
+POSTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+DERIVED_DIR = "derived"
+DERIVED_RE = re.compile(
+    r"^(?P<stem>.+)-(?P<width>\d+)w\.(?P<hash>[0-9a-f]{16})\.(?P<ext>jpg|webp)$"
+)
+
+# what templates get for a film poster; srcsets are "" without derivatives
+Poster = namedtuple(
+    "Poster",
+    ["url", "width", "height", "hash", "srcset", "webp_srcset"],
+    defaults=("", ""),
+)
+
+
+def is_remote(poster_url):
+    return poster_url.startswith(("http://", "https://", "//"))
+
+
+def derivative_name(filename, width, source_hash, ext):
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}-{width}w.{source_hash}.{ext}"
+
+
+def derivative_widths(width, targets):
+    """Widths to render for a ``width`` px source, never upscaling."""
+    if not width:
+        return []
+    return sorted({min(int(target), width) for target in targets})
+
+
+def file_hash(path):
+    """Short content hash (sha256 prefix) of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def image_size(path):
+    """Return ``(width, height)`` from a PNG/GIF/JPEG/WebP header.
+
+    Only the header is read; returns ``(None, None)`` for anything else.
+    """
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp_size(head)
+            if head[:2] == b"\xff\xd8":
+                fh.seek(2)
+                return _jpeg_size(fh)
+    except (OSError, struct.error):
+        pass
+    return None, None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    if chunk == b"VP8L":
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    return None, None
+
+
+def _jpeg_size(fh):
+    # walk the marker segments up to the first start-of-frame
+    while True:
+        marker = fh.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None, None
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        (length,) = struct.unpack(">H", fh.read(2))
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", fh.read(5))
+            return width, height
+        fh.seek(length - 2, os.SEEK_CUR)
+
+
+class PosterManifest:
+    """Filename -> {size, mtime_ns, width, height, hash} for one folder."""
+
+    def __init__(
+        self, folder, url_prefix="/static/posters", cache_path=None, check_interval=2.0
+    ):
+        self.folder = folder
+        self.derived_folder = os.path.join(folder, DERIVED_DIR)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.cache_path = cache_path
+        self.check_interval = float(check_interval)
+        self.entries = {}
+        # source hash -> {"jpg": [(width, name)], "webp": [...]}
+        self.derived = {}
+        self.signature = None
+        self._dir_mtimes = None
+        self._posters = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def __contains__(self, filename):
+        return filename in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, filename):
+        return self.entries.get(filename)
+
+    def _stat_dirs(self):
+        """mtime_ns of the poster and derivative folders (None if missing)."""
+        mtimes = []
+        for folder in (self.folder, self.derived_folder):
+            try:
+                mtimes.append(os.stat(folder).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _scan(self):
+        """``{filename: (size, mtime_ns)}`` of the poster files on disk."""
+        try:
+            with os.scandir(self.folder) as it:
+                files = {}
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(
+                        POSTER_EXTENSIONS
+                    ):
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                return files
+        except FileNotFoundError:
+            return {}
+
+    def _scan_derived(self):
+        """Sorted names of the derivative files on disk."""
+        try:
+            return sorted(
+                name
+                for name in os.listdir(self.derived_folder)
+                if DERIVED_RE.match(name)
+            )
+        except FileNotFoundError:
+            return []
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as fh:
+                self.entries = json.load(fh).get("posters", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable poster manifest cache: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"posters": self.entries}, fh, sort_keys=True, indent=1)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write poster manifest cache: {e}")
+
+    def build(self, files=None, derived=None):
+        """Rebuild from disk, hashing only new or modified files."""
+        if files is None:
+            # stat before scanning: a change during the scan is seen next time
+            self._dir_mtimes = self._stat_dirs()
+        files = self._scan() if files is None else files
+        derived = self._scan_derived() if derived is None else derived
+        entries = {}
+        for name, (size, mtime_ns) in files.items():
+            previous = self.entries.get(name)
+            if (
+                previous
+                and previous.get("size") == size
+                and previous.get("mtime_ns") == mtime_ns
+            ):
+                entries[name] = previous
+                continue
+            path = os.path.join(self.folder, name)
+            width, height = image_size(path)
+            entries[name] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "width": width,
+                "height": height,
+                "hash": file_hash(path),
+            }
+        changed = entries != self.entries
+        self.entries = entries
+        self.derived = {}
+        for name in derived:
+            match = DERIVED_RE.match(name)
+            variants = self.derived.setdefault(match["hash"], {"jpg": [], "webp": []})
+            variants[match["ext"]].append((int(match["width"]), name))
+        for variants in self.derived.values():
+            for widths in variants.values():
+                widths.sort()
+        self._posters = {
+            name: self._poster(name, entry) for name, entry in entries.items()
+        }
+        self.signature = (files, derived)
+        self._checked_at = time.time()
+        if changed:
+            self._save_cache()
+        return self
+
+    def _poster(self, name, entry):
+        variants = self.derived.get(entry["hash"])
+        if not variants:
+            return Poster(
+                self.url(name), entry["width"], entry["height"], entry["hash"]
+            )
+        jpg = [(w, self.url(f"{DERIVED_DIR}/{n}")) for w, n in variants["jpg"]]
+        webp = [(w, self.url(f"{DERIVED_DIR}/{n}")) for w, n in variants["webp"]]
+        # a source narrower than some target has a full-width WebP but no
+        # full-width JPEG: the original file fills that slot
+        if entry["width"] in {w for w, _ in webp}:
+            jpg.append((entry["width"], self.url(name)))
+        return Poster(
+            self.url(name),
+            entry["width"],
+            entry["height"],
+            entry["hash"],
+            ", ".join(f"{url} {w}w" for w, url in jpg),
+            ", ".join(f"{url} {w}w" for w, url in webp),
+        )
+
+    def refresh(self, now=None):
+        """Rebuild if the folder changed; scans at most every check_interval."""
+        now = time.time() if now is None else now
+        if (
+            self.signature is not None
+            and now - self._checked_at < self.check_interval
+        ):
+            return False
+        with self._lock:
+            self._checked_at = now
+            dir_mtimes = self._stat_dirs()
+            if dir_mtimes == self._dir_mtimes:
+                return False
+            self._dir_mtimes = dir_mtimes
+            files, derived = self._scan(), self._scan_derived()
+            if (files, derived) == self.signature:
+                return False
+            self.build(files, derived)
+            return True
+
+    def url(self, filename):
+        return f"{self.url_prefix}/{filename}"
+
+    def poster_for(self, poster_url):
+        """Poster for a film's ``poster_url``, or None if there is none to show.
+
+        Remote URLs are passed through; local names resolve only when the
+        file is in the manifest.
+        """
+        if not poster_url:
+            return None
+        if is_remote(poster_url):
+            return Poster(poster_url, None, None, None)
+        self.refresh()
+        poster = self._posters.get(poster_url)
+        if poster is None or not has_request_context() or not request.script_root:
+            return poster
+        root = request.script_root
+        return poster._replace(
+            url=root + poster.url,
+            srcset=_prefix_srcset(root, poster.srcset),
+            webp_srcset=_prefix_srcset(root, poster.webp_srcset),
+        )
+
+    def missing(self, poster_urls):
+        """Local poster names from ``poster_urls`` that are not on disk."""
+        self.refresh()
+        return [
+            name
+            for name in poster_urls
+            if name and not is_remote(name) and name not in self.entries
+        ]
+
+
+def _prefix_srcset(root, srcset):
+    return ", ".join(root + part for part in srcset.split(", ")) if srcset else ""
+
+
+def build_derivatives(manifest, targets, jpeg_quality=82, webp_quality=80, force=False):
+    """Render missing derivatives for every poster and prune stale ones.
+
+    ``targets`` are the widths to produce (capped at the source width).
+    Sources whose derivatives already exist are not opened at all, so
+    re-running after adding a poster only processes that poster. Returns
+    ``(created, removed)`` file counts. Requires Pillow.
+    """
+    from PIL import Image
+
+    manifest.build()
+    os.makedirs(manifest.derived_folder, exist_ok=True)
+    existing = set(manifest._scan_derived())
+    wanted = set()
+    created = 0
+    for name, entry in sorted(manifest.entries.items()):
+        image = None
+        for width in derivative_widths(entry["width"], targets):
+            for ext in ("jpg", "webp"):
+                if ext == "jpg" and width == entry["width"]:
+                    continue  # the original already is this one
+                out = derivative_name(name, width, entry["hash"], ext)
+                wanted.add(out)
+                if out in existing and not force:
+                    continue
+                if image is None:
+                    # convert() copies the pixels, so the file can be closed
+                    with Image.open(os.path.join(manifest.folder, name)) as src:
+                        image = src.convert("RGB")
+                height = max(1, round(entry["height"] * width / entry["width"]))
+                resized = image.resize((width, height), Image.LANCZOS)
+                path = os.path.join(manifest.derived_folder, out)
+                tmp = f"{path}.tmp"
+                if ext == "jpg":
+                    resized.save(
+                        tmp,
+                        "JPEG",
+                        quality=jpeg_quality,
+                        optimize=True,
+                        progressive=True,
+                    )
+                else:
+                    resized.save(tmp, "WEBP", quality=webp_quality, method=6)
+                # written under a temporary name so a half-written file is
+                # never picked up by a concurrent manifest refresh
+                os.replace(tmp, path)
+                created += 1
+
+    removed = 0
+    for out in existing - wanted:
+        os.remove(os.path.join(manifest.derived_folder, out))
+        removed += 1
+    manifest.build()
+    return created, removed
+
+
+def init_poster_manifest(app):
+    """Build the app's poster manifest and expose ``poster_for`` to templates."""
+    manifest = PosterManifest(
+        os.path.join(app.static_folder, "posters"),
+        url_prefix=f"{app.static_url_path}/posters",
+        cache_path=app.config.get("POSTER_MANIFEST_CACHE"),
+        check_interval=app.config.get("POSTER_MANIFEST_CHECK_SECONDS", 2),
+    )
+    manifest.build()
+    app.extensions["poster_manifest"] = manifest
+    app.jinja_env.globals["poster_for"] = manifest.poster_for
+    return manifest
+
+
+def get_poster_manifest():
+    return current_app.extensions["poster_manifest"]
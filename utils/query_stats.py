@@ -0,0 +1,201 @@
+"""
+Per-request SQL instrumentation.
+
+``before_cursor_execute``/``after_cursor_execute`` listeners on every
+Engine time each statement. Inside a request the statements are collected
+in ``g.query_stats``: count, total time, the slowest few statements and a
+count per statement shape (the SQL with literals and ``IN (?, ?, ...)``
+lists collapsed). The slow-request log in ``app.py`` includes its summary.
+After the request:
+
+- the total DB time is observed per endpoint in the app metrics, and the
+  response gets a ``Server-Timing: db;dur=...`` header;
+- with ``N_PLUS_ONE_THRESHOLD`` set (development and tests), a SELECT
+  shape run that many times or more in one request is logged as a likely
+  N+1; ``N_PLUS_ONE_RAISE`` (tests) turns it into an ``NPlusOneError``.
+
+Statements slower than ``SLOW_QUERY_SECONDS`` are logged to the ``sql``
+logger, inside or outside requests. For SELECTs the log includes the
+``EXPLAIN QUERY PLAN`` (SQLite) or ``EXPLAIN`` output, captured once per
+statement shape.
+"""
+
+import heapq
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import count, get_metrics
+
+logger = logging.getLogger("sql")
+
+_START_KEY = "query_stats_start"
+# statement shapes whose plan has been logged (once per process)
+_explained = set()
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class NPlusOneError(RuntimeError):
+    """A request ran the same SELECT shape over and over (N_PLUS_ONE_RAISE)."""
+
+
+def statement_shape(statement):
+    """``statement`` with literals and IN lists collapsed, for grouping."""
+    shape = _STRING_RE.sub("?", statement)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Statements of one request: count, total time, slowest, shapes."""
+
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.count = 0
+        self.total = 0.0
+        self.shapes = Counter()
+        self._slowest = []  # min-heap of (seconds, order, statement)
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.total += seconds
+        self.shapes[statement_shape(statement)] += 1
+        entry = (seconds, self.count, statement)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        """``[(seconds, statement)]``, slowest first."""
+        return [(s, stmt) for s, _, stmt in sorted(self._slowest, reverse=True)]
+
+    def summary(self):
+        """Short text for request logs."""
+        slowest = "; ".join(
+            f"{seconds * 1000:.1f}ms {statement_shape(stmt)[:200]}"
+            for seconds, stmt in self.slowest
+        )
+        return f"{self.count} queries in {self.total:.3f}s, slowest: {slowest}"
+
+    def repeated(self, threshold):
+        """SELECT shapes run at least ``threshold`` times, most frequent first."""
+        return [
+            (shape, n)
+            for shape, n in self.shapes.most_common()
+            if n >= threshold and shape.upper().startswith("SELECT")
+        ]
+
+
+def _explain(conn, statement, parameters):
+    """Query plan rows of a SELECT, run on a separate DBAPI cursor."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_failed_query(exception_context):
+    # a failed statement never reaches after_cursor_execute; drop its start
+    # so the next statement on this connection is not timed from it
+    conn = exception_context.connection
+    starts = conn.info.get(_START_KEY) if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    if not has_app_context():
+        return
+    count("db_queries")
+    if has_request_context():
+        stats = g.get("query_stats")
+        if stats is None:
+            stats = g.query_stats = QueryStats()
+        stats.add(statement, seconds)
+    threshold = current_app.config.get("SLOW_QUERY_SECONDS")
+    if threshold is not None and seconds >= threshold:
+        _log_slow_query(conn, statement, parameters, executemany, seconds)
+
+
+def _log_slow_query(conn, statement, parameters, executemany, seconds):
+    count("slow_queries")
+    plan = None
+    shape = statement_shape(statement)
+    if (
+        current_app.config.get("SLOW_QUERY_EXPLAIN", True)
+        and not executemany
+        and shape.upper().startswith("SELECT")
+        and shape not in _explained
+    ):
+        _explained.add(shape)
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:  # the plan is a diagnostic; never fail the query
+            plan = [f"EXPLAIN failed: {e}"]
+    endpoint = request.endpoint if has_request_context() else None
+    message = f"slow_query duration={seconds:.3f}s endpoint={endpoint} sql={shape}"
+    if plan:
+        message += " plan=" + " | ".join(plan)
+    logger.warning(message)
+
+
+def init_query_stats(app):
+    """Register the per-request summary (DB time, Server-Timing, N+1 check)."""
+
+    @app.after_request
+    def _finish_query_stats(response):
+        stats = g.get("query_stats")
+        if stats is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        get_metrics().observe(
+            "http_request_db_seconds", stats.total, {"endpoint": endpoint}
+        )
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries"',
+        )
+        threshold = app.config.get("N_PLUS_ONE_THRESHOLD")
+        repeated = stats.repeated(threshold) if threshold else []
+        for shape, n in repeated:
+            count("n_plus_one")
+            logger.warning(
+                f"n_plus_one endpoint={endpoint} repeats={n} "
+                f"queries={stats.count} sql={shape}"
+            )
+        if repeated and app.config.get("N_PLUS_ONE_RAISE"):
+            shape, n = repeated[0]
+            raise NPlusOneError(f"{endpoint} ran {n}x: {shape}")
+        return response
+
+    @app.teardown_request
+    def _drop_query_stats(exc):
+        # g outlives the request when a test keeps an app context open
+        g.pop("query_stats", None)
+
+    return app